@@ -1,17 +1,25 @@
+import contextlib
 import tkinter as tk
-from tkinter import ttk, filedialog
+from tkinter import ttk, filedialog, messagebox
 import time
-from threading import Thread
+from threading import Thread, Lock
 import math
-import pickle
 from typing import Any
-import matplotlib.pyplot as plt
-from matplotlib.figure import Figure
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-import matplotlib.animation as animation
-
-dt = 0.5
-iteratie = 0
+import flowFormat
+import flowModel
+from flowModel import (
+    clamp, Connector, LogicConnector, Component,
+    RealisticSun, SinusSignal, LogicClamp, LogicInverter, Sensor,
+    Source, Printer, Plotter, Process, Buffer,
+    Splitter, ProsessKiezer, Merge, Collector, createComponent
+)
+from flowRunner import loadComponents
+from flowSchedule import FlowSchedule
+from flowConvergence import ConvergenceMonitor
+from flowCheckpoint import CheckpointStore
+from flowHistory import HistoryBuffer, defaultCapacity
+from flowProfile import Profiler
+from flowSpatial import SpatialIndex
 
 def rgb_to_hex(color: tuple[int, int, int]):
     return '#{:02x}{:02x}{:02x}'.format(*color)
@@ -34,559 +42,6 @@ def lerp_color(color1, color2, t):
 
     return (r, g, b)
 
-def clamp(num, min_value, max_value):
-   return max(min(num, max_value), min_value)
-
-class Connector:
-    def __init__(self, name, temp:float = 0.0, flowSpeed:float = 1.0):
-        self.name = name
-        self.connectedTo = None
-        self.temp = temp 
-        self.flowSpeed = flowSpeed
-    
-class LogicConnector:
-    def __init__(self, value:bool = 0.0):
-        self.connectedTo = []
-        self.value = value
-
-class Component:
-    def __init__(self, name, x, y, inputs: list[Connector] = [], outputs: list[Connector] = [], logicInput: LogicConnector = None, logicOutput: LogicConnector = None):
-        self.name = name
-        self.x = x
-        self.y = y
-        self.colorR = 200
-        self.colorG = 200
-        self.colorB = 255
-        self.width = 120
-        self.height = 50
-        self.inputs = inputs
-        self.outputs = outputs
-        self.connectors = inputs + outputs
-        self.logicInput = logicInput
-        self.logicOutput = logicOutput
-        self.logicConnectors = [logicInput, logicOutput]
-
-    def inspect(self, childDict:dict = {}) -> dict[str, str]:
-        inspectables = {}
-        inspectables["name"] = self.name
-        inspectables["colorR"] = self.colorR
-        inspectables["colorG"] = self.colorG
-        inspectables["colorB"] = self.colorB
-
-        inspectables.update(childDict)
-        return inspectables
-
-    def editVariable(self, varName, value):
-        if varName == "name":
-            self.name = value
-        elif varName == "power":
-            self.power = float(value)
-        elif varName == "temp":
-            self.temp = float(value)
-        elif varName == "speed":
-            self.speed = float(value)
-        elif varName == "colorR":
-            self.colorR = int(value)
-        elif varName == "colorG":
-            self.colorG = int(value)
-        elif varName == "colorB":
-            self.colorB = int(value)
-        else:
-            print("No match")
-
-    def getConnectorPosition(self, connector: Connector):
-        if connector not in self.connectors:
-            return None
-
-        if connector in self.inputs:
-            relativeX = (self.inputs.index(connector) + 1) * self.width / (len(self.inputs) + 1)
-            relativeY = -self.height / 2
-        elif connector in self.outputs:
-            relativeX = (self.outputs.index(connector) + 1) * self.width / (len(self.outputs) + 1)
-            relativeY = self.height / 2
-
-        return self.x - (self.width / 2) + relativeX, self.y + relativeY
-    
-    def getConnector(self, x, y):
-        for connector in self.connectors:
-            connectorX, connectorY = self.getConnectorPosition(connector)
-            if abs(connectorX - x) < 5 and abs(connectorY - y) < 5:
-                return connector
-        return None
-    
-    def getLogicConnectorPosition(self, connector: LogicConnector):
-        if connector not in [self.logicInput, self.logicOutput]:
-            return None
-
-        if connector == self.logicInput:
-            relativeX = -self.width / 2
-            relativeY = 0
-        elif connector == self.logicOutput:
-            relativeX = self.width / 2
-            relativeY = 0
-
-        return self.x + relativeX, self.y + relativeY
-    
-    def getLogicConnector(self, x, y):
-        for connector in self.logicConnectors:
-            connectorX, connectorY = self.getLogicConnectorPosition(connector)
-            if abs(connectorX - x) < 5 and abs(connectorY - y) < 5:
-                return connector
-        return None
-    
-    def update(self):
-        for input in self.inputs:
-            if input.connectedTo is None:
-                continue
-
-            input.temp = input.connectedTo.temp
-            input.flowSpeed = input.connectedTo.flowSpeed
-
-        if self.logicInput is not None:
-            if len(self.logicInput.connectedTo) == 0:
-                self.logicInput.value = 0
-                return
-            self.logicInput.value = self.logicInput.connectedTo[0].value
-    
-# Temperature functions
-
-def calculateDeltaT(
-        Power: float,
-        stroomSnelheid: float,
-        sortWarmte: float = 4.18):
-    """
-    Calculates the delta T for a given warmte and power
-    """
-    dT = (Power / sortWarmte) / stroomSnelheid
-    return dT
-
-def calculateWarmteVerlies(
-        T: float,
-        Oppervlakte: float = 100,
-        geleiding: float = 0.0005):
-    """
-    Calculates the warmte verlies for a given delta T and stroom snelheid
-    """
-    deltaT = T - 20
-    warmteVerlies = Oppervlakte * geleiding * deltaT
-    return warmteVerlies
-
-
-# Flow Code
-
-class RealisticSun(Component):
-    def __init__(self, name, x, y, wolkenKans):
-        self.wolkenKans = wolkenKans
-        super().__init__(
-            name, 
-            x, 
-            y,
-            logicInput=LogicConnector(),
-            logicOutput=LogicConnector()
-        )
-
-    def inspect(self) -> dict[str, str]:
-        return super().inspect({
-            "wolkenKans": self.wolkenKans
-        })
-            
-    def editVariable(self, varName, value):
-        if varName == "wolkenKans":
-            self.wolkenKans = float(value)
-        else:
-            super().editVariable(varName, value)
-
-    @staticmethod
-    def getSunPower(tijd, Datum):
-        return (1 - (math.cos(tijd * 2 * math.pi / 24) + 1) / ((1-Datum)*1.1 + 0.5)) * ((1 - Datum)*0.4 + 0.6)
-
-    def update(self):
-        super().update()
-
-        self.logicOutput.value = clamp( RealisticSun.getSunPower(dt * iteratie, self.logicInput.value), 0, 1)
-
-
-class SinusSignal(Component):
-    def __init__(self, name, x, y, period):
-        self.period = period
-        super().__init__(
-            name, 
-            x, 
-            y,
-            logicOutput=LogicConnector()
-        )
-
-    def inspect(self) -> dict[str, str]:
-        return super().inspect({
-            "period": self.period
-        })
-            
-    def editVariable(self, varName, value):
-        if varName == "period":
-            self.period = float(value)
-        else:
-            super().editVariable(varName, value)
-
-    def update(self):
-        super().update()
-        self.logicOutput.value = math.cos(dt * iteratie * 2 * math.pi / self.period)/2 + 0.5
-
-class LogicClamp(Component):
-    def __init__(self, name, x, y, min, max):
-        self.min = min
-        self.max = max
-        super().__init__(
-            name, 
-            x, 
-            y,
-            logicInput=LogicConnector(),
-            logicOutput=LogicConnector()
-        )
-
-    def inspect(self) -> dict[str, str]:
-        return super().inspect({
-            "min": self.min,
-            "max": self.max
-        })
-            
-    def editVariable(self, varName, value):
-        if varName == "min":
-            self.min = float(value)
-        elif varName == "max":
-            self.max = float(value)
-        else:
-            super().editVariable(varName, value)
-
-    def update(self):
-        super().update()
-        if self.logicInput.connectedTo is not None:
-            self.logicOutput.value = clamp(self.logicInput.value, self.min, self.max)
-        else:
-            self.logicOutput.value = 0
-
-class LogicInverter(Component):
-    def __init__(self, name, x, y):
-        super().__init__(
-            name, 
-            x, 
-            y,
-            logicInput=LogicConnector(),
-            logicOutput=LogicConnector()
-        )
-
-    def update(self):
-        super().update()
-        if self.logicInput.connectedTo is not None:
-            self.logicOutput.value = 1 - self.logicInput.value
-        else:
-            self.logicOutput.value = 0
-
-class Sensor(Component):
-    def __init__(self, name, x, y, compareFunction:str):
-        self.compareFunction = compareFunction
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN")],
-            outputs=[Connector("OUT")],
-            logicInput=LogicConnector(),
-            logicOutput=LogicConnector()
-        )
-
-    def inspect(self) -> dict[str, str]:
-        return super().inspect({
-            "compareFunction": self.compareFunction
-        })
-    
-    def editVariable(self, varName, value):
-        if varName == "compareFunction":
-            self.compareFunction = value
-        else:
-            super().editVariable(varName, value)
-
-    def update(self):
-        super().update()
-        self.outputs[0].temp = self.inputs[0].temp
-        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
-
-        temp = self.inputs[0].temp
-        flowSpeed = self.inputs[0].flowSpeed
-        if self.logicInput is not None:
-            logicIn = self.logicInput.value
-        else:
-            logicIn = 0
-        output = eval(self.compareFunction, {"temp": temp, "flowSpeed": flowSpeed, "logicIn": logicIn})
-        if output > 1:
-            output = 1
-        elif output < 0:
-            output = 0
-
-        self.logicOutput.value = output
-
-
-class Source(Component):
-    def __init__(self, name, x, y, maxTemp, speed):
-        self.maxTemp = maxTemp
-        self.speed = speed
-        super().__init__(
-            name, 
-            x, 
-            y,
-            outputs = [Connector("OUT", maxTemp, speed)],
-            logicInput=LogicConnector()
-        )
-
-    def inspect(self) -> dict[str, str]:
-        return super().inspect({
-            "maxTemp": self.maxTemp,
-            "speed": self.speed
-        })
-        
-    def editVariable(self, varName, value):
-        if varName == "maxTemp":
-            self.maxTemp = float(value)
-        elif varName == "speed":
-            self.speed = float(value)
-        else:
-            super().editVariable(varName, value)
-
-    def update(self):
-        super().update()
-        scalar = 1 if self.logicInput.connectedTo == [] else self.logicInput.value
-        if self.logicInput.connectedTo is not None:
-            self.outputs[0].temp = self.maxTemp * scalar
-        else:
-            self.outputs[0].temp = self.maxTemp
-        self.outputs[0].flowSpeed = self.speed
-
-class Printer(Component):
-    def __init__(self, name, x, y):
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN")],
-            outputs = [Connector("OUT")]
-        )
-
-    def update(self):
-        super().update()
-        self.outputs[0].temp = self.inputs[0].temp
-        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
-        print(f"{self.name}:" ,self.inputs[0].temp, self.inputs[0].flowSpeed)
-
-class Plotter(Component):
-    def __init__(self, name, x, y):
-        self.data = []
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN")],
-            outputs = [Connector("OUT")]
-        )
-
-    def update(self):
-        super().update()
-        self.outputs[0].temp = self.inputs[0].temp
-        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
-        self.data.append(self.inputs[0].temp)
-
-class Process(Component):
-    def __init__(self, name, x, y, power, minTemp = 0, maxTemp = 100):
-        self.power = power
-        self.minTemp = minTemp
-        self.maxTemp = maxTemp
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN")],
-            outputs = [Connector("OUT")],
-            logicInput=LogicConnector()
-        )
-
-    def inspect(self) -> dict[str, str]:
-        return super().inspect({
-            "power": self.power,
-            "minTemp": self.minTemp,
-            "maxTemp": self.maxTemp
-        })
-    
-    def editVariable(self, varName, value):
-        if varName == "power":
-            self.power = float(value)
-        elif varName == "minTemp":
-            self.minTemp = float(value)
-        elif varName == "maxTemp":
-            self.maxTemp = float(value)
-        else:
-            super().editVariable(varName, value)
-
-    def update(self):
-        super().update()
-        scalar = 1 if self.logicInput.connectedTo == [] else self.logicInput.value
-        if self.inputs[0].temp < self.minTemp:
-            self.outputs[0].temp = self.inputs[0].temp - calculateWarmteVerlies(self.inputs[0].temp)
-        elif self.inputs[0].temp > self.maxTemp:
-            self.outputs[0].temp = self.inputs[0].temp + calculateDeltaT(self.power * scalar, 1) - calculateWarmteVerlies(self.inputs[0].temp) - (self.inputs[0].temp - self.maxTemp)
-        else:
-            self.outputs[0].temp = self.inputs[0].temp + calculateDeltaT(self.power * scalar, 1) - calculateWarmteVerlies(self.inputs[0].temp)
-        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
-
-class Buffer(Component):
-    def __init__(self, name, x, y, maxTemp, capacity):
-        self.maxTemp = maxTemp
-        self.capacity = capacity
-        self.temp = 0
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN")],
-            outputs = [Connector("OUT")],
-        )
-
-    def inspect(self) -> dict[str, str]:
-        return super().inspect({
-            "maxTemp": self.maxTemp,
-            "capacity": self.capacity
-        })
-    
-    def editVariable(self, varName, value):
-        if varName == "maxTemp":
-            self.maxTemp = float(value)
-        elif varName == "capacity":
-            self.capacity = float(value)
-        else:
-            super().editVariable(varName, value)
-
-    def update(self):
-        super().update()
-        
-        VolumeIn = self.inputs[0].flowSpeed * dt * 3600
-        self.temp = (VolumeIn * self.inputs[0].temp + self.temp * self.capacity) / (VolumeIn + self.capacity)
-
-        self.outputs[0].temp = min(self.temp - calculateWarmteVerlies(self.temp), self.maxTemp)
-        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
-
-
-class Splitter(Component):
-    def __init__(self, name, x, y, splitScalar):
-        self.splitScalar = splitScalar
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN")],
-            outputs = [Connector("OUT1"), Connector("OUT2")],
-            logicInput=LogicConnector()
-        )
-
-    def inspect(self) -> dict[str, str]:
-        return super().inspect({
-            "splitScalar": self.splitScalar
-        })
-    
-    def editVariable(self, varName, value):
-        if varName == "splitScalar":
-            self.splitScalar = float(value)
-        else:
-            super().editVariable(varName, value)
-
-    def update(self):
-        super().update()
-        self.outputs[0].temp = self.inputs[0].temp - calculateWarmteVerlies(self.inputs[0].temp)
-        self.outputs[1].temp = self.inputs[0].temp - calculateWarmteVerlies(self.inputs[0].temp)
-
-        if self.logicInput.connectedTo == []:
-            self.outputs[0].flowSpeed = self.inputs[0].flowSpeed * self.splitScalar
-            self.outputs[1].flowSpeed = self.inputs[0].flowSpeed * (1 - self.splitScalar)
-        else:
-            self.outputs[0].flowSpeed = self.inputs[0].flowSpeed * self.logicInput.value
-            self.outputs[1].flowSpeed = self.inputs[0].flowSpeed * (1 - self.logicInput.value)
-
-class ProsessKiezer(Component):
-    def __init__(self, name, x, y):
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN")],
-            outputs = [Connector("OUT1"), Connector("OUT2"), Connector("OUT3")],
-            logicInput=LogicConnector()
-        )
-
-    def update(self):
-        super().update()
-        outputTemp = self.inputs[0].temp - calculateWarmteVerlies(self.inputs[0].temp)
-        self.outputs[0].temp = outputTemp
-        self.outputs[1].temp = outputTemp
-        self.outputs[2].temp = outputTemp
-
-        if self.logicInput.connectedTo == []:
-            newFlowspeed = self.inputs[0].flowSpeed / 3
-            self.outputs[0].flowSpeed = newFlowspeed
-            self.outputs[1].flowSpeed = newFlowspeed
-            self.outputs[2].flowSpeed = newFlowspeed
-        else:
-            inputSpeed = self.inputs[0].flowSpeed
-            inputValue = self.logicInput.value
-            self.outputs[0].flowSpeed = max(0, inputSpeed * (-2 * inputValue + 1))
-            self.outputs[1].flowSpeed = max(0, inputSpeed * (1 - (2 * abs(inputValue - 0.5) )) )
-            self.outputs[2].flowSpeed = max(0, inputSpeed * (2 * inputValue - 1))
-
-class Merge(Component):
-    def __init__(self, name, x, y):
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN1"), Connector("IN2")],
-            outputs = [Connector("OUT")]
-        )
-
-    def update(self):
-        super().update()
-        flowSpeed1 = self.inputs[0].flowSpeed
-        flowSpeed2 = self.inputs[1].flowSpeed
-        temp1 = self.inputs[0].temp
-        temp2 = self.inputs[1].temp
-
-        if (flowSpeed1 + flowSpeed2) != 0:
-            self.outputs[0].temp = (flowSpeed1 * temp1 + flowSpeed2 * temp2) / (flowSpeed1 + flowSpeed2)
-            self.outputs[0].temp = self.outputs[0].temp - calculateWarmteVerlies(self.outputs[0].temp)
-        else:
-            self.outputs[0].temp = 10
-        self.outputs[0].flowSpeed = (flowSpeed1 + flowSpeed2)
-
-class Collector(Component):
-    def __init__(self, name, x, y):
-        super().__init__(
-            name, 
-            x, 
-            y,
-            inputs = [Connector("IN1"), Connector("IN2"), Connector("IN3")],
-            outputs = [Connector("OUT")]
-        )
-
-    def update(self):
-        super().update()
-        flowSpeed1 = self.inputs[0].flowSpeed
-        flowSpeed2 = self.inputs[1].flowSpeed
-        flowSpeed3 = self.inputs[2].flowSpeed
-        temp1 = self.inputs[0].temp
-        temp2 = self.inputs[1].temp
-        temp3 = self.inputs[2].temp
-
-        if (flowSpeed1 + flowSpeed2 + flowSpeed3) != 0:
-            self.outputs[0].temp = (flowSpeed1 * temp1 + flowSpeed2 * temp2 + flowSpeed3 * temp3) / (flowSpeed1 + flowSpeed2 + flowSpeed3)
-            self.outputs[0].temp = self.outputs[0].temp - calculateWarmteVerlies(self.outputs[0].temp)
-        else:
-            self.outputs[0].temp = 10
-        self.outputs[0].flowSpeed = (flowSpeed1 + flowSpeed2 + flowSpeed3)
-
 # UI Code
 
 class ConnectorApp:
@@ -597,6 +52,15 @@ class ConnectorApp:
         self.plotter = MatPlotLibPlotter(self.root)
 
         self.components = []
+        self.schedule = None
+        self.spatialIndex = SpatialIndex()
+
+        # Canvas item ids per component and per connection, updated in place instead of redrawn
+        self.componentItems = {}
+        self.connectionItems = {}
+        self.tempThreshold = 0.5
+        self.flowSpeedThreshold = 0.01
+        self.logicThreshold = 0.01
         self.selected_output = None
 
         self.canvas = tk.Canvas(root, bg="white", width=800, height=600)
@@ -619,6 +83,7 @@ class ConnectorApp:
         self.basicComponentsMenu.add_command(label="Plotter", command=lambda: self.add_component("Plotter", 120, 70))
         self.basicComponentsMenu.add_command(label="Process", command=lambda: self.add_component("Process", 120, 70))
         self.basicComponentsMenu.add_command(label="Buffer", command=lambda: self.add_component("Buffer", 120, 70))
+        self.basicComponentsMenu.add_command(label="SubFlow", command=lambda: self.add_component("SubFlow", 120, 70))
         self.addComponentMenu.add_cascade(label="BasicComponents", menu=self.basicComponentsMenu)
 
         self.verdelingsMenu = tk.Menu(self.addComponentMenu, tearoff=0)
@@ -630,6 +95,7 @@ class ConnectorApp:
 
         self.logicComponentsMenu = tk.Menu(self.addComponentMenu, tearoff=0)
         self.logicComponentsMenu.add_command(label="SinusSignal", command=lambda: self.add_component("SinusSignal", 120, 70))
+        self.logicComponentsMenu.add_command(label="ProfileSignal", command=lambda: self.add_component("ProfileSignal", 120, 70))
         self.logicComponentsMenu.add_command(label="RealisticSun", command=lambda: self.add_component("RealisticSun", 120, 70))
         self.logicComponentsMenu.add_command(label="LogicClamp", command=lambda: self.add_component("LogicClamp", 120, 70))
         self.logicComponentsMenu.add_command(label="LogicInverter", command=lambda: self.add_component("LogicInverter", 120, 70))
@@ -644,8 +110,44 @@ class ConnectorApp:
         self.menu.pack()
 
         self.stopCommand = False
-
-        self.startButton = ttk.Button(self.menu, text="Start", command=lambda: Thread(target=self.update).start())
+        self.running = False
+
+        # The simulation thread hands data to the Tk thread: plot samples for every tick go
+        # through pendingPlotData, connector values only as the latest snapshot per frame
+        self.frameRate = tk.IntVar(value=20)
+        self.plotLock = Lock()
+        self.pendingPlotData = []
+        self.latestSnapshot = None
+        self.snapshotWanted = True
+
+        self.simulationMenu = tk.Menu(self.menuBar, tearoff=0)
+        for frameRate in (5, 10, 20, 30, 60):
+            self.simulationMenu.add_radiobutton(label=f"{frameRate} fps", variable=self.frameRate, value=frameRate)
+        self.menuBar.add_cascade(label="Refresh rate", menu=self.simulationMenu)
+
+        # Steady-state detection, reported in the title and optionally stopping the run
+        self.stopWhenSteady = tk.BooleanVar(value=False)
+        # Copy of the checkbox for the simulation thread, which must not read Tk variables
+        self.stopWhenSteadyActive = False
+        self.steadyTolerance = 1e-4
+        self.steadyWindow = 100
+        self.convergedAt = None
+        self.steadyMenu = tk.Menu(self.menuBar, tearoff=0)
+        self.steadyMenu.add_checkbutton(label="Stop when steady", variable=self.stopWhenSteady, command=self.toggleStopWhenSteady)
+        self.menuBar.add_cascade(label="Simulation", menu=self.steadyMenu)
+
+        # Opt-in timing per component and of the frame work, shown as outlines and in a table
+        self.profiling = tk.BooleanVar(value=False)
+        # Copy of the checkbox for the simulation thread, which must not read Tk variables
+        self.profilingActive = False
+        self.profiler = Profiler()
+        self.profileWindow = None
+        self.profileTables = {}
+        self.steadyMenu.add_separator()
+        self.steadyMenu.add_checkbutton(label="Profile", variable=self.profiling, command=self.toggleProfiling)
+        self.steadyMenu.add_command(label="Profile table", command=self.openProfileWindow)
+
+        self.startButton = ttk.Button(self.menu, text="Start", command=self.startSimulation)
         self.startButton.grid(row=0, column=0)
 
         self.stopButton = ttk.Button(self.menu, text="Stop", command=self.stopLoop )
@@ -663,6 +165,16 @@ class ConnectorApp:
         self.addProcess = ttk.Button(self.menu, text="Add Splitter", command=lambda: self.add_component("Splitter", 120, 70))
         self.addProcess.grid(row=0, column=4)
 
+        # Stop pauses the run; checkpoints let the tick slider go back without simulating from 0
+        self.checkpoints = CheckpointStore(interval=100, capacity=512)
+
+        self.resetButton = ttk.Button(self.menu, text="Reset", command=self.resetSimulation)
+        self.resetButton.grid(row=0, column=6)
+
+        self.tickScale = tk.Scale(self.menu, from_=0, to=0, orient=tk.HORIZONTAL, label="Tick", length=200)
+        self.tickScale.grid(row=0, column=7)
+        self.tickScale.bind("<ButtonRelease-1>", lambda event: self.scrubTo(self.tickScale.get()))
+
         self.canvas.bind("<Button-1>", self.on_canvas_click)
         self.canvas.bind("<Button-3>", self.on_canvas_right_click)
         self.canvas.bind("<B1-Motion>", self.on_drag)
@@ -674,23 +186,104 @@ class ConnectorApp:
     def stopLoop(self):
         self.stopCommand = True
 
+    def startSimulation(self):
+        if self.running:
+            return
+        self.running = True
+        self.plotter.openPlotWindow()
+        self.snapshotWanted = True
+        self.convergedAt = None
+        self.root.title("Energy Flow Diagram")
+        # Ticks after the current one belong to a run that was scrubbed away
+        self.checkpoints.discardAfter(flowModel.iteratie)
+        self.checkpoints.capture(flowModel.iteratie, self.components)
+        Thread(target=self.update, daemon=True).start()
+        self.root.after(int(1000 / self.frameRate.get()), self.refreshView)
+
     def clearFlow(self):
         self.components = []
+        self.spatialIndex.rebuild(self.components)
+        self.invalidateSchedule()
+        self.resetRun()
         self.redraw_canvas()
 
+    def resetRun(self):
+        flowModel.iteratie = 0
+        self.checkpoints.clear()
+        self.profiler.clear()
+        self.plotter.clearData()
+        self.tickScale.configure(to=0)
+        self.tickScale.set(0)
+
+    def resetSimulation(self):
+        """
+        Goes back to the state the run started from and clears the plots
+        """
+        if self.running:
+            return
+        self.scrubTo(0)
+        for component in self.components:
+            if isinstance(component, Plotter):
+                component.data = HistoryBuffer()
+        self.resetRun()
+
+    def scrubTo(self, tick: int):
+        """
+        Restores the last checkpoint before tick and simulates the few ticks up to it.
+        The Plotter histories are cut back to the same tick.
+        """
+        if self.running:
+            return
+        self.getPlotterData()
+        current = flowModel.iteratie
+        restored = self.checkpoints.restore(min(tick, current), self.components)
+        if restored is None:
+            return
+
+        plotters = [component for component in self.components if isinstance(component, Plotter)]
+        for plotter in plotters:
+            plotter.data.truncate(len(plotter.data) - (current - restored))
+        for history in self.plotter.plotData.values():
+            history.truncate(len(history) - (current - restored))
+
+        flowModel.iteratie = restored
+        schedule = self.getSchedule()
+        while flowModel.iteratie < min(tick, current):
+            schedule.step()
+            for plotter in plotters:
+                self.plotter.addData(plotter.name, plotter.inputs[0].temp)
+            flowModel.iteratie += 1
+
+        self.tickScale.set(flowModel.iteratie)
+        self.redraw_connector()
+        self.plotter.background = None
+        self.plotter.updatePlot()
+
+    def invalidateSchedule(self):
+        self.schedule = None
+
+    def getSchedule(self) -> FlowSchedule:
+        # Only rebuilt after the graph changed, see invalidateSchedule
+        if self.schedule is None:
+            self.schedule = FlowSchedule(self.components)
+        return self.schedule
+
     def saveFlow(self):
         file_path = filedialog.asksaveasfile(mode="wb", defaultextension=".flow", filetypes=[("HeatFlow files", "*.flow")], initialdir="flows", initialfile="myHeatFlow.flow")
         if file_path is None:
             return
-        pickle.dump(self.components, file_path)
+        file_path.write(flowFormat.dumps(self.components, flowFormat.modelDirectory(file_path.name)))
         file_path.close()
 
     def loadFlow(self):
         file_path = filedialog.askopenfile(mode="rb", defaultextension=".flow", filetypes=[("HeatFlow files", "*.flow")], initialdir="flows")
         if file_path is None:
             return
-        self.components = pickle.load(file_path)
+        self.components = loadComponents(file_path)
         file_path.close()
+        self.spatialIndex.rebuild(self.components)
+        self.invalidateSchedule()
+        self.resetRun()
         self.redraw_canvas()
     
     def openInspector(self, component):
@@ -714,8 +307,17 @@ class ConnectorApp:
 
         def updateVariables():
             for key, entery in variables.items():
-                component.editVariable(key, entery.get())
-            self.redraw_canvas()
+                try:
+                    component.editVariable(key, entery.get())
+                except ValueError as error:
+                    messagebox.showerror("Invalid value", f"{key}: {error}", parent=inspector)
+            self.invalidateSchedule()
+            # A SubFlow can get other ports, which drops their connections
+            self.spatialIndex.moveComponent(component)
+            self.erase_component(component)
+            self.draw_component(component)
+            self.sync_connections()
+            self.canvas.tag_raise("connector")
 
         def deleteComponent():
             for connector in component.connectors:
@@ -724,11 +326,15 @@ class ConnectorApp:
             for logicConnector in component.logicConnectors:
                 if logicConnector is None:
                     continue
-                for connectedTo in logicConnector.connectedTo:
-                    self.disconnect_components(connectedTo)
+                for connectedTo in list(logicConnector.connectedTo):
+                    connectedTo.connectedTo.remove(logicConnector)
+                    logicConnector.connectedTo.remove(connectedTo)
             
             self.components.remove(component)
-            self.redraw_canvas()
+            self.spatialIndex.deleteComponent(component)
+            self.invalidateSchedule()
+            self.erase_component(component)
+            self.sync_connections()
 
         ttk.Button(inspector, text="Delete", command=deleteComponent).place(anchor=tk.SE, x=740, y=180)
 
@@ -738,82 +344,61 @@ class ConnectorApp:
 
 
     def add_component(self, name, x, y, inputs: list[Connector] = [Connector("IN")], outputs: list[Connector] = [Connector("OUT")]):
-        if name == "Source":
-            component = Source(name, x, y, 100, 1)
-        elif name == "Printer":
-            component = Printer(name, x, y)
-        elif name == "Plotter":
-            component = Plotter(name, x, y)
-        elif name == "Process":
-            component = Process(name, x, y, 100)
-        elif name == "Splitter":
-            component = Splitter(name, x, y, 0.5)
-        elif name == "ProsessKiezer":
-            component = ProsessKiezer(name, x, y)
-        elif name == "SinusSignal":
-            component = SinusSignal(name, x, y, 10)
-        elif name == "RealisticSun":
-            component = RealisticSun(name, x, y, 0.5)
-        elif name == "LogicClamp":
-            component = LogicClamp(name, x, y, 0, 1)
-        elif name == "LogicInverter":
-            component = LogicInverter(name, x, y)
-        elif name == "Sensor":
-            component = Sensor(name, x, y, "temp / 100")
-        elif name == "Merge":
-            component = Merge(name, x, y)
-        elif name == "Collector":
-            component = Collector(name, x, y)
-        elif name == "Buffer":
-            component = Buffer(name, x, y, 100, 100)
-        else:
-            component = Component(name, x, y, inputs, outputs)
+        component = createComponent(name, name, x, y, inputs, outputs)
         self.components.append(component)
+        self.spatialIndex.addComponent(component)
+        self.invalidateSchedule()
         self.draw_component(component)
 
     
 
     def draw_component(self, component):
-        self.canvas.create_rectangle(
+        items = []
+        items.append(self.canvas.create_rectangle(
             component.x - component.width / 2, component.y - component.height / 2,
             component.x + component.width / 2, component.y + component.height / 2,
             fill=rgb_to_hex((component.colorR, component.colorG, component.colorB))
-        )
-        self.canvas.create_text(
+        ))
+        items.append(self.canvas.create_text(
             component.x, component.y,
             text=component.name
-        )
+        ))
 
         for logicConnector in component.logicConnectors:
             if logicConnector is None:
                 continue
-            connectorX, connectorY = component.getLogicConnectorPosition(logicConnector)
+            connectorX, connectorY = self.getConnectorPosition(logicConnector)
 
-            self.canvas.create_oval(
+            items.append(self.canvas.create_oval(
                 connectorX - 3,
                 connectorY - 3,
                 connectorX + 3,
                 connectorY + 3,
                 fill="lightgreen"
-            )
+            ))
 
         for connector in component.connectors:
-            connectorX, connectorY = component.getConnectorPosition(connector)
+            connectorX, connectorY = self.getConnectorPosition(connector)
 
-            self.canvas.create_text(
+            items.append(self.canvas.create_text(
                 connectorX,
                 connectorY + (3 if connector in component.inputs else -3),
                 text=connector.name,
                 anchor= (tk.N if connector in component.inputs else tk.S)
-            )
+            ))
 
-            self.canvas.create_oval(
+            items.append(self.canvas.create_oval(
                 connectorX - 3,
                 connectorY - 3,
                 connectorX + 3,
                 connectorY + 3,
                 fill="blue"
-            )
+            ))
+        self.componentItems[component] = items
+
+    def erase_component(self, component):
+        for item in self.componentItems.pop(component, []):
+            self.canvas.delete(item)
 
     def connect_components(self, fromConnector: Connector, toConnector: Connector):
         if isinstance(fromConnector, LogicConnector):
@@ -824,7 +409,8 @@ class ConnectorApp:
             else:
                 toConnector.connectedTo.append(fromConnector)
                 fromConnector.connectedTo.append(toConnector)
-            self.draw_logic_connector([fromConnector, toConnector])
+            self.invalidateSchedule()
+            self.sync_connections()
             return
         
         if fromConnector.connectedTo is not None:
@@ -834,45 +420,95 @@ class ConnectorApp:
             
         fromConnector.connectedTo = toConnector
         toConnector.connectedTo = fromConnector
-        self.redraw_canvas()
+        self.invalidateSchedule()
+        self.sync_connections()
 
     def disconnect_components(self, connector: Connector):
         connector.connectedTo.connectedTo = None
         connector.connectedTo = None
-        self.redraw_canvas()
+        self.invalidateSchedule()
+        self.sync_connections()
 
-    def draw_connector(self, connectors:list[Connector]):
+    def draw_connector(self, connectors:list[Connector], temp:float = None, flowSpeed:float = None):
         connector1X, connector1Y = self.getConnectorPosition(connectors[0])
         connector2X, connector2Y = self.getConnectorPosition(connectors[1])
-        flowSpeed = connectors[0].flowSpeed
-        temp = connectors[0].temp
+        if flowSpeed is None:
+            flowSpeed = connectors[0].flowSpeed
+        if temp is None:
+            temp = connectors[0].temp
 
-        self.canvas.create_line(
+        line = self.canvas.create_line(
             connector1X, 
             connector1Y, 
             connector2X, 
             connector2Y,
             arrow=tk.LAST,
-            fill=rgb_to_hex(lerp_color((0, 0, 255), (255, 0, 0), clamp(float(temp / 100), 0, 1))),
+            fill=self.connector_color(temp),
             width=flowSpeed * 4,
             tags="connector"
         )
+        self.connectionItems[(connectors[0], connectors[1])] = [line, temp, flowSpeed]
+
+    @staticmethod
+    def connector_color(temp):
+        return rgb_to_hex(lerp_color((0, 0, 255), (255, 0, 0), clamp(float(temp / 100), 0, 1)))
+
+    @staticmethod
+    def logic_connector_color(value):
+        return rgb_to_hex(lerp_color((0, 255, 0), (0, 100, 0), value))
 
-    def draw_logic_connector(self, connectors:list[LogicConnector]):
+    def draw_logic_connector(self, connectors:list[LogicConnector], value:float = None):
         connector1X, connector1Y = self.getConnectorPosition(connectors[0])
         connector2X, connector2Y = self.getConnectorPosition(connectors[1])
-        value = connectors[0].value
+        if value is None:
+            value = connectors[0].value
 
-        self.canvas.create_line(
+        line = self.canvas.create_line(
             connector1X, 
             connector1Y, 
             connector2X, 
             connector2Y,
             arrow=tk.LAST,
-            fill=rgb_to_hex(lerp_color((0, 255, 0), (0, 100, 0), value)),
+            fill=self.logic_connector_color(value),
             width=4,
             tags="connector"
         )
+        self.connectionItems[(connectors[0], connectors[1])] = [line, value]
+
+    def sync_connections(self):
+        """
+        Adds lines for new connections and deletes the lines of removed ones
+        """
+        current = set()
+        for component in self.components:
+            if component.logicOutput is not None:
+                for logicConnector in component.logicOutput.connectedTo:
+                    current.add((component.logicOutput, logicConnector))
+                    if (component.logicOutput, logicConnector) not in self.connectionItems:
+                        self.draw_logic_connector([component.logicOutput, logicConnector])
+
+            for output in component.outputs:
+                if output.connectedTo is None:
+                    continue
+                current.add((output, output.connectedTo))
+                if (output, output.connectedTo) not in self.connectionItems:
+                    self.draw_connector([output, output.connectedTo])
+
+        for key in list(self.connectionItems):
+            if key not in current:
+                self.canvas.delete(self.connectionItems.pop(key)[0])
+
+    def connections_of(self, component) -> list:
+        keys = []
+        for output in component.outputs:
+            keys.append((output, output.connectedTo))
+        for input in component.inputs:
+            keys.append((input.connectedTo, input))
+        if component.logicOutput is not None:
+            keys += [(component.logicOutput, logicConnector) for logicConnector in component.logicOutput.connectedTo]
+        if component.logicInput is not None:
+            keys += [(logicConnector, component.logicInput) for logicConnector in component.logicInput.connectedTo]
+        return [key for key in keys if key in self.connectionItems]
 
 
     def on_canvas_click(self, event):
@@ -885,111 +521,266 @@ class ConnectorApp:
                 self.firstConnector = None
     
     def on_canvas_right_click(self, event):
-        self.openInspector(self.getComponent(event.x, event.y))
+        component = self.getComponent(event.x, event.y)
+        if component is not None:
+            self.openInspector(component)
 
     def getConnector(self, x, y):
-        for component in self.components:
-            connector = component.getConnector(x, y)
-            if connector is None:
-                connector = component.getLogicConnector(x, y)
-            if connector is not None:
-                return connector
-        return None
+        return self.spatialIndex.connectorAt(x, y)
     
     def getComponent(self, x, y):
-        for component in self.components:
-            if (
-                component.x - component.width / 2 <= x <= component.x + component.width / 2 and
-                component.y - component.height / 2 <= y <= component.y + component.height / 2
-            ):
-                return component
-        return None
+        return self.spatialIndex.componentAt(x, y)
     
     def getConnectorPosition(self, connector: Connector):
-        for component in self.components:
-            connectorPosition = component.getConnectorPosition(connector)
-            if connectorPosition is None:
-                connectorPosition = component.getLogicConnectorPosition(connector)
-            if connectorPosition is not None:
-                return connectorPosition
-        return None
+        return self.spatialIndex.connectorPosition(connector)
 
     def on_drag(self, event):
-        for component in self.components:
-            if (
-                component.x - component.width / 2 <= event.x <= component.x + component.width / 2 and
-                component.y - component.height / 2 <= event.y <= component.y + component.height / 2
-            ):
-                component.x = round(event.x, -1)
-                component.y = round(event.y, -1)
-                self.redraw_canvas()
+        for component in self.spatialIndex.componentsAt(event.x, event.y):
+            newX = round(event.x, -1)
+            newY = round(event.y, -1)
+            if newX == component.x and newY == component.y:
+                continue
+            for item in self.componentItems.get(component, []):
+                self.canvas.move(item, newX - component.x, newY - component.y)
+            component.x = newX
+            component.y = newY
+            self.spatialIndex.moveComponent(component)
+
+            for fromConnector, toConnector in self.connections_of(component):
+                self.canvas.coords(
+                    self.connectionItems[(fromConnector, toConnector)][0],
+                    *self.getConnectorPosition(fromConnector),
+                    *self.getConnectorPosition(toConnector)
+                )
 
     def redraw_canvas(self):
         self.canvas.delete("all")
+        self.componentItems = {}
+        self.connectionItems = {}
         for component in self.components:
             self.draw_component(component)
-
-            if component.logicOutput is not None:
-                for logicConnector in component.logicOutput.connectedTo:
-                    self.draw_logic_connector([component.logicOutput, logicConnector])
-
-            for output in component.outputs:
-                if output.connectedTo is None:
-                    continue
-
-                self.draw_connector([output, output.connectedTo])
-
-    def redraw_connector(self):
-        self.canvas.addtag_withtag("old", "connector")
-
+        self.sync_connections()
+
+    def captureSnapshot(self) -> dict:
+        """
+        Copies the values needed to draw the connections, called from the simulation thread
+        """
+        connectors = []
+        logicConnectors = []
         for component in self.components:
             if component.logicOutput is not None:
                 for logicConnector in component.logicOutput.connectedTo:
-                    self.draw_logic_connector([component.logicOutput, logicConnector])
+                    logicConnectors.append((component.logicOutput, logicConnector, component.logicOutput.value))
 
             for output in component.outputs:
                 if output.connectedTo is None:
                     continue
-
-                self.draw_connector([output, output.connectedTo])
-        self.canvas.delete("old")
+                connectors.append((output, output.connectedTo, output.temp, output.flowSpeed))
+        return {"tick": flowModel.iteratie, "connectors": connectors, "logicConnectors": logicConnectors}
+
+    def redraw_connector(self, snapshot: dict = None):
+        """
+        Recolors the connection lines whose values changed more than the thresholds
+        """
+        if snapshot is None:
+            snapshot = self.captureSnapshot()
+
+        for fromConnector, toConnector, value in snapshot["logicConnectors"]:
+            item = self.connectionItems.get((fromConnector, toConnector))
+            if item is None:
+                self.draw_logic_connector([fromConnector, toConnector], value)
+            elif abs(value - item[1]) > self.logicThreshold:
+                self.canvas.itemconfig(item[0], fill=self.logic_connector_color(value))
+                item[1] = value
+
+        for fromConnector, toConnector, temp, flowSpeed in snapshot["connectors"]:
+            item = self.connectionItems.get((fromConnector, toConnector))
+            if item is None:
+                self.draw_connector([fromConnector, toConnector], temp, flowSpeed)
+            elif abs(temp - item[1]) > self.tempThreshold or abs(flowSpeed - item[2]) > self.flowSpeedThreshold:
+                self.canvas.itemconfig(item[0], fill=self.connector_color(temp), width=flowSpeed * 4)
+                item[1] = temp
+                item[2] = flowSpeed
+
+    def recordPlotterData(self, plotters: list[Plotter]):
+        with self.plotLock:
+            self.pendingPlotData.append([(plotter.name, plotter.inputs[0].temp) for plotter in plotters])
 
     def getPlotterData(self):
-        for component in self.components:
-            if isinstance(component, Plotter):
-                self.plotter.addData(component.name, component.inputs[0].temp)
-
-    def update(self):
-        global iteratie
-        self.plotter.openPlotWindow()
-        iteratie = 0
-        while not self.stopCommand:
-            for component in self.components:
-                component.update()
-            self.redraw_connector()
+        with self.plotLock:
+            pending = self.pendingPlotData
+            self.pendingPlotData = []
+        for samples in pending:
+            for name, temp in samples:
+                self.plotter.addData(name, temp)
+
+    def refreshView(self):
+        """
+        Runs on the Tk thread at the chosen frame rate and draws the latest simulation state
+        """
+        snapshot = self.latestSnapshot
+        if snapshot is not None:
+            self.latestSnapshot = None
+            with self.profiled("redraw_connector"):
+                self.redraw_connector(snapshot)
+        with self.profiled("getPlotterData"):
             self.getPlotterData()
+        with self.profiled("updatePlot"):
             self.plotter.updatePlot()
-            iteratie += 1
-        self.plotter.clearData()
-        self.stopCommand = False
+        if self.profiling.get():
+            self.showProfile()
+        self.snapshotWanted = True
+        if self.convergedAt is not None:
+            self.root.title(f"Energy Flow Diagram - converged at tick {self.convergedAt}")
+        self.tickScale.configure(to=flowModel.iteratie)
+        self.tickScale.set(flowModel.iteratie)
+
+        if self.running:
+            self.root.after(int(1000 / self.frameRate.get()), self.refreshView)
+
+    def update(self):
+        """
+        Simulation thread: runs ticks as fast as possible and never touches Tk
+        """
+        schedule = None
+        try:
+            while not self.stopCommand:
+                if schedule is not self.getSchedule():
+                    schedule = self.getSchedule()
+                    plotters = [component for component in schedule.order if isinstance(component, Plotter)]
+                    convergence = ConvergenceMonitor.forComponents(schedule.order, self.steadyTolerance, self.steadyWindow)
+                if self.profilingActive:
+                    self.profiler.step(schedule.updates())
+                else:
+                    schedule.step()
+                self.recordPlotterData(plotters)
+                if self.convergedAt is None and convergence.observe(flowModel.iteratie):
+                    self.convergedAt = convergence.convergedAt
+                    if self.stopWhenSteadyActive:
+                        break
+                if self.snapshotWanted:
+                    self.snapshotWanted = False
+                    self.latestSnapshot = self.captureSnapshot()
+                flowModel.iteratie += 1
+                if self.checkpoints.due(flowModel.iteratie):
+                    self.checkpoints.capture(flowModel.iteratie, self.components)
+        finally:
+            self.stopCommand = False
+            self.running = False
+
+    def toggleStopWhenSteady(self):
+        self.stopWhenSteadyActive = self.stopWhenSteady.get()
+
+    def profiled(self, name: str):
+        return self.profiler.section(name) if self.profiling.get() else contextlib.nullcontext()
+
+    def toggleProfiling(self):
+        self.profilingActive = self.profiling.get()
+        self.profiler.clear()
+        if self.profilingActive:
+            self.showProfile()
+            return
+        for component, items in self.componentItems.items():
+            self.canvas.itemconfig(items[0], outline="black", width=1)
+
+    def showProfile(self):
+        """
+        Outlines every component from black to red by its share of the tick time
+        """
+        shares = {component: self.profiler.share(component) for component in self.componentItems}
+        highest = max(shares.values(), default=0)
+        for component, items in self.componentItems.items():
+            heat = shares[component] / highest if highest > 0 else 0
+            self.canvas.itemconfig(items[0], outline=rgb_to_hex(lerp_color((0, 0, 0), (255, 0, 0), heat)), width=1 + 3 * heat)
+        if self.profileWindow is not None and self.profileWindow.winfo_exists():
+            self.refreshProfileWindow()
+
+    def openProfileWindow(self):
+        if self.profileWindow is not None and self.profileWindow.winfo_exists():
+            return
+        self.profileWindow = tk.Toplevel(self.root)
+        self.profileWindow.title("Profile")
+        notebook = ttk.Notebook(self.profileWindow)
+        notebook.pack(fill="both", expand=True)
+        self.profileTables = {}
+        for view, columns in (
+            ("components", ("name", "type", "calls", "perTickUs", "lastTickUs", "share")),
+            ("classes", ("type", "instances", "calls", "perTickUs", "lastTickUs", "share")),
+            ("sections", ("section", "calls", "totalMs", "perCallUs", "lastUs"))
+        ):
+            table = ttk.Treeview(notebook, columns=columns, show="headings", height=20)
+            for column in columns:
+                table.heading(column, text=column, command=lambda view=view, column=column: self.sortProfile(view, column))
+                table.column(column, width=90, anchor=tk.E)
+            notebook.add(table, text=view)
+            # Sorted on share or total time, the largest first
+            self.profileTables[view] = [table, columns, columns[-1] if view != "sections" else "totalMs", True]
+        self.refreshProfileWindow()
+
+    def sortProfile(self, view: str, column: str):
+        entry = self.profileTables[view]
+        entry[3] = not entry[3] if entry[2] == column else True
+        entry[2] = column
+        self.refreshProfileWindow()
+
+    def refreshProfileWindow(self):
+        rows = {
+            "components": self.profiler.componentRows(self.components),
+            "classes": self.profiler.classRows(self.components),
+            "sections": self.profiler.sectionRows()
+        }
+        for view, (table, columns, sortColumn, descending) in self.profileTables.items():
+            table.delete(*table.get_children())
+            for row in sorted(rows[view], key=lambda row: row[sortColumn], reverse=descending):
+                table.insert("", tk.END, values=[
+                    f"{row[column]:.1%}" if column == "share" else f"{row[column]:.2f}" if isinstance(row[column], float) else row[column]
+                    for column in columns
+                ])
 
 class MatPlotLibPlotter:
-    def __init__(self, root) -> None:
+    """
+    Live plot of the Plotter series.
+
+    Every series keeps one Line2D that is updated with set_data and blitted onto a cached
+    background. The axes are only rescaled when data leaves the current limits, and at most
+    pointBudget points per series are drawn, so a frame costs the same however long the run is.
+    The series are HistoryBuffers of historyCapacity values, so memory stays bounded too.
+    matplotlib is only imported, and the figure only made, when the plot window first opens.
+    """
+    def __init__(self, root, pointBudget: int = 2000, historyCapacity: int = defaultCapacity) -> None:
         self.plotData = {}
+        self.lines = {}
         self.root = root
-        self.fig, self.ax = plt.subplots()
+        self.pointBudget = pointBudget
+        self.historyCapacity = historyCapacity
+        self.canvas = None
+        self.window = None
+        self.background = None
+        self.fig = None
+        self.ax = None
 
     def addData(self, dataName, new_number):
         if dataName not in self.plotData:
-            self.plotData[dataName] = []
+            self.plotData[dataName] = HistoryBuffer(self.historyCapacity)
         self.plotData[dataName].append(new_number)
 
     def openPlotWindow(self):
-        plotWindow = tk.Toplevel(self.root)
+        if self.window is not None and self.window.winfo_exists():
+            return
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        if self.fig is None:
+            # A plain Figure instead of pyplot, which would also load its own window management
+            from matplotlib.figure import Figure
+            self.fig = Figure()
+            self.ax = self.fig.add_subplot()
+
+        plotWindow = self.window = tk.Toplevel(self.root)
         plotWindow.title("Plot")
         frame = tk.Frame(plotWindow)
         self.canvas = FigureCanvasTkAgg(self.fig, master=frame)
         self.canvas.get_tk_widget().pack()
+        self.canvas.mpl_connect("draw_event", self.onDraw)
+        self.background = None
         toolbar = NavigationToolbar2Tk(self.canvas, frame, pack_toolbar=False)
         toolbar.update()
         toolbar.pack()
@@ -997,15 +788,75 @@ class MatPlotLibPlotter:
 
     def clearData(self):
         self.plotData = {}
+        for line in self.lines.values():
+            line.remove()
+        self.lines = {}
+        self.background = None
+
+    def visiblePoints(self, history: HistoryBuffer):
+        """
+        Mean per history bucket followed by the recent values, thinned to every n-th point,
+        n a power of two so the shown points stay put while the series grows
+        """
+        ticks, means, _, _ = history.series()
+        stride = 1
+        while len(ticks) > stride * self.pointBudget:
+            stride *= 2
+        if stride == 1:
+            return ticks, means
+        last = len(ticks) - 1
+        return ticks[last % stride::stride], means[last % stride::stride]
+
+    def onDraw(self, event):
+        # A full draw (first frame, rescale, window resize) leaves the background without the lines
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def rescale(self):
+        histories = [history for history in self.plotData.values() if len(history) > 0]
+        if len(histories) == 0:
+            return
+        length = max(len(history) for history in histories)
+        low = min(history.minimum for history in histories)
+        high = max(history.maximum for history in histories)
+        margin = max((high - low) * 0.1, 1)
+
+        # Room to grow, so the x axis only rescales each time the run doubles in length
+        self.ax.set_xlim(0, max(2 * length, 10))
+        self.ax.set_ylim(low - margin, high + margin)
+
+    def outsideLimits(self) -> bool:
+        xMax = self.ax.get_xlim()[1]
+        yMin, yMax = self.ax.get_ylim()
+        for history in self.plotData.values():
+            if len(history) > xMax or history.minimum < yMin or history.maximum > yMax:
+                return True
+        return False
 
     def updatePlot(self):
-        self.ax.clear()
-        for dataName, data in self.plotData.items():
-            self.ax.plot(data, label=dataName)
-        self.ax.legend(loc="upper left")
-        if self.canvas is None:
+        if self.canvas is None or len(self.plotData) == 0:
             return
-        self.canvas.draw()
+
+        fullDraw = self.background is None
+        for dataName, history in self.plotData.items():
+            xData, yData = self.visiblePoints(history)
+            if dataName not in self.lines:
+                self.lines[dataName], = self.ax.plot(xData, yData, label=dataName, animated=True)
+                self.ax.legend(loc="upper left")
+                fullDraw = True
+            else:
+                self.lines[dataName].set_data(xData, yData)
+
+        if fullDraw or self.outsideLimits():
+            self.rescale()
+            self.canvas.draw()
+            return
+
+        self.canvas.restore_region(self.background)
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+        self.canvas.blit(self.ax.bbox)
 
 if __name__ == "__main__":
     root = tk.Tk()
@@ -0,0 +1,198 @@
+import argparse
+import contextlib
+import csv
+import io
+import time
+
+import numpy as np
+
+import flowModel
+from flowModel import Plotter
+from flowRunner import loadFlowFile, uniqueNames
+from flowSchedule import FlowSchedule
+from flowState import captureState, restoreState, stateVector, maxDifference
+
+# Fast-forward mode: the time step grows while the model is quiet and shrinks near
+# sharp signal changes and sensor thresholds, controlled by step doubling
+
+class MutedHistory:
+    """
+    Stands in for Plotter.data during trial steps
+    """
+    def append(self, value):
+        pass
+
+class AdaptiveRunner:
+    """
+    Integrates a model with a variable dt.
+
+    Every step is taken once with dt and once as two steps of dt / 2. The largest difference
+    between the two results is the error estimate: the step is accepted (with the more accurate
+    half-step result) if it is below tolerance, otherwise it is retried with a smaller dt.
+    The signals see the right time because iteratie is set to time / dt.
+
+    Only Buffer and the signals depend on dt, the other components relax once per step, so
+    a cycle takes fewer passes per hour with a bigger dt. Printers are silent in this mode.
+    """
+    def __init__(self, components, dt: float = flowModel.dt, tolerance: float = 1.0, minDt: float = None, maxDt: float = None, engine: str = "objects"):
+        self.components = components
+        self.dt = dt
+        self.tolerance = tolerance
+        self.minDt = minDt if minDt is not None else dt / 8
+        self.maxDt = maxDt if maxDt is not None else dt * 64
+        self.time = 0.0
+        self.schedule = FlowSchedule(components)
+        self.plotters = [component for component in components if isinstance(component, Plotter)]
+
+        # One row per accepted step: (time, dt, error) and the Plotter temps
+        self.steps = []
+        self.rejected = []
+        self.evaluations = 0
+        self.columns = [(name, component) for name, component in zip(uniqueNames(components), components) if isinstance(component, Plotter)]
+        self.series = {name: [] for name, _ in self.columns}
+
+        self.arrayEngine = None
+        if engine == "arrays":
+            from flowArrays import ArrayEngine
+            self.arrayEngine = ArrayEngine(components, self.schedule)
+            self.sample = self.arrayEngine.sampler([component.inputs[0] for _, component in self.columns], ["temp"] * len(self.columns))
+        else:
+            self.sample = lambda: [component.inputs[0].temp for _, component in self.columns]
+
+    def capture(self):
+        if self.arrayEngine is not None:
+            engine = self.arrayEngine
+            return engine.temp.copy(), engine.flow.copy(), engine.logic.copy(), engine.bufferTemp.copy()
+        return captureState(self.components)
+
+    def restore(self, state):
+        if self.arrayEngine is not None:
+            engine = self.arrayEngine
+            engine.temp[:], engine.flow[:], engine.logic[:], engine.bufferTemp[:] = state
+        else:
+            restoreState(self.components, state)
+
+    def vector(self, state) -> np.ndarray:
+        if self.arrayEngine is not None:
+            return np.concatenate(state)
+        return stateVector(state)
+
+    def advance(self, start: float, dt: float):
+        flowModel.dt = dt
+        flowModel.iteratie = start / dt
+        if self.arrayEngine is not None:
+            self.arrayEngine.step()
+        else:
+            self.schedule.step()
+        self.evaluations += 1
+
+    def trial(self, start, dt: float) -> float:
+        """
+        Takes one step of dt from start, leaves the half-step result in place and returns the error estimate
+        """
+        self.advance(self.time, dt)
+        full = self.vector(self.capture())
+        self.restore(start)
+        self.advance(self.time, dt / 2)
+        self.advance(self.time + dt / 2, dt / 2)
+        return maxDifference(full, self.vector(self.capture()))
+
+    @contextlib.contextmanager
+    def muted(self):
+        histories = [plotter.data for plotter in self.plotters]
+        for plotter in self.plotters:
+            plotter.data = MutedHistory()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                yield
+        finally:
+            for plotter, history in zip(self.plotters, histories):
+                plotter.data = history
+
+    def step(self, limit: float = None):
+        """
+        Takes one accepted step, shrinking dt until the error is small enough, and grows dt for the next step
+        """
+        start = self.capture()
+        retried = False
+        with self.muted():
+            while True:
+                dt = self.dt if limit is None else min(self.dt, limit)
+                error = self.trial(start, dt)
+                # An error that does not shrink with dt (a cycle relaxing one pass per step) is not a time step error
+                if error <= self.tolerance or dt <= self.minDt or (retried and error > 0.9 * self.rejected[-1][2]):
+                    break
+                self.restore(start)
+                self.rejected.append((self.time, dt, error))
+                self.dt = max(self.minDt, dt * max(0.2, 0.9 * (self.tolerance / error) ** 0.5))
+                retried = True
+
+        self.time += dt
+        self.steps.append((self.time, dt, error))
+        values = self.sample()
+        for (name, component), value in zip(self.columns, values):
+            self.series[name].append(value)
+            component.data.append(value)
+
+        growth = 2.0 if error == 0 else min(2.0, 0.9 * (self.tolerance / error) ** 0.5)
+        if retried:
+            # Do not grow straight back into the step that was just rejected
+            growth = min(growth, 1.0)
+        self.dt = min(self.maxDt, max(self.minDt, dt * max(0.2, growth)))
+
+    def run(self, duration: float):
+        end = self.time + duration
+        while end - self.time > 1e-9:
+            self.step(end - self.time)
+        if self.arrayEngine is not None:
+            self.arrayEngine.writeBack()
+        return self.series
+
+    def report(self, fixedDt: float = flowModel.dt) -> str:
+        dts = [dt for _, dt, _ in self.steps]
+        fixedTicks = int(round(self.time / fixedDt))
+        return (
+            f"{len(self.steps)} steps ({len(self.rejected)} rejected, {self.evaluations} evaluations) "
+            f"for {self.time:g} h, dt {min(dts, default=0):g} to {max(dts, default=0):g}; "
+            f"a fixed dt of {fixedDt:g} takes {fixedTicks} ticks"
+        )
+
+    def writeSteps(self, path):
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["time", "dt", "error", "accepted"])
+            rows = [(t, dt, error, 1) for t, dt, error in self.steps] + [(t, dt, error, 0) for t, dt, error in self.rejected]
+            writer.writerows(sorted(rows))
+
+    def writeCsv(self, path):
+        names = list(self.series)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["time", "dt"] + names)
+            for i, (t, dt, _) in enumerate(self.steps):
+                writer.writerow([t, dt] + [self.series[name][i] for name in names])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate a .flow model with an adaptive time step")
+    parser.add_argument("model")
+    parser.add_argument("--hours", type=float, default=500, help="simulated time")
+    parser.add_argument("--dt", type=float, default=flowModel.dt, help="first step, and the fixed step to compare with")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="largest allowed step doubling difference per step, in degrees for temps")
+    parser.add_argument("--min-dt", type=float)
+    parser.add_argument("--max-dt", type=float)
+    parser.add_argument("--engine", choices=["objects", "arrays"], default="objects")
+    parser.add_argument("--output", "-o", help="Plotter series per accepted step (.csv)")
+    parser.add_argument("--steps", help="step report with every accepted and rejected step (.csv)")
+    args = parser.parse_args(argv)
+
+    runner = AdaptiveRunner(loadFlowFile(args.model), args.dt, args.tolerance, args.min_dt, args.max_dt, args.engine)
+    start = time.perf_counter()
+    runner.run(args.hours)
+    print(f"{args.model}: {runner.report(args.dt)} in {time.perf_counter() - start:.3f}s")
+    if args.output is not None:
+        runner.writeCsv(args.output)
+    if args.steps is not None:
+        runner.writeSteps(args.steps)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,470 @@
+import argparse
+import copy
+import time
+
+import numpy as np
+
+import flowModel
+from flowModel import (
+    Component, RealisticSun, SinusSignal, ProfileSignal, LogicClamp, LogicInverter, Sensor,
+    Source, Plotter, Process, Buffer, Splitter, ProsessKiezer, Merge, Collector, SubFlow,
+    calculateDeltaT, calculateWarmteVerlies
+)
+from flowSchedule import FlowSchedule
+
+# Array engine: all connector values live in NumPy arrays and every component type
+# in a schedule level is updated with one vectorized kernel
+
+def scheduleLevels(schedule: FlowSchedule) -> list[list]:
+    """
+    Splits the schedule in levels whose components do not read each other's values,
+    so running the levels one after another gives the same result as the schedule order
+    """
+    broken = set(schedule.brokenEdges)
+    runsBefore = {component: [] for component in schedule.order}
+    for component in schedule.order:
+        for predecessor in schedule.predecessors[component]:
+            if predecessor is component:
+                continue
+            if (predecessor, component) in broken:
+                # component reads last tick's value, so it has to run before predecessor
+                runsBefore[predecessor].append(component)
+            else:
+                runsBefore[component].append(predecessor)
+
+    level = {}
+    levels = []
+    for component in schedule.order:
+        level[component] = max((level[other] + 1 for other in runsBefore[component]), default=0)
+        if level[component] == len(levels):
+            levels.append([])
+        levels[level[component]].append(component)
+    return levels
+
+class Batch:
+    """
+    Components of one type in one level, with the slot indices their kernel needs
+    """
+    def __init__(self, engine, kind, components):
+        self.engine = engine
+        self.kind = kind
+        self.components = components
+
+        gatherDst, gatherSrc = [], []
+        for component in components:
+            for input in component.inputs:
+                if input.connectedTo is not None:
+                    gatherDst.append(engine.slot[input])
+                    gatherSrc.append(engine.slot[input.connectedTo])
+        self.gatherDst = np.array(gatherDst, dtype=np.intp)
+        self.gatherSrc = np.array(gatherSrc, dtype=np.intp)
+
+        logicDst, logicSrc, logicZero = [], [], []
+        for component in components:
+            if component.logicInput is None:
+                continue
+            if len(component.logicInput.connectedTo) == 0:
+                logicZero.append(engine.logicSlot[component.logicInput])
+            else:
+                logicDst.append(engine.logicSlot[component.logicInput])
+                logicSrc.append(engine.logicSlot[component.logicInput.connectedTo[0]])
+        self.logicDst = np.array(logicDst, dtype=np.intp)
+        self.logicSrc = np.array(logicSrc, dtype=np.intp)
+        self.logicZero = np.array(logicZero, dtype=np.intp)
+
+        if kind in engine.kernels:
+            self.inputs = np.array([[engine.slot[c] for c in component.inputs] for component in components], dtype=np.intp).T
+            self.outputs = np.array([[engine.slot[c] for c in component.outputs] for component in components], dtype=np.intp).T
+            if components[0].logicInput is not None:
+                self.logicIn = np.array([engine.logicSlot[component.logicInput] for component in components], dtype=np.intp)
+                self.logicConnected = engine.column(np.array([len(component.logicInput.connectedTo) > 0 for component in components]))
+            if components[0].logicOutput is not None:
+                self.logicOut = np.array([engine.logicSlot[component.logicOutput] for component in components], dtype=np.intp)
+
+    def parameter(self, name) -> np.ndarray:
+        return self.engine.parameter(self.components, name)
+
+    def gather(self):
+        """
+        Vectorized Component.update: copy connected values into the input connectors
+        """
+        engine = self.engine
+        engine.temp[self.gatherDst] = engine.temp[self.gatherSrc]
+        engine.flow[self.gatherDst] = engine.flow[self.gatherSrc]
+        engine.logic[self.logicDst] = engine.logic[self.logicSrc]
+        engine.logic[self.logicZero] = 0
+
+    def update(self):
+        kernel = self.engine.kernels.get(self.kind)
+        if kernel is None:
+            self.engine.updateObjects(self.components)
+            return
+        self.gather()
+        kernel(self.engine, self)
+
+# Kernels, one per component type, mirroring the update() methods in flowModel
+
+def passThrough(engine, batch):
+    engine.temp[batch.outputs[0]] = engine.temp[batch.inputs[0]]
+    engine.flow[batch.outputs[0]] = engine.flow[batch.inputs[0]]
+
+def logicScalar(engine, batch):
+    return np.where(batch.logicConnected, engine.logic[batch.logicIn], 1.0)
+
+def sourceKernel(engine, batch):
+    if not hasattr(batch, "maxTemp"):
+        batch.maxTemp = batch.parameter("maxTemp")
+        batch.speed = batch.parameter("speed")
+    engine.temp[batch.outputs[0]] = batch.maxTemp * logicScalar(engine, batch)
+    engine.flow[batch.outputs[0]] = batch.speed
+
+def plotterKernel(engine, batch):
+    passThrough(engine, batch)
+    # Straight into the HistoryBuffer, which keeps its memory bounded however long the run is
+    for plotter, temp in zip(batch.components, engine.temp[batch.inputs[0]].tolist()):
+        plotter.data.append(temp)
+
+def processKernel(engine, batch):
+    if not hasattr(batch, "power"):
+        batch.power = batch.parameter("power")
+        batch.minTemp = batch.parameter("minTemp")
+        batch.maxTemp = batch.parameter("maxTemp")
+    temp = engine.temp[batch.inputs[0]]
+    heated = temp + calculateDeltaT(batch.power * logicScalar(engine, batch), 1) - calculateWarmteVerlies(temp)
+    engine.temp[batch.outputs[0]] = np.where(
+        temp < batch.minTemp,
+        temp - calculateWarmteVerlies(temp),
+        np.where(temp > batch.maxTemp, heated - (temp - batch.maxTemp), heated)
+    )
+    engine.flow[batch.outputs[0]] = engine.flow[batch.inputs[0]]
+
+def bufferKernel(engine, batch):
+    if not hasattr(batch, "capacity"):
+        batch.capacity = batch.parameter("capacity")
+        batch.maxTemp = batch.parameter("maxTemp")
+        batch.state = np.array([engine.bufferSlot[component] for component in batch.components], dtype=np.intp)
+    flow = engine.flow[batch.inputs[0]]
+    volumeIn = flow * flowModel.dt * 3600
+    bufferTemp = (volumeIn * engine.temp[batch.inputs[0]] + engine.bufferTemp[batch.state] * batch.capacity) / (volumeIn + batch.capacity)
+    engine.bufferTemp[batch.state] = bufferTemp
+    engine.temp[batch.outputs[0]] = np.minimum(bufferTemp - calculateWarmteVerlies(bufferTemp), batch.maxTemp)
+    engine.flow[batch.outputs[0]] = flow
+
+def splitterKernel(engine, batch):
+    if not hasattr(batch, "splitScalar"):
+        batch.splitScalar = batch.parameter("splitScalar")
+    temp = engine.temp[batch.inputs[0]]
+    flow = engine.flow[batch.inputs[0]]
+    outputTemp = temp - calculateWarmteVerlies(temp)
+    engine.temp[batch.outputs[0]] = outputTemp
+    engine.temp[batch.outputs[1]] = outputTemp
+
+    scalar = np.where(batch.logicConnected, engine.logic[batch.logicIn], batch.splitScalar)
+    engine.flow[batch.outputs[0]] = flow * scalar
+    engine.flow[batch.outputs[1]] = flow * (1 - scalar)
+
+def prosessKiezerKernel(engine, batch):
+    temp = engine.temp[batch.inputs[0]]
+    flow = engine.flow[batch.inputs[0]]
+    outputTemp = temp - calculateWarmteVerlies(temp)
+    for output in batch.outputs:
+        engine.temp[output] = outputTemp
+
+    value = engine.logic[batch.logicIn]
+    connected = batch.logicConnected
+    engine.flow[batch.outputs[0]] = np.where(connected, np.maximum(0, flow * (-2 * value + 1)), flow / 3)
+    engine.flow[batch.outputs[1]] = np.where(connected, np.maximum(0, flow * (1 - (2 * np.abs(value - 0.5)))), flow / 3)
+    engine.flow[batch.outputs[2]] = np.where(connected, np.maximum(0, flow * (2 * value - 1)), flow / 3)
+
+def mixKernel(engine, batch):
+    """
+    Merge and Collector: flow weighted mix of all inputs
+    """
+    flows = engine.flow[batch.inputs]
+    totalFlow = flows.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mixed = (flows * engine.temp[batch.inputs]).sum(axis=0) / totalFlow
+    engine.temp[batch.outputs[0]] = np.where(totalFlow != 0, mixed - calculateWarmteVerlies(mixed), 10)
+    engine.flow[batch.outputs[0]] = totalFlow
+
+def sensorKernel(engine, batch):
+    passThrough(engine, batch)
+    temps = engine.temp[batch.inputs[0]].tolist()
+    flows = engine.flow[batch.inputs[0]].tolist()
+    if hasattr(batch, "logicIn"):
+        logicIns = engine.logic[batch.logicIn].tolist()
+    else:
+        # Sensors from older files have no logic input
+        logicIns = [0] * len(batch.components)
+    engine.logic[batch.logicOut] = [
+        sensor.compare(temp, flowSpeed, logicIn)
+        for sensor, temp, flowSpeed, logicIn in zip(batch.components, temps, flows, logicIns)
+    ]
+
+def sinusKernel(engine, batch):
+    if not hasattr(batch, "period"):
+        batch.period = batch.parameter("period")
+    engine.logic[batch.logicOut] = np.cos(flowModel.dt * flowModel.iteratie * 2 * np.pi / batch.period) / 2 + 0.5
+
+def profileKernel(engine, batch):
+    values = [component.signalAt(flowModel.dt, flowModel.iteratie) for component in batch.components]
+    engine.logic[batch.logicOut] = engine.column(np.array(values))
+
+def sunKernel(engine, batch):
+    sunPower = RealisticSun.getSunPower(flowModel.dt * flowModel.iteratie, engine.logic[batch.logicIn])
+    engine.logic[batch.logicOut] = np.clip(sunPower, 0, 1)
+
+def logicClampKernel(engine, batch):
+    if not hasattr(batch, "min"):
+        batch.min = batch.parameter("min")
+        batch.max = batch.parameter("max")
+    engine.logic[batch.logicOut] = np.maximum(np.minimum(engine.logic[batch.logicIn], batch.max), batch.min)
+
+def logicInverterKernel(engine, batch):
+    engine.logic[batch.logicOut] = 1 - engine.logic[batch.logicIn]
+
+def subFlowKernel(engine, batch):
+    if not hasattr(batch, "instances"):
+        # Imported here, flowSubFlow runs the instances on an EnsembleEngine built on this module
+        from flowSubFlow import InstanceBatch
+        batch.instances = InstanceBatch(engine, batch)
+    batch.instances.step()
+
+def gatherKernel(engine, batch):
+    pass
+
+kernels = {
+    Component: gatherKernel,
+    Source: sourceKernel,
+    Plotter: plotterKernel,
+    Process: processKernel,
+    Buffer: bufferKernel,
+    Splitter: splitterKernel,
+    ProsessKiezer: prosessKiezerKernel,
+    Merge: mixKernel,
+    Collector: mixKernel,
+    Sensor: sensorKernel,
+    SinusSignal: sinusKernel,
+    ProfileSignal: profileKernel,
+    RealisticSun: sunKernel,
+    LogicClamp: logicClampKernel,
+    LogicInverter: logicInverterKernel,
+    SubFlow: subFlowKernel,
+}
+
+class ArrayEngine:
+    """
+    Struct-of-arrays version of the tick loop.
+
+    Component parameters are read when the engine is built, so rebuild it after editing
+    a component. Types without a kernel (and plain Components with a different number of
+    connectors) fall back to their own update() with values copied in and out.
+    writeBack() copies the array state back into the component objects.
+    """
+    kernels = kernels
+
+    def __init__(self, components, schedule: FlowSchedule = None):
+        self.components = components
+        self.schedule = schedule if schedule is not None else FlowSchedule(components)
+
+        self.slot = {}
+        self.logicSlot = {}
+        self.bufferSlot = {}
+        for component in components:
+            for connector in component.connectors:
+                self.addSlot(connector)
+                if connector.connectedTo is not None:
+                    self.addSlot(connector.connectedTo)
+            for logicConnector in component.logicConnectors:
+                if logicConnector is None:
+                    continue
+                self.addLogicSlot(logicConnector)
+                for other in logicConnector.connectedTo:
+                    self.addLogicSlot(other)
+            if isinstance(component, Buffer):
+                self.bufferSlot[component] = len(self.bufferSlot)
+
+        self.temp = self.allocate(len(self.slot))
+        self.flow = self.allocate(len(self.slot))
+        self.logic = self.allocate(len(self.logicSlot))
+        self.bufferTemp = self.allocate(len(self.bufferSlot))
+        # Engines inside this one, such as the SubFlow instances, with their own readState() and writeBack()
+        self.nested = []
+        self.readState()
+
+        self.batches = []
+        for level in scheduleLevels(self.schedule):
+            byKind = {}
+            for component in level:
+                byKind.setdefault(self.kindOf(component), []).append(component)
+            for (kind, *_), members in byKind.items():
+                self.batches.append(Batch(self, kind, members))
+
+    def addSlot(self, connector):
+        if connector not in self.slot:
+            self.slot[connector] = len(self.slot)
+
+    def addLogicSlot(self, logicConnector):
+        if logicConnector not in self.logicSlot:
+            self.logicSlot[logicConnector] = len(self.logicSlot)
+
+    def allocate(self, slots: int) -> np.ndarray:
+        return np.zeros(slots)
+
+    def column(self, values: np.ndarray) -> np.ndarray:
+        """
+        Shapes a per-component array so it broadcasts against the state arrays
+        """
+        return values
+
+    def parameter(self, components, name) -> np.ndarray:
+        return np.array([float(getattr(component, name)) for component in components])
+
+    @staticmethod
+    def kindOf(component) -> tuple:
+        """
+        Batch key: the type plus the connector layout, since older files can differ from the current classes
+        """
+        kind = type(component)
+        if kind is Component and (len(component.inputs) != 1 or len(component.outputs) != 1):
+            kind = None
+        return (kind, len(component.inputs), len(component.outputs), component.logicInput is None, component.logicOutput is None)
+
+    def readState(self):
+        for connector, slot in self.slot.items():
+            self.temp[slot] = connector.temp
+            self.flow[slot] = connector.flowSpeed
+        for logicConnector, slot in self.logicSlot.items():
+            self.logic[slot] = logicConnector.value
+        for buffer, slot in self.bufferSlot.items():
+            self.bufferTemp[slot] = buffer.temp
+        for nested in self.nested:
+            nested.readState()
+
+    def writeBack(self):
+        temps = self.temp.tolist()
+        flows = self.flow.tolist()
+        for connector, slot in self.slot.items():
+            connector.temp = temps[slot]
+            connector.flowSpeed = flows[slot]
+        logic = self.logic.tolist()
+        for logicConnector, slot in self.logicSlot.items():
+            logicConnector.value = logic[slot]
+        for buffer, slot in self.bufferSlot.items():
+            buffer.temp = float(self.bufferTemp[slot])
+        for nested in self.nested:
+            nested.writeBack()
+
+    def updateObjects(self, components):
+        """
+        Fallback for components without a kernel: run their own update() on synced objects
+        """
+        for component in components:
+            connectors = list(component.connectors)
+            connectors += [input.connectedTo for input in component.inputs if input.connectedTo is not None]
+            for connector in connectors:
+                connector.temp = float(self.temp[self.slot[connector]])
+                connector.flowSpeed = float(self.flow[self.slot[connector]])
+            logicConnectors = [c for c in component.logicConnectors if c is not None]
+            if component.logicInput is not None:
+                logicConnectors += component.logicInput.connectedTo[:1]
+            for logicConnector in logicConnectors:
+                logicConnector.value = float(self.logic[self.logicSlot[logicConnector]])
+
+            component.update()
+
+            for connector in component.connectors:
+                self.temp[self.slot[connector]] = connector.temp
+                self.flow[self.slot[connector]] = connector.flowSpeed
+            for logicConnector in component.logicConnectors:
+                if logicConnector is not None:
+                    self.logic[self.logicSlot[logicConnector]] = logicConnector.value
+
+    def step(self):
+        for batch in self.batches:
+            batch.update()
+
+    def sampler(self, objects, attributes):
+        """
+        Returns a function giving the current values of (object, attribute) pairs: a connector's
+        temp or flowSpeed, a logic connector's value or a Buffer's temp. Used by the headless
+        runner to record series.
+        """
+        groups = {}
+        for position, (obj, attribute) in enumerate(zip(objects, attributes)):
+            if attribute == "value":
+                array, slot = "logic", self.logicSlot[obj]
+            elif obj in self.bufferSlot:
+                array, slot = "bufferTemp", self.bufferSlot[obj]
+            else:
+                array, slot = "temp" if attribute == "temp" else "flow", self.slot[obj]
+            positions, slots = groups.setdefault(array, ([], []))
+            positions.append(position)
+            slots.append(slot)
+        gathers = [(array, np.array(positions, dtype=np.intp), np.array(slots, dtype=np.intp)) for array, (positions, slots) in groups.items()]
+        count = len(objects)
+
+        def sample():
+            values = np.empty(count)
+            for array, positions, slots in gathers:
+                values[positions] = getattr(self, array)[slots]
+            return values.tolist()
+        return sample
+
+def compareWithObjects(components, ticks: int, dt: float = flowModel.dt) -> float:
+    """
+    Runs the object loop and the array engine on copies of components and returns the
+    largest difference in any connector temp, flowSpeed or logic value over all ticks
+    """
+    reference = copy.deepcopy(components)
+    candidate = copy.deepcopy(components)
+    schedule = FlowSchedule(reference)
+    engine = ArrayEngine(candidate)
+
+    referenceConnectors = [c for component in reference for c in component.connectors]
+    candidateSlots = np.array([engine.slot[c] for component in candidate for c in component.connectors], dtype=np.intp)
+    referenceLogic = [c for component in reference for c in component.logicConnectors if c is not None]
+    candidateLogic = np.array([engine.logicSlot[c] for component in candidate for c in component.logicConnectors if c is not None], dtype=np.intp)
+
+    flowModel.dt = dt
+    maxDifference = 0.0
+    for tick in range(ticks):
+        flowModel.iteratie = tick
+        schedule.step()
+        engine.step()
+        temps = np.array([c.temp for c in referenceConnectors])
+        flows = np.array([c.flowSpeed for c in referenceConnectors])
+        logic = np.array([c.value for c in referenceLogic], dtype=float)
+        with np.errstate(invalid="ignore"):
+            maxDifference = max(
+                maxDifference,
+                np.nanmax(np.abs(temps - engine.temp[candidateSlots]), initial=0),
+                np.nanmax(np.abs(flows - engine.flow[candidateSlots]), initial=0),
+                np.nanmax(np.abs(logic - engine.logic[candidateLogic]), initial=0)
+            )
+    return float(maxDifference)
+
+def main(argv=None):
+    from flowRunner import loadFlowFile
+
+    parser = argparse.ArgumentParser(description="Check the array engine against the object loop")
+    parser.add_argument("models", nargs="+")
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    args = parser.parse_args(argv)
+
+    for model in args.models:
+        components = loadFlowFile(model)
+        difference = compareWithObjects(components, args.ticks, args.dt)
+
+        timings = []
+        for engine in (FlowSchedule(copy.deepcopy(components)), ArrayEngine(copy.deepcopy(components))):
+            start = time.perf_counter()
+            for tick in range(args.ticks):
+                flowModel.iteratie = tick
+                engine.step()
+            timings.append(time.perf_counter() - start)
+        print(f"{model}: max difference {difference:.3g}, objects {timings[0]:.3f}s, arrays {timings[1]:.3f}s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import contextlib
+import glob
+import json
+import os
+import time
+import tracemalloc
+
+import flowModel
+from flowRunner import HeadlessRunner, loadFlowFile
+
+# Benchmark harness: the shipped .flow files are fixed workloads, results can be stored as a
+# baseline and later runs are compared against it
+
+repositoryRoot = os.path.dirname(os.path.abspath(__file__))
+
+def defaultWorkloads() -> list[str]:
+    return sorted(glob.glob(os.path.join(repositoryRoot, "*.flow")) + glob.glob(os.path.join(repositoryRoot, "Saves", "*.flow")))
+
+def workloadName(path) -> str:
+    """
+    Shipped models are named relative to the repository, so a baseline works from any directory
+    """
+    path = os.path.abspath(path)
+    if os.path.commonpath([path, repositoryRoot]) == repositoryRoot:
+        return os.path.relpath(path, repositoryRoot).replace(os.sep, "/")
+    return path
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def latencySummary(latencies: list[float], duration: float) -> dict:
+    return {
+        "ticksPerSecond": len(latencies) / duration,
+        "p50Us": percentile(latencies, 0.5) * 1e6,
+        "p90Us": percentile(latencies, 0.9) * 1e6,
+        "p99Us": percentile(latencies, 0.99) * 1e6
+    }
+
+def measureLoad(path, repeats: int) -> float:
+    durations = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        loadFlowFile(path)
+        durations.append(time.perf_counter() - start)
+    return min(durations) * 1e3
+
+def measureHeadless(path, ticks: int, engine: str) -> dict:
+    runner = HeadlessRunner(loadFlowFile(path), engine=engine)
+    flowModel.dt = runner.dt
+    latencies = []
+    clock = time.perf_counter
+    start = clock()
+    for _ in range(ticks):
+        tickStart = clock()
+        runner.step()
+        latencies.append(clock() - tickStart)
+    return latencySummary(latencies, clock() - start)
+
+def measureMemory(path, ticks: int) -> float:
+    """
+    Peak traced memory in kB while loading the model and running it headless
+    """
+    tracemalloc.start()
+    try:
+        runner = HeadlessRunner(loadFlowFile(path))
+        runner.run(ticks)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+def measureRender(path, ticks: int, ticksPerFrame: int) -> dict:
+    """
+    Runs the model on the Tk thread and does the GUI's frame work every ticksPerFrame ticks.
+    Needs a display; the latencies here are per frame.
+    """
+    import tkinter as tk
+    from betterFlowApp import ConnectorApp
+    from flowModel import Plotter
+
+    root = tk.Tk()
+    try:
+        app = ConnectorApp(root)
+        app.components = loadFlowFile(path)
+        app.spatialIndex.rebuild(app.components)
+        app.redraw_canvas()
+        app.plotter.openPlotWindow()
+        schedule = app.getSchedule()
+        plotters = [component for component in schedule.order if isinstance(component, Plotter)]
+        flowModel.dt = HeadlessRunner(app.components).dt
+
+        latencies = []
+        clock = time.perf_counter
+        start = clock()
+        for tick in range(ticks):
+            flowModel.iteratie = tick
+            schedule.step()
+            app.recordPlotterData(plotters)
+            if tick % ticksPerFrame == ticksPerFrame - 1:
+                frameStart = clock()
+                app.redraw_connector(app.captureSnapshot())
+                app.getPlotterData()
+                app.plotter.updatePlot()
+                root.update()
+                latencies.append(clock() - frameStart)
+        duration = clock() - start
+        result = latencySummary(latencies, duration)
+        result["ticksPerSecond"] = ticks / duration
+        return result
+    finally:
+        root.destroy()
+
+def runBenchmarks(workloads: list[str], ticks: int, engines: list[str], render: bool, repeats: int, ticksPerFrame: int) -> dict:
+    results = {}
+    for path in workloads:
+        # Printers print every tick
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            result = {"loadMs": measureLoad(path, repeats), "peakMemoryKb": measureMemory(path, ticks)}
+            for engine in engines:
+                runs = [measureHeadless(path, ticks, engine) for _ in range(repeats)]
+                result[engine] = max(runs, key=lambda run: run["ticksPerSecond"])
+            if render:
+                try:
+                    result["render"] = measureRender(path, ticks, ticksPerFrame)
+                except Exception as error:
+                    result["render"] = {"skipped": str(error)}
+        results[workloadName(path)] = result
+    return results
+
+# Metrics the regression gate checks, True where higher is better. p99Us is only reported:
+# one slow tick in a hundred moves it by far more than the threshold from run to run.
+metricDirections = {"ticksPerSecond": True, "p50Us": False, "p90Us": False, "loadMs": False, "peakMemoryKb": False}
+
+def flatten(result: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in result.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)):
+            flat[f"{prefix}{key}"] = value
+    return flat
+
+def compare(results: dict, baseline: dict, threshold: float, directions: dict = metricDirections) -> list[str]:
+    """
+    Returns a line per metric that got worse than the baseline by more than threshold (0.1 is 10%).
+    Raises ValueError if no metric could be compared, such as a baseline of other workloads.
+    """
+    regressions = []
+    compared = 0
+    for path, result in results.items():
+        if path not in baseline:
+            continue
+        old = flatten(baseline[path])
+        for name, value in flatten(result).items():
+            metric = name.rsplit(".", 1)[-1]
+            if name not in old or old[name] == 0 or metric not in directions:
+                continue
+            compared += 1
+            higherIsBetter = directions[metric]
+            change = value / old[name] - 1
+            if (higherIsBetter and change < -threshold) or (not higherIsBetter and change > threshold):
+                regressions.append(f"{path} {name}: {old[name]:.4g} -> {value:.4g} ({change:+.0%})")
+    if compared == 0:
+        raise ValueError("the results have no workloads or metrics in common with the baseline")
+    return regressions
+
+def printTable(results: dict, engines: list[str]):
+    header = f"{'workload':<36} {'load ms':>8} {'peak kB':>9}"
+    for engine in engines + ["render"]:
+        header += f" {engine + ' t/s':>14} {'p99 us':>9}"
+    print(header)
+    for path, result in results.items():
+        line = f"{path:<36} {result['loadMs']:>8.2f} {result['peakMemoryKb']:>9.0f}"
+        for engine in engines + ["render"]:
+            run = result.get(engine, {})
+            if "ticksPerSecond" in run:
+                line += f" {run['ticksPerSecond']:>14.0f} {run['p99Us']:>9.1f}"
+            else:
+                line += f" {'-':>14} {'-':>9}"
+        print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the simulator on the shipped .flow files")
+    parser.add_argument("models", nargs="*", help="workloads, default every .flow file in the repository root and Saves/")
+    parser.add_argument("--ticks", type=int, default=2000)
+    parser.add_argument("--repeats", type=int, default=3, help="runs per measurement, the best one counts")
+    parser.add_argument("--engine", action="append", choices=["objects", "arrays", "compiled"], help="default all three")
+    parser.add_argument("--render", action="store_true", help="also measure with the GUI drawing, needs a display")
+    parser.add_argument("--ticks-per-frame", type=int, default=50)
+    parser.add_argument("--baseline", default="benchmark-baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change that counts as a regression")
+    parser.add_argument("--output", "-o", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    workloads = args.models or defaultWorkloads()
+    engines = args.engine or ["objects", "arrays", "compiled"]
+    results = runBenchmarks(workloads, args.ticks, engines, args.render, args.repeats, args.ticks_per_frame)
+    printTable(results, engines)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            json.dump(results, file, indent=1)
+        print(f"Baseline written to {args.baseline}")
+        return
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        try:
+            regressions = compare(results, baseline, args.threshold)
+        except ValueError as error:
+            raise SystemExit(f"{args.baseline}: {error}")
+        missing = [path for path in results if path not in baseline]
+        if len(missing) > 0:
+            print(f"Not in {args.baseline}, not compared: {', '.join(missing)}")
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if len(regressions) > 0:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+from flowState import captureState, restoreState
+
+# Checkpoints of the simulation state, to resume a run or go back to an earlier tick
+
+def compactState(state: dict) -> dict:
+    return {
+        "connectors": np.array(state["connectors"], dtype=float).reshape(-1, 2),
+        "logic": np.array(state["logic"], dtype=float),
+        "temps": np.array(state["temps"], dtype=float)
+    }
+
+def stateLayout(state: dict) -> tuple:
+    return len(state["connectors"]), len(state["logic"]), len(state["temps"])
+
+class CheckpointStore:
+    """
+    Keeps the state every interval ticks, keyed by tick (flowModel.iteratie).
+
+    When more than capacity checkpoints are stored, every other one is dropped and the interval
+    doubles, so the store covers the whole run in bounded memory. A checkpoint only fits the
+    components it was taken from; when the number of connectors changes the store is cleared.
+    """
+    def __init__(self, interval: int = 100, capacity: int = 256):
+        self.interval = interval
+        self.capacity = capacity
+        self.clear()
+
+    def clear(self):
+        self.checkpoints = {}
+        self.layout = None
+
+    def __len__(self):
+        return len(self.checkpoints)
+
+    def due(self, tick: int) -> bool:
+        return tick % self.interval == 0 and tick not in self.checkpoints
+
+    def capture(self, tick: int, components):
+        state = compactState(captureState(components))
+        if self.layout is not None and stateLayout(state) != self.layout:
+            self.clear()
+        self.layout = stateLayout(state)
+        self.checkpoints[tick] = state
+        if len(self.checkpoints) > self.capacity:
+            self.thin()
+
+    def thin(self):
+        latest = self.latestTick()
+        while len(self.checkpoints) > self.capacity:
+            self.interval *= 2
+            self.checkpoints = {
+                tick: state for tick, state in self.checkpoints.items()
+                if tick % self.interval == 0 or tick == latest
+            }
+
+    def latestTick(self) -> int:
+        return max(self.checkpoints, default=None)
+
+    def nearestTick(self, tick: int) -> int:
+        """
+        The last checkpoint at or before tick, or None
+        """
+        return max((stored for stored in self.checkpoints if stored <= tick), default=None)
+
+    def restore(self, tick: int, components) -> int:
+        """
+        Restores the last checkpoint at or before tick and returns its tick, or None if there is none
+        """
+        stored = self.nearestTick(tick)
+        if stored is None:
+            return None
+        state = self.checkpoints[stored]
+        if stateLayout(compactState(captureState(components))) != self.layout:
+            self.clear()
+            return None
+        restoreState(components, {key: values.tolist() for key, values in state.items()})
+        return stored
+
+    def discardAfter(self, tick: int):
+        self.checkpoints = {stored: state for stored, state in self.checkpoints.items() if stored <= tick}
+
+    def save(self, path, latestOnly: bool = False):
+        """
+        Writes the checkpoints to an .npz file, through a temporary file so a crash never leaves a broken one
+        """
+        ticks = sorted(self.checkpoints)
+        if latestOnly:
+            ticks = ticks[-1:]
+        temporary = f"{path}.tmp"
+        with open(temporary, "wb") as file:
+            np.savez(
+                file,
+                ticks=np.array(ticks, dtype=np.int64),
+                interval=self.interval,
+                capacity=self.capacity,
+                connectors=np.array([self.checkpoints[tick]["connectors"] for tick in ticks]).reshape(len(ticks), -1, 2),
+                logic=np.array([self.checkpoints[tick]["logic"] for tick in ticks]).reshape(len(ticks), -1),
+                temps=np.array([self.checkpoints[tick]["temps"] for tick in ticks]).reshape(len(ticks), -1)
+            )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path) -> "CheckpointStore":
+        with np.load(path) as data:
+            store = cls(int(data["interval"]), int(data["capacity"]))
+            for i, tick in enumerate(data["ticks"].tolist()):
+                store.checkpoints[tick] = {"connectors": data["connectors"][i], "logic": data["logic"][i], "temps": data["temps"][i]}
+            if len(store.checkpoints) > 0:
+                store.layout = stateLayout(store.checkpoints[store.latestTick()])
+        return store
@@ -0,0 +1,500 @@
+import argparse
+import ast
+import copy
+import hashlib
+import math
+import time
+from operator import itemgetter
+
+import flowModel
+from flowModel import (
+    Component, RealisticSun, SinusSignal, ProfileSignal, LogicClamp, LogicInverter, Sensor,
+    Source, Printer, Plotter, Process, Buffer, Splitter, ProsessKiezer, Merge, Collector
+)
+from flowSchedule import FlowSchedule
+
+# Graph compiler: turns a component graph into one generated step function with a local
+# variable per connector value, so a tick costs no method calls or attribute lookups
+
+# Generated code per source hash; parameters are arguments of build(), so models that only
+# differ in parameter values share the compiled code
+compiledCache = {}
+cacheSize = 64
+
+# Connector layout (inputs, outputs, logic input, logic output) the emitters below expect,
+# None where either is fine. Components with another layout run their own update().
+layouts = {
+    Source: (0, 1, True, False),
+    Printer: (1, 1, False, False),
+    Plotter: (1, 1, False, False),
+    Process: (1, 1, True, False),
+    Buffer: (1, 1, False, False),
+    Splitter: (1, 2, True, False),
+    ProsessKiezer: (1, 3, True, False),
+    Merge: (2, 1, False, False),
+    Collector: (3, 1, False, False),
+    Sensor: (1, 1, None, True),
+    SinusSignal: (0, 0, False, True),
+    ProfileSignal: (0, 0, False, True),
+    RealisticSun: (0, 0, True, True),
+    LogicClamp: (0, 0, True, True),
+    LogicInverter: (0, 0, True, True),
+}
+
+def warmteVerlies(expression: str) -> str:
+    """
+    calculateWarmteVerlies inlined, with the same order of operations
+    """
+    return f"(100 * 0.0005 * ({expression} - 20))"
+
+class StepWriter:
+    """
+    Collects the lines of the generated step function and the values build() receives
+    """
+    def __init__(self, engine):
+        self.engine = engine
+        self.lines = []
+        self.parameters = []
+
+    def parameter(self, value) -> str:
+        self.parameters.append(value)
+        return f"p{len(self.parameters) - 1}"
+
+    def emit(self, line: str):
+        self.lines.append(line)
+
+    def t(self, connector) -> str:
+        return f"t{self.engine.slot[connector]}"
+
+    def f(self, connector) -> str:
+        return f"f{self.engine.slot[connector]}"
+
+    def l(self, logicConnector) -> str:
+        return f"l{self.engine.logicSlot[logicConnector]}"
+
+    def gather(self, component):
+        """
+        Component.update: copy connected values into the input connectors
+        """
+        for input in component.inputs:
+            if input.connectedTo is not None:
+                self.emit(f"{self.t(input)} = {self.t(input.connectedTo)}")
+                self.emit(f"{self.f(input)} = {self.f(input.connectedTo)}")
+        if component.logicInput is not None:
+            if len(component.logicInput.connectedTo) == 0:
+                self.emit(f"{self.l(component.logicInput)} = 0")
+            else:
+                self.emit(f"{self.l(component.logicInput)} = {self.l(component.logicInput.connectedTo[0])}")
+
+    def logicScalar(self, component) -> str:
+        return "1" if component.logicInput.connectedTo == [] else self.l(component.logicInput)
+
+    def passThrough(self, component):
+        self.emit(f"{self.t(component.outputs[0])} = {self.t(component.inputs[0])}")
+        self.emit(f"{self.f(component.outputs[0])} = {self.f(component.inputs[0])}")
+
+    def fallback(self, component):
+        """
+        Runs the component's own update() on objects synced from and back to the locals
+        """
+        synced = list(component.connectors)
+        synced += [input.connectedTo for input in component.inputs if input.connectedTo is not None]
+        logicSynced = [c for c in component.logicConnectors if c is not None]
+        if component.logicInput is not None:
+            logicSynced += component.logicInput.connectedTo[:1]
+
+        for connector in synced:
+            name = self.parameter(connector)
+            self.emit(f"{name}.temp = {self.t(connector)}")
+            self.emit(f"{name}.flowSpeed = {self.f(connector)}")
+        for logicConnector in logicSynced:
+            self.emit(f"{self.parameter(logicConnector)}.value = {self.l(logicConnector)}")
+        owner = self.parameter(component)
+        if component in self.engine.bufferSlot:
+            self.emit(f"{owner}.temp = b{self.engine.bufferSlot[component]}")
+
+        self.emit(f"{owner}.update()")
+
+        for connector in component.connectors:
+            name = self.parameter(connector)
+            self.emit(f"{self.t(connector)} = {name}.temp")
+            self.emit(f"{self.f(connector)} = {name}.flowSpeed")
+        for logicConnector in component.logicConnectors:
+            if logicConnector is not None:
+                self.emit(f"{self.l(logicConnector)} = {self.parameter(logicConnector)}.value")
+        if component in self.engine.bufferSlot:
+            self.emit(f"b{self.engine.bufferSlot[component]} = {owner}.temp")
+
+    def component(self, index: int, component):
+        kind = type(component)
+        self.emit(f"# {index} {kind.__name__}")
+        emitter = emitters.get(kind)
+        if emitter is None or not fitsLayout(component):
+            self.fallback(component)
+            return
+        self.gather(component)
+        emitter(self, component)
+
+def fitsLayout(component) -> bool:
+    logicConnectors = [c for c in component.logicConnectors if c is not None]
+    if any(not isinstance(c.connectedTo, list) for c in logicConnectors):
+        return False
+    layout = layouts.get(type(component))
+    if layout is None:
+        return True
+    actual = (len(component.inputs), len(component.outputs), component.logicInput is not None, component.logicOutput is not None)
+    return all(expected is None or expected == value for expected, value in zip(layout, actual))
+
+# Emitters, one per component type, mirroring the update() methods in flowModel
+
+def sourceEmitter(writer, component):
+    output = component.outputs[0]
+    scalar = writer.logicScalar(component)
+    maxTemp = writer.parameter(component.maxTemp)
+    writer.emit(f"{writer.t(output)} = {maxTemp}" if scalar == "1" else f"{writer.t(output)} = {maxTemp} * {scalar}")
+    writer.emit(f"{writer.f(output)} = {writer.parameter(component.speed)}")
+
+def printerEmitter(writer, component):
+    writer.passThrough(component)
+    writer.emit(f"print({writer.parameter(component)}.name + ':', {writer.t(component.inputs[0])}, {writer.f(component.inputs[0])})")
+
+def plotterEmitter(writer, component):
+    writer.passThrough(component)
+    writer.emit(f"{writer.parameter(component)}.data.append({writer.t(component.inputs[0])})")
+
+def processEmitter(writer, component):
+    temp, output = writer.t(component.inputs[0]), writer.t(component.outputs[0])
+    power = writer.parameter(component.power)
+    scalar = writer.logicScalar(component)
+    deltaT = f"({power} / 4.18)" if scalar == "1" else f"({power} * {scalar} / 4.18)"
+    minTemp, maxTemp = writer.parameter(component.minTemp), writer.parameter(component.maxTemp)
+    writer.emit(f"if {temp} < {minTemp}:")
+    writer.emit(f"    {output} = {temp} - {warmteVerlies(temp)}")
+    writer.emit(f"elif {temp} > {maxTemp}:")
+    writer.emit(f"    {output} = {temp} + {deltaT} - {warmteVerlies(temp)} - ({temp} - {maxTemp})")
+    writer.emit("else:")
+    writer.emit(f"    {output} = {temp} + {deltaT} - {warmteVerlies(temp)}")
+    writer.emit(f"{writer.f(component.outputs[0])} = {writer.f(component.inputs[0])}")
+
+def bufferEmitter(writer, component):
+    temp, flow = writer.t(component.inputs[0]), writer.f(component.inputs[0])
+    state = f"b{writer.engine.bufferSlot[component]}"
+    capacity, maxTemp = writer.parameter(component.capacity), writer.parameter(component.maxTemp)
+    writer.emit(f"v = {flow} * dt * 3600")
+    writer.emit(f"{state} = (v * {temp} + {state} * {capacity}) / (v + {capacity})")
+    writer.emit(f"m = {state} - {warmteVerlies(state)}")
+    # min(m, maxTemp)
+    writer.emit(f"{writer.t(component.outputs[0])} = {maxTemp} if {maxTemp} < m else m")
+    writer.emit(f"{writer.f(component.outputs[0])} = {flow}")
+
+def splitterEmitter(writer, component):
+    temp, flow = writer.t(component.inputs[0]), writer.f(component.inputs[0])
+    for output in component.outputs:
+        writer.emit(f"{writer.t(output)} = {temp} - {warmteVerlies(temp)}")
+    scalar = writer.parameter(component.splitScalar) if component.logicInput.connectedTo == [] else writer.l(component.logicInput)
+    writer.emit(f"{writer.f(component.outputs[0])} = {flow} * {scalar}")
+    writer.emit(f"{writer.f(component.outputs[1])} = {flow} * (1 - {scalar})")
+
+def prosessKiezerEmitter(writer, component):
+    temp, flow = writer.t(component.inputs[0]), writer.f(component.inputs[0])
+    writer.emit(f"m = {temp} - {warmteVerlies(temp)}")
+    for output in component.outputs:
+        writer.emit(f"{writer.t(output)} = m")
+
+    if component.logicInput.connectedTo == []:
+        writer.emit(f"m = {flow} / 3")
+        for output in component.outputs:
+            writer.emit(f"{writer.f(output)} = m")
+        return
+    value = writer.l(component.logicInput)
+    for output, speed in zip(component.outputs, (f"(-2 * {value} + 1)", f"(1 - (2 * abs({value} - 0.5)))", f"(2 * {value} - 1)")):
+        # max(0, m)
+        writer.emit(f"m = {flow} * {speed}")
+        writer.emit(f"{writer.f(output)} = m if m > 0 else 0")
+
+def mixEmitter(writer, component):
+    flows = [writer.f(input) for input in component.inputs]
+    temps = [writer.t(input) for input in component.inputs]
+    output = writer.t(component.outputs[0])
+    writer.emit(f"s = {' + '.join(flows)}")
+    writer.emit("if s != 0:")
+    writer.emit(f"    m = ({' + '.join(f'{f} * {t}' for f, t in zip(flows, temps))}) / s")
+    writer.emit(f"    {output} = m - {warmteVerlies('m')}")
+    writer.emit("else:")
+    writer.emit(f"    {output} = 10")
+    writer.emit(f"{writer.f(component.outputs[0])} = s")
+
+class SensorNames(ast.NodeTransformer):
+    def __init__(self, names: dict[str, str]):
+        self.names = names
+
+    def visit_Name(self, node):
+        if node.id in self.names:
+            return ast.copy_location(ast.Name(self.names[node.id], ast.Load()), node)
+        return node
+
+def sensorEmitter(writer, component):
+    writer.passThrough(component)
+    logicIn = writer.l(component.logicInput) if component.logicInput is not None else "0"
+    names = {"temp": writer.t(component.inputs[0]), "flowSpeed": writer.f(component.inputs[0]), "logicIn": logicIn}
+    expression = ast.unparse(SensorNames(names).visit(ast.parse(component.compareFunction.strip(), mode="eval")))
+    writer.emit(f"m = {expression}")
+    writer.emit(f"{writer.l(component.logicOutput)} = 1 if m > 1 else 0 if m < 0 else m")
+
+def sinusEmitter(writer, component):
+    writer.emit(f"{writer.l(component.logicOutput)} = cos(dt * iteratie * 2 * {math.pi!r} / {writer.parameter(component.period)}) / 2 + 0.5")
+
+def profileEmitter(writer, component):
+    writer.emit(f"{writer.l(component.logicOutput)} = {writer.parameter(component)}.signalAt(dt, iteratie)")
+
+def sunEmitter(writer, component):
+    # clamp(getSunPower(...), 0, 1)
+    writer.emit(f"m = sunPower(dt * iteratie, {writer.l(component.logicInput)})")
+    writer.emit("m = 1 if 1 < m else m")
+    writer.emit(f"{writer.l(component.logicOutput)} = 0 if 0 > m else m")
+
+def logicClampEmitter(writer, component):
+    low, high = writer.parameter(component.min), writer.parameter(component.max)
+    writer.emit(f"m = {writer.l(component.logicInput)}")
+    writer.emit(f"m = {high} if {high} < m else m")
+    writer.emit(f"{writer.l(component.logicOutput)} = {low} if {low} > m else m")
+
+def logicInverterEmitter(writer, component):
+    writer.emit(f"{writer.l(component.logicOutput)} = 1 - {writer.l(component.logicInput)}")
+
+def gatherEmitter(writer, component):
+    pass
+
+emitters = {
+    Component: gatherEmitter,
+    Source: sourceEmitter,
+    Printer: printerEmitter,
+    Plotter: plotterEmitter,
+    Process: processEmitter,
+    Buffer: bufferEmitter,
+    Splitter: splitterEmitter,
+    ProsessKiezer: prosessKiezerEmitter,
+    Merge: mixEmitter,
+    Collector: mixEmitter,
+    Sensor: sensorEmitter,
+    SinusSignal: sinusEmitter,
+    ProfileSignal: profileEmitter,
+    RealisticSun: sunEmitter,
+    LogicClamp: logicClampEmitter,
+    LogicInverter: logicInverterEmitter,
+}
+
+class CompiledEngine:
+    """
+    Runs a component graph through a generated step function.
+
+    All connector values, logic values and Buffer temperatures live in one flat list,
+    state; the step function unpacks it into locals, runs every update in the given order
+    as straight-line code and stores it back. Parameters are read when the engine is
+    built, so build a new engine after editing the model; the compiled code is reused
+    whenever the structure did not change. writeBack() copies the state into the objects,
+    Plotters record their history directly.
+    """
+    def __init__(self, components, order: list = None):
+        self.components = components
+        # The update order, with repeats for inner iterations, see FlowSchedule.updates()
+        self.order = list(order) if order is not None else list(FlowSchedule(components).updates())
+
+        self.slot = {}
+        self.logicSlot = {}
+        self.bufferSlot = {}
+        for component in components:
+            for connector in component.connectors:
+                self.addSlot(self.slot, connector)
+                if connector.connectedTo is not None:
+                    self.addSlot(self.slot, connector.connectedTo)
+            for logicConnector in component.logicConnectors:
+                if logicConnector is None:
+                    continue
+                self.addSlot(self.logicSlot, logicConnector)
+                for other in logicConnector.connectedTo or []:
+                    self.addSlot(self.logicSlot, other)
+            if isinstance(component, Buffer):
+                self.addSlot(self.bufferSlot, component)
+
+        connectorCount, logicCount = len(self.slot), len(self.logicSlot)
+        self.flowOffset = connectorCount
+        self.logicOffset = 2 * connectorCount
+        self.bufferOffset = 2 * connectorCount + logicCount
+        self.state = [0.0] * (self.bufferOffset + len(self.bufferSlot))
+        self.readState()
+
+        self.source, parameters = self.generate()
+        self.key = hashlib.sha1(self.source.encode()).hexdigest()
+        build = compiledCache.get(self.key)
+        if build is None:
+            namespace = {"cos": math.cos, "sunPower": RealisticSun.getSunPower}
+            exec(compile(self.source, f"<flowCompile {self.key[:8]}>", "exec"), namespace)
+            build = namespace["build"]
+            if len(compiledCache) >= cacheSize:
+                compiledCache.pop(next(iter(compiledCache)))
+            compiledCache[self.key] = build
+        self.stepFunction = build(*parameters)
+
+    @staticmethod
+    def addSlot(slots: dict, item):
+        if item not in slots:
+            slots[item] = len(slots)
+
+    def stateNames(self) -> list[str]:
+        names = [f"t{slot}" for slot in range(len(self.slot))]
+        names += [f"f{slot}" for slot in range(len(self.slot))]
+        names += [f"l{slot}" for slot in range(len(self.logicSlot))]
+        names += [f"b{slot}" for slot in range(len(self.bufferSlot))]
+        return names
+
+    def generate(self) -> tuple[str, list]:
+        writer = StepWriter(self)
+        position = {component: i for i, component in enumerate(self.components)}
+        for component in self.order:
+            writer.component(position.get(component, -1), component)
+
+        names = ", ".join(self.stateNames())
+        lines = [f"def build({', '.join(f'p{i}' for i in range(len(writer.parameters)))}):"]
+        lines.append("    def step(state, iteratie, dt):")
+        if len(self.state) > 0:
+            lines.append(f"        {names}, = state")
+        lines += [f"        {line}" for line in writer.lines]
+        if len(self.state) > 0:
+            lines.append(f"        state[:] = {names},")
+        lines.append("        return")
+        lines.append("    return step")
+        return "\n".join(lines) + "\n", writer.parameters
+
+    def readState(self):
+        state = self.state
+        for connector, slot in self.slot.items():
+            state[slot] = connector.temp
+            state[self.flowOffset + slot] = connector.flowSpeed
+        for logicConnector, slot in self.logicSlot.items():
+            state[self.logicOffset + slot] = logicConnector.value
+        for buffer, slot in self.bufferSlot.items():
+            state[self.bufferOffset + slot] = buffer.temp
+
+    def writeBack(self):
+        state = self.state
+        for connector, slot in self.slot.items():
+            connector.temp = state[slot]
+            connector.flowSpeed = state[self.flowOffset + slot]
+        for logicConnector, slot in self.logicSlot.items():
+            logicConnector.value = state[self.logicOffset + slot]
+        for buffer, slot in self.bufferSlot.items():
+            buffer.temp = state[self.bufferOffset + slot]
+
+    # Same views as ArrayEngine, used by ConvergenceMonitor.forArrayEngine
+    @property
+    def temp(self) -> list:
+        return self.state[:self.flowOffset]
+
+    @property
+    def flow(self) -> list:
+        return self.state[self.flowOffset:self.logicOffset]
+
+    @property
+    def logic(self) -> list:
+        return self.state[self.logicOffset:self.bufferOffset]
+
+    @property
+    def bufferTemp(self) -> list:
+        return self.state[self.bufferOffset:]
+
+    def step(self):
+        self.stepFunction(self.state, flowModel.iteratie, flowModel.dt)
+
+    def sampler(self, objects, attributes):
+        """
+        Same as ArrayEngine.sampler: the current values of (object, attribute) pairs
+        """
+        indices = []
+        for obj, attribute in zip(objects, attributes):
+            if attribute == "value":
+                indices.append(self.logicOffset + self.logicSlot[obj])
+            elif obj in self.bufferSlot:
+                indices.append(self.bufferOffset + self.bufferSlot[obj])
+            else:
+                indices.append(self.slot[obj] + (0 if attribute == "temp" else self.flowOffset))
+        if len(indices) == 0:
+            return lambda: []
+        if len(indices) == 1:
+            index = indices[0]
+            return lambda: [self.state[index]]
+        getter = itemgetter(*indices)
+        return lambda: list(getter(self.state))
+
+def compareWithObjects(components, ticks: int, dt: float = flowModel.dt, innerIterations: int = 1) -> float:
+    """
+    Runs the schedule and the compiled engine on copies of components and returns the
+    largest difference in any connector temp, flowSpeed, logic value or Buffer temp over all ticks
+    """
+    reference = copy.deepcopy(components)
+    candidate = copy.deepcopy(components)
+    schedule = FlowSchedule(reference, innerIterations)
+    engine = CompiledEngine(candidate, FlowSchedule(candidate, innerIterations).updates())
+
+    pairs = []
+    for referenceComponent, candidateComponent in zip(reference, candidate):
+        for a, b in zip(referenceComponent.connectors, candidateComponent.connectors):
+            pairs.append((a, "temp", engine.slot[b]))
+            pairs.append((a, "flowSpeed", engine.flowOffset + engine.slot[b]))
+        for a, b in zip(referenceComponent.logicConnectors, candidateComponent.logicConnectors):
+            if a is not None:
+                pairs.append((a, "value", engine.logicOffset + engine.logicSlot[b]))
+        if candidateComponent in engine.bufferSlot:
+            pairs.append((referenceComponent, "temp", engine.bufferOffset + engine.bufferSlot[candidateComponent]))
+
+    flowModel.dt = dt
+    maxDifference = 0.0
+    for tick in range(ticks):
+        flowModel.iteratie = tick
+        schedule.step()
+        engine.step()
+        for obj, attribute, index in pairs:
+            a, b = getattr(obj, attribute), engine.state[index]
+            if a != b and not (a != a and b != b):
+                maxDifference = max(maxDifference, abs(a - b))
+    return float(maxDifference)
+
+def main(argv=None):
+    import contextlib
+    import os
+    from flowRunner import loadFlowFile
+
+    parser = argparse.ArgumentParser(description="Compile .flow models to a step function and check it against the object loop")
+    parser.add_argument("models", nargs="+")
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    parser.add_argument("--inner-iterations", type=int, default=1)
+    parser.add_argument("--source", action="store_true", help="print the generated code")
+    args = parser.parse_args(argv)
+
+    for model in args.models:
+        components = loadFlowFile(model)
+        if args.source:
+            copied = copy.deepcopy(components)
+            print(CompiledEngine(copied, FlowSchedule(copied, args.inner_iterations).updates()).source)
+
+        # Printers print every tick
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            difference = compareWithObjects(components, args.ticks, args.dt, args.inner_iterations)
+
+            start = time.perf_counter()
+            copied = copy.deepcopy(components)
+            compiled = CompiledEngine(copied, FlowSchedule(copied, args.inner_iterations).updates())
+            compileTime = time.perf_counter() - start
+
+            timings = []
+            for engine in (FlowSchedule(copy.deepcopy(components), args.inner_iterations), compiled):
+                start = time.perf_counter()
+                for tick in range(args.ticks):
+                    flowModel.iteratie = tick
+                    engine.step()
+                timings.append(time.perf_counter() - start)
+        print(f"{model}: max difference {difference:.3g}, objects {timings[0]:.3f}s, compiled {timings[1]:.3f}s (+{compileTime * 1000:.1f}ms to build)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import numpy as np
+
+from flowState import maxDifference
+
+# Steady-state detection, so runs that only look for the equilibrium can stop early
+
+class ConvergenceMonitor:
+    """
+    Tracks the largest change per tick over all connector temps and flow speeds and Buffer.temp.
+    The run counts as converged once that change stayed under tolerance for window ticks in a row;
+    convergedAt is the first tick of that window.
+    """
+    def __init__(self, readState, tolerance: float = 1e-4, window: int = 100):
+        self.readState = readState
+        self.tolerance = tolerance
+        self.window = window
+        self.previous = None
+        self.quietTicks = 0
+        self.lastChange = np.inf
+        self.convergedAt = None
+
+    @classmethod
+    def forComponents(cls, components, tolerance: float = 1e-4, window: int = 100):
+        connectors = [connector for component in components for connector in component.connectors]
+        buffers = [component for component in components if hasattr(component, "temp")]
+        def readState():
+            values = [connector.temp for connector in connectors]
+            values += [connector.flowSpeed for connector in connectors]
+            values += [buffer.temp for buffer in buffers]
+            return np.array(values, dtype=float)
+        return cls(readState, tolerance, window)
+
+    @classmethod
+    def forArrayEngine(cls, engine, tolerance: float = 1e-4, window: int = 100):
+        return cls(lambda: np.concatenate((engine.temp, engine.flow, engine.bufferTemp)), tolerance, window)
+
+    @property
+    def converged(self) -> bool:
+        return self.convergedAt is not None
+
+    def observe(self, tick: int) -> bool:
+        """
+        Call once after every tick, returns True once the run has converged
+        """
+        current = self.readState()
+        if self.previous is not None:
+            self.lastChange = maxDifference(current, self.previous)
+            if self.lastChange < self.tolerance:
+                self.quietTicks += 1
+            else:
+                self.quietTicks = 0
+            if self.convergedAt is None and self.quietTicks >= self.window:
+                self.convergedAt = tick - self.window + 1
+        self.previous = current
+        return self.converged
@@ -0,0 +1,192 @@
+import argparse
+import time
+
+import numpy as np
+
+import flowModel
+from flowModel import Buffer, LogicClamp, Plotter, Printer, Process, Sensor, SinusSignal, Source, Splitter
+from flowArrays import ArrayEngine, kernels, passThrough
+from flowRunner import loadFlowFile, uniqueNames
+from flowSweep import findComponents, gridVariants, parseDistribution, parseValues, randomVariants, runVariant, writeTable
+
+# Ensemble engine: K variants of one model advance in lockstep, every state value gets a variant axis
+
+# Parameters the kernels can read per variant
+ensembleParameters = {
+    Source: ("maxTemp", "speed"),
+    Process: ("power", "minTemp", "maxTemp"),
+    Buffer: ("capacity", "maxTemp"),
+    Splitter: ("splitScalar",),
+    SinusSignal: ("period",),
+    LogicClamp: ("min", "max"),
+}
+
+def variantOverrides(components, variants: list[dict]) -> dict:
+    """
+    {(component, key): value per variant} for the "Name.key" addresses used in the variants,
+    components not mentioned in a variant keep their own value there
+    """
+    overrides = {}
+    for k, variant in enumerate(variants):
+        for address, value in variant.items():
+            name, key = address.rsplit(".", 1)
+            matches = findComponents(components, name)
+            if len(matches) == 0:
+                raise KeyError(f"No component named {name}")
+            for component in matches:
+                if key not in ensembleParameters.get(type(component), ()):
+                    raise KeyError(f"{type(component).__name__} {name} has no variable {key} the ensemble engine can vary")
+                if (component, key) not in overrides:
+                    overrides[(component, key)] = np.full(len(variants), float(getattr(component, key)))
+                overrides[(component, key)][k] = float(value)
+    return overrides
+
+def sensorKernel(engine, batch):
+    """
+    Sensor expressions are evaluated on all variants at once when they work on arrays,
+    otherwise (and, if, min()) once per variant
+    """
+    passThrough(engine, batch)
+    temps = engine.temp[batch.inputs[0]]
+    flows = engine.flow[batch.inputs[0]]
+    logicIns = engine.logic[batch.logicIn] if hasattr(batch, "logicIn") else np.zeros_like(temps)
+    for i, sensor in enumerate(batch.components):
+        output = None
+        if sensor not in engine.scalarSensors:
+            try:
+                with np.errstate(all="ignore"):
+                    output = np.clip(np.asarray(sensor.compiledCompareFunction(temps[i], flows[i], logicIns[i]), dtype=float), 0, 1)
+            except (TypeError, ValueError, ArithmeticError):
+                engine.scalarSensors.add(sensor)
+            if output is not None and output.shape != temps[i].shape:
+                engine.scalarSensors.add(sensor)
+                output = None
+        if output is None:
+            output = [sensor.compare(*values) for values in zip(temps[i].tolist(), flows[i].tolist(), logicIns[i].tolist())]
+        engine.logic[batch.logicOut[i]] = output
+
+class EnsembleEngine(ArrayEngine):
+    """
+    ArrayEngine with a variant axis: every state array is (slots, K) and the parameters in
+    ensembleParameters can differ per variant, so one pass over the kernels advances all
+    K variants. Plotters keep no history and Printers do not print here; read the values
+    from the state arrays instead. writeBack(k) copies variant k into the component objects.
+    """
+    kernels = {**kernels, Plotter: passThrough, Printer: passThrough, Sensor: sensorKernel}
+
+    def __init__(self, components, variants: list[dict], schedule=None):
+        self.variants = variants
+        self.size = len(variants)
+        self.overrides = variantOverrides(components, variants)
+        self.scalarSensors = set()
+        super().__init__(components, schedule)
+
+    def allocate(self, slots: int) -> np.ndarray:
+        return np.zeros((slots, self.size))
+
+    def column(self, values: np.ndarray) -> np.ndarray:
+        return values[:, None]
+
+    def parameter(self, components, name) -> np.ndarray:
+        return np.array([
+            self.overrides.get((component, name), np.full(self.size, float(getattr(component, name))))
+            for component in components
+        ])
+
+    def variantViews(self, k: int):
+        """
+        Swaps the state arrays for views on variant k, returns the full arrays to put back
+        """
+        arrays = self.temp, self.flow, self.logic, self.bufferTemp
+        self.temp, self.flow, self.logic, self.bufferTemp = (array[:, k] for array in arrays)
+        return arrays
+
+    def updateObjects(self, components):
+        for k in range(self.size):
+            arrays = self.variantViews(k)
+            try:
+                super().updateObjects(components)
+            finally:
+                self.temp, self.flow, self.logic, self.bufferTemp = arrays
+
+    def writeBack(self, k: int = 0):
+        arrays = self.variantViews(k)
+        try:
+            super().writeBack()
+        finally:
+            self.temp, self.flow, self.logic, self.bufferTemp = arrays
+
+def runEnsemble(components, variants: list[dict], ticks: int, dt: float = flowModel.dt) -> list[dict]:
+    """
+    Runs all variants in one EnsembleEngine and returns the same rows as flowSweep.sweep:
+    final, mean, min and max of every Plotter per variant
+    """
+    engine = EnsembleEngine(components, variants)
+    plotters = [(name, component) for name, component in zip(uniqueNames(components), components) if isinstance(component, Plotter)]
+    slots = np.array([engine.slot[component.inputs[0]] for _, component in plotters], dtype=np.intp)
+
+    flowModel.dt = dt
+    total = np.zeros((len(slots), engine.size))
+    low = np.full((len(slots), engine.size), np.inf)
+    high = np.full((len(slots), engine.size), -np.inf)
+    values = total
+    for tick in range(ticks):
+        flowModel.iteratie = tick
+        engine.step()
+        values = engine.temp[slots]
+        total += values
+        np.minimum(low, values, out=low)
+        np.maximum(high, values, out=high)
+
+    rows = []
+    for k, variant in enumerate(variants):
+        row = {"variant": k, **variant}
+        if ticks > 0:
+            for i, (name, _) in enumerate(plotters):
+                row[f"{name}.final"] = float(values[i, k])
+                row[f"{name}.mean"] = float(total[i, k] / ticks)
+                row[f"{name}.min"] = float(low[i, k])
+                row[f"{name}.max"] = float(high[i, k])
+        rows.append(row)
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run variants of a .flow model as one ensemble and check it against separate runs")
+    parser.add_argument("model")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME.KEY=VALUES", help="grid values, e.g. Process.power=80:150:10")
+    parser.add_argument("--random", action="append", default=[], metavar="NAME.KEY=DIST", help="random values, e.g. Process.power=uniform:80:150")
+    parser.add_argument("--samples", type=int, default=100)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    parser.add_argument("--check", type=int, default=0, metavar="N", help="also run the first N variants one by one and report the largest difference")
+    parser.add_argument("--output", "-o", help="write the rows as CSV")
+    args = parser.parse_args(argv)
+
+    if len(args.set) > 0:
+        variants = gridVariants({address: parseValues(values) for address, values in (item.split("=", 1) for item in args.set)})
+    elif len(args.random) > 0:
+        distributions = {address: parseDistribution(text) for address, text in (item.split("=", 1) for item in args.random)}
+        variants = randomVariants(distributions, args.samples, args.seed)
+    else:
+        parser.error("nothing to vary, give --set or --random")
+
+    start = time.perf_counter()
+    try:
+        rows = runEnsemble(loadFlowFile(args.model), variants, args.ticks, args.dt)
+    except KeyError as error:
+        parser.error(error.args[0])
+    print(f"{len(rows)} variants in {time.perf_counter() - start:.2f}s as one ensemble")
+
+    if args.check > 0:
+        start = time.perf_counter()
+        difference = 0.0
+        for row, variant in zip(rows, variants[:args.check]):
+            for name, value in runVariant(args.model, variant, args.ticks, args.dt).items():
+                difference = max(difference, abs(row[name] - value))
+        print(f"{min(args.check, len(rows))} variants one by one in {time.perf_counter() - start:.2f}s, max difference {difference:.3g}")
+    if args.output is not None:
+        writeTable(rows, args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+import argparse
+import io
+import json
+import os
+import shutil
+
+from flowModel import Connector, LogicConnector, Component, createComponent
+
+# Versioned model file format: components with their inspector parameters, initial connector
+# values and a list of edges, stored as compact JSON. Unlike the pickled files it does not
+# depend on class layouts and leaves out Plotter histories.
+
+formatName = "heatflow"
+formatVersion = 1
+
+# Upgrades a loaded document from version n to n + 1, for when the schema changes
+migrations = {}
+
+# Parameters holding a file name, stored relative to the model file so a model can be moved
+# together with the files it uses
+fileParameters = {"SubFlow": ("path",), "ProfileSignal": ("path",)}
+
+def relativePath(path: str, baseDir) -> str:
+    if path == "" or baseDir is None:
+        return path
+    try:
+        return os.path.relpath(os.path.abspath(path), baseDir).replace(os.sep, "/")
+    except ValueError:
+        # On another drive than the model
+        return os.path.abspath(path)
+
+def resolvePath(path: str, baseDir) -> str:
+    """
+    A stored file name as a usable path: relative to the model file's directory, or as it was
+    for older files that stored it relative to the working directory
+    """
+    if path == "" or baseDir is None or os.path.isabs(path):
+        return path
+    resolved = os.path.normpath(os.path.join(baseDir, path))
+    if not os.path.exists(resolved) and os.path.exists(path):
+        return path
+    return resolved
+
+def isPickle(data: bytes) -> bool:
+    # Pickles start with the PROTO opcode (or another opcode for protocol 0 and 1), never with {
+    return not data.lstrip().startswith(b"{")
+
+def connectorLayout(component) -> dict:
+    """
+    The connector layout of a component, or an empty dict if it matches the current class.
+    Older files can have connectors the class no longer creates.
+    """
+    default = createComponent(type(component).__name__, "", 0, 0)
+    layout = {}
+    inputs = [connector.name for connector in component.inputs]
+    outputs = [connector.name for connector in component.outputs]
+    logic = [component.logicInput is not None, component.logicOutput is not None]
+    if type(component) is Component or inputs != [connector.name for connector in default.inputs]:
+        layout["inputs"] = inputs
+    if type(component) is Component or outputs != [connector.name for connector in default.outputs]:
+        layout["outputs"] = outputs
+    if logic != [default.logicInput is not None, default.logicOutput is not None]:
+        layout["logic"] = logic
+    return layout
+
+def componentState(component) -> dict:
+    """
+    Connector values and the Buffer temperature. They are the initial conditions of the model:
+    flow going round a closed loop is never reset, and unconnected inputs keep their value.
+    """
+    state = {
+        "connectors": [[connector.temp, connector.flowSpeed] for connector in component.connectors],
+        "logic": [None if logicConnector is None else logicConnector.value for logicConnector in component.logicConnectors]
+    }
+    if hasattr(component, "temp"):
+        state["temp"] = component.temp
+    return state
+
+def setComponentState(component, state: dict):
+    for connector, (temp, flowSpeed) in zip(component.connectors, state["connectors"]):
+        connector.temp = temp
+        connector.flowSpeed = flowSpeed
+    for logicConnector, value in zip(component.logicConnectors, state["logic"]):
+        if logicConnector is not None and value is not None:
+            logicConnector.value = value
+    if "temp" in state:
+        component.temp = state["temp"]
+
+def toDocument(components, baseDir=None) -> dict:
+    """
+    With baseDir, the directory of the model file, file names are stored relative to it
+    """
+    index = {component: i for i, component in enumerate(components)}
+    records = []
+    for component in components:
+        params = component.inspect()
+        for key in fileParameters.get(type(component).__name__, ()):
+            params[key] = relativePath(params[key], baseDir)
+        records.append({
+            "type": type(component).__name__,
+            "x": component.x,
+            "y": component.y,
+            "params": params,
+            **connectorLayout(component)
+        })
+        records[-1]["state"] = componentState(component)
+
+    # Connectors are referenced as [component, position in component.connectors],
+    # logic connectors as [component, 0 for logicInput or 1 for logicOutput]
+    connectorRef = {}
+    logicRef = {}
+    for component in components:
+        for position, connector in enumerate(component.connectors):
+            connectorRef[connector] = [index[component], position]
+        for position, logicConnector in enumerate(component.logicConnectors):
+            if logicConnector is not None:
+                logicRef[logicConnector] = [index[component], position]
+
+    edges = []
+    for component in components:
+        for output in component.outputs:
+            if output.connectedTo is not None and output.connectedTo in connectorRef:
+                edges.append(connectorRef[output] + connectorRef[output.connectedTo])
+    # Remaining connections that do not start at an output
+    seen = {(edge[0], edge[1]) for edge in edges} | {(edge[2], edge[3]) for edge in edges}
+    for component in components:
+        for input in component.inputs:
+            if input.connectedTo is not None and tuple(connectorRef[input]) not in seen and input.connectedTo in connectorRef:
+                edges.append(connectorRef[input.connectedTo] + connectorRef[input])
+                seen.add(tuple(connectorRef[input]))
+                seen.add(tuple(connectorRef[input.connectedTo]))
+
+    # Logic inputs first, so the order of logicInput.connectedTo survives (its first entry is the one read)
+    logicEdges = []
+    seenLogic = set()
+    for logicConnector in [component.logicInput for component in components] + [component.logicOutput for component in components]:
+        if logicConnector is None:
+            continue
+        for other in logicConnector.connectedTo:
+            if other not in logicRef or frozenset((logicConnector, other)) in seenLogic:
+                continue
+            seenLogic.add(frozenset((logicConnector, other)))
+            logicEdges.append(logicRef[other] + logicRef[logicConnector])
+
+    return {
+        "format": formatName,
+        "version": formatVersion,
+        "components": records,
+        "edges": edges,
+        "logicEdges": logicEdges
+    }
+
+def fromDocument(document: dict, baseDir=None) -> list:
+    """
+    With baseDir, the directory of the model file, stored file names are resolved against it
+    """
+    if document.get("format") != formatName:
+        raise ValueError("Not a heatflow model file")
+    version = document.get("version", 0)
+    if version > formatVersion:
+        raise ValueError(f"Model file version {version} is newer than this program supports ({formatVersion})")
+    while version < formatVersion:
+        document = migrations[version](document)
+        version += 1
+
+    components = []
+    for record in document["components"]:
+        params = record["params"]
+        component = createComponent(record["type"], params["name"], record["x"], record["y"])
+        if "inputs" in record or "outputs" in record:
+            inputs = [Connector(name) for name in record["inputs"]] if "inputs" in record else component.inputs
+            outputs = [Connector(name) for name in record["outputs"]] if "outputs" in record else component.outputs
+            component.inputs = inputs
+            component.outputs = outputs
+            component.connectors = inputs + outputs
+        if "logic" in record:
+            hasInput, hasOutput = record["logic"]
+            component.logicInput = (component.logicInput or LogicConnector()) if hasInput else None
+            component.logicOutput = (component.logicOutput or LogicConnector()) if hasOutput else None
+            component.logicConnectors = [component.logicInput, component.logicOutput]
+
+        files = fileParameters.get(record["type"], ())
+        for key, value in params.items():
+            if key in files:
+                value = resolvePath(value, baseDir)
+            if key != "name":
+                component.editVariable(key, value)
+        if "state" in record:
+            setComponentState(component, record["state"])
+        components.append(component)
+
+    for fromComponent, fromPosition, toComponent, toPosition in document["edges"]:
+        fromConnector = components[fromComponent].connectors[fromPosition]
+        toConnector = components[toComponent].connectors[toPosition]
+        fromConnector.connectedTo = toConnector
+        toConnector.connectedTo = fromConnector
+
+    for fromComponent, fromPosition, toComponent, toPosition in document["logicEdges"]:
+        fromConnector = components[fromComponent].logicConnectors[fromPosition]
+        toConnector = components[toComponent].logicConnectors[toPosition]
+        fromConnector.connectedTo.append(toConnector)
+        toConnector.connectedTo.append(fromConnector)
+    return components
+
+def dumps(components, baseDir=None) -> bytes:
+    return json.dumps(toDocument(components, baseDir), separators=(",", ":")).encode("utf-8")
+
+def loads(data: bytes, baseDir=None) -> list:
+    return fromDocument(json.loads(data), baseDir)
+
+def modelDirectory(path) -> str:
+    return os.path.dirname(os.path.abspath(path))
+
+def saveFlowFile(components, path):
+    with open(path, "wb") as file:
+        file.write(dumps(components, modelDirectory(path)))
+
+def convertFile(path, outputPath=None, backup: bool = True) -> bool:
+    """
+    Rewrites a pickled .flow file in the new format. Returns False if it already was converted.
+    """
+    from flowRunner import loadComponents
+
+    with open(path, "rb") as file:
+        data = file.read()
+    if not isPickle(data):
+        return False
+    components = loadComponents(io.BytesIO(data))
+    if outputPath is None:
+        outputPath = path
+        if backup:
+            shutil.copyfile(path, path + ".pickle")
+    saveFlowFile(components, outputPath)
+    return True
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert pickled .flow files to the versioned format")
+    parser.add_argument("models", nargs="+")
+    parser.add_argument("--output-dir", help="write converted files here instead of replacing them")
+    parser.add_argument("--no-backup", action="store_true", help="do not keep the pickled file as <name>.pickle")
+    args = parser.parse_args(argv)
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    for model in args.models:
+        outputPath = os.path.join(args.output_dir, os.path.basename(model)) if args.output_dir else None
+        if convertFile(model, outputPath, not args.no_backup):
+            print(f"{model}: converted")
+        else:
+            print(f"{model}: already in the new format")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+import argparse
+import random
+
+from flowModel import Buffer, Collector, LogicClamp, LogicInverter, Merge, Plotter, Process, ProsessKiezer, Sensor, SinusSignal, Source, Splitter
+
+# Random but valid flow graphs of a given size, built from the normal component classes,
+# for measuring how the simulator scales far beyond the shipped models
+
+shapes = ("chains", "branching", "loops")
+
+columnWidth = 160
+rowHeight = 70
+
+def connect(output, input):
+    output.connectedTo = input
+    input.connectedTo = output
+
+def connectLogic(source, target):
+    source.connectedTo.append(target)
+    target.connectedTo.append(source)
+
+class GraphBuilder:
+    """
+    Builds the graph line by line. A line starts at a Source and grows by attaching
+    components to its open (unconnected) outputs, and ends with a Plotter per open output.
+
+    chains only uses components with one input and one output, branching adds Splitters,
+    ProsessKiezers, Merges and Collectors, and loops also feeds part of the flow back into
+    earlier Merges through a Splitter, so the schedule gets cycles. With logicShare a part
+    of the logic inputs is driven by a SinusSignal (optionally through a LogicClamp or
+    LogicInverter) or by a Sensor earlier in the same line.
+    """
+    def __init__(self, shape: str = "branching", seed: int = 0, logicShare: float = 0.3, lineLength: int = 40):
+        if shape not in shapes:
+            raise ValueError(f"Unknown shape {shape}, use {', '.join(shapes)}")
+        self.shape = shape
+        self.random = random.Random(seed)
+        self.logicShare = logicShare
+        self.lineLength = lineLength
+        self.components = []
+        self.top = 0
+
+    def place(self, component, column: int, lane: int):
+        component.x = 100 + column * columnWidth
+        component.y = self.top + 40 + lane * rowHeight
+        self.components.append(component)
+        return component
+
+    def newLane(self) -> int:
+        self.lanes += 1
+        return self.lanes - 1
+
+    def driveLogic(self, component, column: int):
+        """
+        Connects a logic source to component's logic input, for a logicShare part of them
+        """
+        if self.random.random() >= self.logicShare:
+            return
+        if len(self.sensors) > 0 and self.random.random() < 0.5:
+            connectLogic(self.random.choice(self.sensors).logicOutput, component.logicInput)
+            return
+        lane = self.newLane()
+        signal = self.place(SinusSignal("SinusSignal", 0, 0, self.random.choice([6, 12, 24, 48])), column, lane)
+        source = signal.logicOutput
+        kind = self.random.random()
+        if kind < 0.3:
+            clamp = self.place(LogicClamp("LogicClamp", 0, 0, 0.2, 0.8), column + 1, lane)
+            connectLogic(source, clamp.logicInput)
+            source = clamp.logicOutput
+        elif kind < 0.5:
+            inverter = self.place(LogicInverter("LogicInverter", 0, 0), column + 1, lane)
+            connectLogic(source, inverter.logicInput)
+            source = inverter.logicOutput
+        connectLogic(source, component.logicInput)
+
+    def series(self):
+        kind = self.random.random()
+        if kind < 0.5:
+            return Process("Process", 0, 0, self.random.uniform(50, 150))
+        if kind < 0.75:
+            return Buffer("Buffer", 0, 0, 100, self.random.uniform(50, 500))
+        return Sensor("Sensor", 0, 0, "temp / 100")
+
+    def grow(self, open: list):
+        """
+        Attaches one component to the open outputs, which are (connector, column, lane)
+        """
+        kind = self.random.random()
+        branching = self.shape != "chains"
+        if branching and kind < 0.15 and len(open) >= 2:
+            count = 3 if len(open) >= 3 and self.random.random() < 0.3 else 2
+            picked = [open.pop(self.random.randrange(len(open))) for _ in range(count)]
+            column = max(c for _, c, _ in picked) + 1
+            lane = min(l for _, _, l in picked)
+            component = self.place(Merge("Merge", 0, 0) if count == 2 else Collector("Collector", 0, 0), column, lane)
+            for (output, _, _), input in zip(picked, component.inputs):
+                connect(output, input)
+        else:
+            output, column, lane = open.pop(self.random.randrange(len(open)))
+            column += 1
+            if branching and kind < 0.3 and len(open) < 5:
+                if self.random.random() < 0.7:
+                    component = self.place(Splitter("Splitter", 0, 0, self.random.uniform(0.2, 0.8)), column, lane)
+                else:
+                    component = self.place(ProsessKiezer("ProsessKiezer", 0, 0), column, lane)
+                self.driveLogic(component, column)
+            elif self.shape == "loops" and kind < 0.36:
+                # The second input is connected at the end of the line, to flow coming back
+                component = self.place(Merge("Merge", 0, 0), column, lane)
+                self.returns.append(component.inputs[1])
+            else:
+                component = self.place(self.series(), column, lane)
+                if isinstance(component, Sensor):
+                    self.sensors.append(component)
+                elif isinstance(component, Process):
+                    self.driveLogic(component, column)
+            connect(output, component.inputs[0])
+        # Extra outputs get their own lane, so branches do not overlap
+        for k, output in enumerate(component.outputs):
+            open.append((output, column, lane if k == 0 else self.newLane()))
+
+    def line(self, budget: int):
+        self.lanes = 1
+        self.sensors = []
+        self.returns = []
+        source = self.place(Source("Source", 0, 0, self.random.uniform(60, 100), self.random.uniform(0.5, 2)), 0, 0)
+        self.driveLogic(source, 0)
+        open = [(source.outputs[0], 0, 0)]
+        # Room for the Plotters at the end and a Splitter per feedback
+        while len(self.components) + len(open) + len(self.returns) < budget:
+            self.grow(open)
+
+        for input in self.returns:
+            output, column, lane = open.pop(self.random.randrange(len(open)))
+            splitter = self.place(Splitter("Splitter", 0, 0, self.random.uniform(0.3, 0.7)), column + 1, lane)
+            connect(output, splitter.inputs[0])
+            connect(splitter.outputs[0], input)
+            open.append((splitter.outputs[1], column + 1, lane))
+        for output, column, lane in open:
+            plotter = self.place(Plotter("Plotter", 0, 0), column + 1, lane)
+            connect(output, plotter.inputs[0])
+        self.top += self.lanes * rowHeight + 40
+
+    def build(self, size: int) -> list:
+        while len(self.components) < size:
+            length = self.random.randint(self.lineLength // 2, self.lineLength * 3 // 2)
+            self.line(min(size, len(self.components) + length))
+        return self.components
+
+def generateGraph(size: int, shape: str = "branching", seed: int = 0, logicShare: float = 0.3, lineLength: int = 40) -> list:
+    """
+    A random valid model of about size components. The same arguments give the same model.
+    """
+    return GraphBuilder(shape, seed, logicShare, lineLength).build(size)
+
+def main(argv=None):
+    from flowFormat import saveFlowFile
+
+    parser = argparse.ArgumentParser(description="Generate a random but valid .flow model of a given size")
+    parser.add_argument("output")
+    parser.add_argument("--size", type=int, default=1000, help="number of components, about")
+    parser.add_argument("--shape", choices=shapes, default="branching")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--logic-share", type=float, default=0.3, help="part of the logic inputs that gets a signal")
+    parser.add_argument("--line-length", type=int, default=40, help="average components per line from a Source")
+    args = parser.parse_args(argv)
+
+    components = generateGraph(args.size, args.shape, args.seed, args.logic_share, args.line_length)
+    saveFlowFile(components, args.output)
+    print(f"{args.output}: {len(components)} components, shape {args.shape}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import numpy as np
+
+# Bounded history of a value per tick, used by Plotter and the live plot
+
+defaultCapacity = 4096
+
+class HistoryBuffer:
+    """
+    Keeps the last `capacity` values exactly in a ring buffer. Older values are rolled up
+    into at most `capacity` buckets with their mean, min and max; when the buckets are full,
+    neighbouring buckets are merged and every bucket covers twice as many ticks.
+    Memory stays fixed however long the run is, while series() still spans the whole run.
+    """
+    def __init__(self, capacity: int = defaultCapacity):
+        self.capacity = capacity + capacity % 2
+        self.length = 0
+        self.minimum = np.inf
+        self.maximum = -np.inf
+
+        self.recent = np.empty(self.capacity)
+        self.recentStart = 0
+        self.recentCount = 0
+
+        self.bucketMean = np.empty(self.capacity)
+        self.bucketMin = np.empty(self.capacity)
+        self.bucketMax = np.empty(self.capacity)
+        self.bucketCount = 0
+        self.bucketSize = 1
+        self.resetOpenBucket()
+
+    def resetOpenBucket(self):
+        self.openCount = 0
+        self.openSum = 0.0
+        self.openMin = np.inf
+        self.openMax = -np.inf
+
+    def __len__(self):
+        return self.length
+
+    def append(self, value):
+        value = float(value)
+        if self.recentCount == self.capacity:
+            self.archive(self.recent[self.recentStart])
+            self.recent[self.recentStart] = value
+            self.recentStart = (self.recentStart + 1) % self.capacity
+        else:
+            self.recent[(self.recentStart + self.recentCount) % self.capacity] = value
+            self.recentCount += 1
+
+        self.length += 1
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+
+    def extend(self, values):
+        for value in values:
+            self.append(value)
+
+    def archive(self, value):
+        self.openCount += 1
+        self.openSum += value
+        if value < self.openMin:
+            self.openMin = value
+        if value > self.openMax:
+            self.openMax = value
+
+        if self.openCount < self.bucketSize:
+            return
+        if self.bucketCount == self.capacity:
+            # The open bucket keeps filling up to the new, doubled bucket size
+            self.compact()
+            return
+
+        self.bucketMean[self.bucketCount] = self.openSum / self.openCount
+        self.bucketMin[self.bucketCount] = self.openMin
+        self.bucketMax[self.bucketCount] = self.openMax
+        self.bucketCount += 1
+        self.resetOpenBucket()
+
+    def compact(self):
+        half = self.bucketCount // 2
+        self.bucketMean[:half] = (self.bucketMean[0:self.bucketCount:2] + self.bucketMean[1:self.bucketCount:2]) / 2
+        self.bucketMin[:half] = np.minimum(self.bucketMin[0:self.bucketCount:2], self.bucketMin[1:self.bucketCount:2])
+        self.bucketMax[:half] = np.maximum(self.bucketMax[0:self.bucketCount:2], self.bucketMax[1:self.bucketCount:2])
+        self.bucketCount = half
+        self.bucketSize *= 2
+
+    def truncate(self, length: int):
+        """
+        Drops everything after the first length values. Values already rolled up into a bucket
+        can not be split again, so the kept part of that bucket gets the bucket's mean.
+        """
+        length = max(0, length)
+        if length >= self.length:
+            return
+        archived = self.length - self.recentCount
+        if length >= archived:
+            # Unroll the ring, values() expects it to start at 0 until it is full
+            kept = self.values()[:length - archived].copy()
+            self.recent[:len(kept)] = kept
+            self.recentStart = 0
+            self.recentCount = len(kept)
+        else:
+            keep = min(self.bucketCount, length // self.bucketSize)
+            rest = length - keep * self.bucketSize
+            if keep < self.bucketCount:
+                mean, low, high = self.bucketMean[keep], self.bucketMin[keep], self.bucketMax[keep]
+            else:
+                mean, low, high = self.openSum / max(self.openCount, 1), self.openMin, self.openMax
+            self.bucketCount = keep
+            self.resetOpenBucket()
+            if rest > 0:
+                self.openCount = rest
+                self.openSum = mean * rest
+                self.openMin = low
+                self.openMax = high
+            self.recentStart = 0
+            self.recentCount = 0
+        self.length = length
+
+        _, _, mins, maxs = self.series()
+        self.minimum = float(mins.min(initial=np.inf))
+        self.maximum = float(maxs.max(initial=-np.inf))
+
+    def values(self) -> np.ndarray:
+        """
+        The exactly kept recent values, oldest first
+        """
+        return np.roll(self.recent[:self.recentCount] if self.recentCount < self.capacity else self.recent, -self.recentStart)
+
+    def last(self) -> float:
+        if self.recentCount == 0:
+            # Only after truncate() into the rolled up part
+            return float(self.series()[1][-1])
+        return float(self.recent[(self.recentStart + self.recentCount - 1) % self.capacity])
+
+    def series(self):
+        """
+        Returns tick, mean, min and max arrays covering the whole run: one point per bucket,
+        then the recent values
+        """
+        bucketTicks = (np.arange(self.bucketCount) + 0.5) * self.bucketSize - 0.5
+        ticks = [bucketTicks]
+        means = [self.bucketMean[:self.bucketCount]]
+        mins = [self.bucketMin[:self.bucketCount]]
+        maxs = [self.bucketMax[:self.bucketCount]]
+
+        if self.openCount > 0:
+            ticks.append([self.bucketCount * self.bucketSize + (self.openCount - 1) / 2])
+            means.append([self.openSum / self.openCount])
+            mins.append([self.openMin])
+            maxs.append([self.openMax])
+
+        recent = self.values()
+        ticks.append(np.arange(self.length - self.recentCount, self.length))
+        means.append(recent)
+        mins.append(recent)
+        maxs.append(recent)
+        return np.concatenate(ticks), np.concatenate(means), np.concatenate(mins), np.concatenate(maxs)
@@ -0,0 +1,922 @@
+import ast
+import builtins
+import math
+
+dt = 0.5
+iteratie = 0
+
+def clamp(num, min_value, max_value):
+   return max(min(num, max_value), min_value)
+
+class Connector:
+    def __init__(self, name, temp:float = 0.0, flowSpeed:float = 1.0):
+        self.name = name
+        self.connectedTo = None
+        self.temp = temp 
+        self.flowSpeed = flowSpeed
+    
+class LogicConnector:
+    def __init__(self, value:bool = 0.0):
+        self.connectedTo = []
+        self.value = value
+
+class Component:
+    # True for components whose update() changes internal state, so it must run exactly once per tick
+    stateful = False
+    # True for components whose output depends on the time, not only on their inputs
+    timeDriven = False
+
+    def __init__(self, name, x, y, inputs: list[Connector] = [], outputs: list[Connector] = [], logicInput: LogicConnector = None, logicOutput: LogicConnector = None):
+        self.name = name
+        self.x = x
+        self.y = y
+        self.colorR = 200
+        self.colorG = 200
+        self.colorB = 255
+        self.width = 120
+        self.height = 50
+        self.inputs = inputs
+        self.outputs = outputs
+        self.connectors = inputs + outputs
+        self.logicInput = logicInput
+        self.logicOutput = logicOutput
+        self.logicConnectors = [logicInput, logicOutput]
+
+    def inspect(self, childDict:dict = {}) -> dict[str, str]:
+        inspectables = {}
+        inspectables["name"] = self.name
+        inspectables["colorR"] = self.colorR
+        inspectables["colorG"] = self.colorG
+        inspectables["colorB"] = self.colorB
+
+        inspectables.update(childDict)
+        return inspectables
+
+    def editVariable(self, varName, value):
+        if varName == "name":
+            self.name = value
+        elif varName == "power":
+            self.power = float(value)
+        elif varName == "temp":
+            self.temp = float(value)
+        elif varName == "speed":
+            self.speed = float(value)
+        elif varName == "colorR":
+            self.colorR = int(value)
+        elif varName == "colorG":
+            self.colorG = int(value)
+        elif varName == "colorB":
+            self.colorB = int(value)
+        else:
+            print("No match")
+
+    def getConnectorPosition(self, connector: Connector):
+        if connector not in self.connectors:
+            return None
+
+        if connector in self.inputs:
+            relativeX = (self.inputs.index(connector) + 1) * self.width / (len(self.inputs) + 1)
+            relativeY = -self.height / 2
+        elif connector in self.outputs:
+            relativeX = (self.outputs.index(connector) + 1) * self.width / (len(self.outputs) + 1)
+            relativeY = self.height / 2
+
+        return self.x - (self.width / 2) + relativeX, self.y + relativeY
+    
+    def getConnector(self, x, y):
+        for connector in self.connectors:
+            connectorX, connectorY = self.getConnectorPosition(connector)
+            if abs(connectorX - x) < 5 and abs(connectorY - y) < 5:
+                return connector
+        return None
+    
+    def getLogicConnectorPosition(self, connector: LogicConnector):
+        if connector not in [self.logicInput, self.logicOutput]:
+            return None
+
+        if connector == self.logicInput:
+            relativeX = -self.width / 2
+            relativeY = 0
+        elif connector == self.logicOutput:
+            relativeX = self.width / 2
+            relativeY = 0
+
+        return self.x + relativeX, self.y + relativeY
+    
+    def connectorPositions(self):
+        """
+        Yields (connector, x, y) for every connector and logic connector in one pass
+        """
+        left = self.x - self.width / 2
+        for i, input in enumerate(self.inputs):
+            yield input, left + (i + 1) * self.width / (len(self.inputs) + 1), self.y - self.height / 2
+        for i, output in enumerate(self.outputs):
+            yield output, left + (i + 1) * self.width / (len(self.outputs) + 1), self.y + self.height / 2
+        if self.logicInput is not None:
+            yield self.logicInput, left, self.y
+        if self.logicOutput is not None:
+            yield self.logicOutput, self.x + self.width / 2, self.y
+
+    def getLogicConnector(self, x, y):
+        for connector in self.logicConnectors:
+            connectorX, connectorY = self.getLogicConnectorPosition(connector)
+            if abs(connectorX - x) < 5 and abs(connectorY - y) < 5:
+                return connector
+        return None
+    
+    def update(self):
+        for input in self.inputs:
+            if input.connectedTo is None:
+                continue
+
+            input.temp = input.connectedTo.temp
+            input.flowSpeed = input.connectedTo.flowSpeed
+
+        if self.logicInput is not None:
+            if len(self.logicInput.connectedTo) == 0:
+                self.logicInput.value = 0
+                return
+            self.logicInput.value = self.logicInput.connectedTo[0].value
+    
+# Temperature functions
+
+def calculateDeltaT(
+        Power: float,
+        stroomSnelheid: float,
+        sortWarmte: float = 4.18):
+    """
+    Calculates the delta T for a given warmte and power
+    """
+    dT = (Power / sortWarmte) / stroomSnelheid
+    return dT
+
+def calculateWarmteVerlies(
+        T: float,
+        Oppervlakte: float = 100,
+        geleiding: float = 0.0005):
+    """
+    Calculates the warmte verlies for a given delta T and stroom snelheid
+    """
+    deltaT = T - 20
+    warmteVerlies = Oppervlakte * geleiding * deltaT
+    return warmteVerlies
+
+
+# Flow Code
+
+class RealisticSun(Component):
+    timeDriven = True
+
+    def __init__(self, name, x, y, wolkenKans):
+        self.wolkenKans = wolkenKans
+        super().__init__(
+            name, 
+            x, 
+            y,
+            logicInput=LogicConnector(),
+            logicOutput=LogicConnector()
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "wolkenKans": self.wolkenKans
+        })
+            
+    def editVariable(self, varName, value):
+        if varName == "wolkenKans":
+            self.wolkenKans = float(value)
+        else:
+            super().editVariable(varName, value)
+
+    @staticmethod
+    def getSunPower(tijd, Datum):
+        return (1 - (math.cos(tijd * 2 * math.pi / 24) + 1) / ((1-Datum)*1.1 + 0.5)) * ((1 - Datum)*0.4 + 0.6)
+
+    # Precomputed values per tick from tableStart on, see flowSignals.precomputeSignals
+    table = None
+    tableStart = 0
+
+    def valueAt(self, dt, tick, Datum):
+        return clamp( RealisticSun.getSunPower(dt * tick, Datum), 0, 1)
+
+    def update(self):
+        super().update()
+
+        table = self.table
+        if table is not None and table.step == dt and 0 <= iteratie - self.tableStart < table.length and len(self.logicInput.connectedTo) == 0:
+            self.logicOutput.value = table.values[iteratie - self.tableStart]
+            return
+        self.logicOutput.value = self.valueAt(dt, iteratie, self.logicInput.value)
+
+
+class SinusSignal(Component):
+    timeDriven = True
+
+    def __init__(self, name, x, y, period):
+        self.period = period
+        super().__init__(
+            name, 
+            x, 
+            y,
+            logicOutput=LogicConnector()
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "period": self.period
+        })
+            
+    def editVariable(self, varName, value):
+        if varName == "period":
+            self.period = float(value)
+            self.table = None
+        else:
+            super().editVariable(varName, value)
+
+    # Precomputed values per tick from tableStart on, see flowSignals.precomputeSignals
+    table = None
+    tableStart = 0
+
+    def valueAt(self, dt, tick):
+        return math.cos(dt * tick * 2 * math.pi / self.period)/2 + 0.5
+
+    def update(self):
+        super().update()
+        table = self.table
+        if table is not None and table.step == dt and 0 <= iteratie - self.tableStart < table.length:
+            self.logicOutput.value = table.values[iteratie - self.tableStart]
+            return
+        self.logicOutput.value = self.valueAt(dt, iteratie)
+
+class ProfileSignal(Component):
+    """
+    Logic signal from a measured series, such as hourly sun, outdoor temperature or demand,
+    in a CSV or .npy file (see flowSignals). column is a name or number, step the hours per
+    row, and the output is value * scale + offset; the series repeats after its last row.
+    """
+    timeDriven = True
+
+    def __init__(self, name, x, y, path = "", column = "", step = 1.0, scale = 1.0, offset = 0.0, interpolation = "linear"):
+        self.path = path
+        self.column = column
+        self.step = step
+        self.scale = scale
+        self.offset = offset
+        self.interpolation = interpolation
+        self.grids = {}
+        super().__init__(
+            name,
+            x,
+            y,
+            logicOutput=LogicConnector()
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "path": self.path,
+            "column": self.column,
+            "step": self.step,
+            "scale": self.scale,
+            "offset": self.offset,
+            "interpolation": self.interpolation
+        })
+
+    def editVariable(self, varName, value):
+        if varName in ("path", "column", "step", "interpolation"):
+            old = self.path, self.column, self.step, self.interpolation
+            if varName == "path":
+                self.path = str(value)
+            elif varName == "column":
+                self.column = str(value)
+            elif varName == "step":
+                self.step = float(value)
+            else:
+                self.interpolation = str(value)
+            self.grids = {}
+            try:
+                try:
+                    self.profileTable()
+                except ValueError:
+                    if varName != "path" or self.column == "":
+                        raise
+                    # The new file does not have the old column, start at its first one
+                    self.column = ""
+                    self.profileTable()
+            except ValueError:
+                self.path, self.column, self.step, self.interpolation = old
+                self.grids = {}
+                raise
+        elif varName == "scale":
+            self.scale = float(value)
+        elif varName == "offset":
+            self.offset = float(value)
+        else:
+            super().editVariable(varName, value)
+
+    def __getstate__(self):
+        # The resampled grids are rebuilt from the file on first use
+        state = self.__dict__.copy()
+        state.pop("grids", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.grids = {}
+
+    def profileTable(self):
+        """
+        The series as a SignalTable, None without a file
+        """
+        if self.path == "":
+            return None
+        from flowSignals import loadTable
+        return loadTable(self.path, self.column, self.step, self.interpolation)
+
+    # Resampled tables kept, one per time step; the oldest is dropped beyond this
+    maxGrids = 4
+
+    def signalAt(self, dt, tick) -> float:
+        # Between ticks, such as in the adaptive runner, the file's own table is interpolated
+        key = dt if tick == int(tick) else None
+        if key not in self.grids:
+            if len(self.grids) >= self.maxGrids:
+                del self.grids[next(iter(self.grids))]
+            table = self.profileTable()
+            if table is not None and key is not None:
+                # Resampled once per time step; the table itself if its period is no whole number of ticks
+                table = table.resample(dt) or table
+            self.grids[key] = table
+        grid = self.grids[key]
+        if grid is None:
+            return self.offset
+        value = grid.atTick(int(tick)) if key is not None and grid.step == dt else grid.valueAt(dt * tick)
+        return value * self.scale + self.offset
+
+    def update(self):
+        super().update()
+        self.logicOutput.value = self.signalAt(dt, iteratie)
+
+class LogicClamp(Component):
+    def __init__(self, name, x, y, min, max):
+        self.min = min
+        self.max = max
+        super().__init__(
+            name, 
+            x, 
+            y,
+            logicInput=LogicConnector(),
+            logicOutput=LogicConnector()
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "min": self.min,
+            "max": self.max
+        })
+            
+    def editVariable(self, varName, value):
+        if varName == "min":
+            self.min = float(value)
+        elif varName == "max":
+            self.max = float(value)
+        else:
+            super().editVariable(varName, value)
+
+    def update(self):
+        super().update()
+        if self.logicInput.connectedTo is not None:
+            self.logicOutput.value = clamp(self.logicInput.value, self.min, self.max)
+        else:
+            self.logicOutput.value = 0
+
+class LogicInverter(Component):
+    def __init__(self, name, x, y):
+        super().__init__(
+            name, 
+            x, 
+            y,
+            logicInput=LogicConnector(),
+            logicOutput=LogicConnector()
+        )
+
+    def update(self):
+        super().update()
+        if self.logicInput.connectedTo is not None:
+            self.logicOutput.value = 1 - self.logicInput.value
+        else:
+            self.logicOutput.value = 0
+
+def compileCompareFunction(compareFunction: str):
+    """
+    Compiles a Sensor expression to a function of (temp, flowSpeed, logicIn).
+    Raises ValueError for syntax errors and unknown names, so mistakes show up before a run.
+    """
+    try:
+        tree = ast.parse(compareFunction.strip(), mode="eval")
+    except SyntaxError as error:
+        raise ValueError(f"Invalid compareFunction {compareFunction!r}: {error.msg}") from None
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id not in ("temp", "flowSpeed", "logicIn") and not hasattr(builtins, node.id):
+            raise ValueError(f"Invalid compareFunction {compareFunction!r}: unknown name {node.id}")
+
+    function = ast.Expression(ast.Lambda(
+        args=ast.arguments(
+            posonlyargs=[],
+            args=[ast.arg("temp"), ast.arg("flowSpeed"), ast.arg("logicIn")],
+            kwonlyargs=[],
+            kw_defaults=[],
+            defaults=[]
+        ),
+        body=tree.body
+    ))
+    ast.fix_missing_locations(function)
+    return eval(compile(function, "<compareFunction>", "eval"), {})
+
+class Sensor(Component):
+    def __init__(self, name, x, y, compareFunction:str):
+        self.compareFunction = compareFunction
+        self.compiledCompareFunction = compileCompareFunction(compareFunction)
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN")],
+            outputs=[Connector("OUT")],
+            logicInput=LogicConnector(),
+            logicOutput=LogicConnector()
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "compareFunction": self.compareFunction
+        })
+    
+    def editVariable(self, varName, value):
+        if varName == "compareFunction":
+            self.compiledCompareFunction = compileCompareFunction(value)
+            self.compareFunction = value
+        else:
+            super().editVariable(varName, value)
+
+    def __getstate__(self):
+        # The compiled function can not be pickled, it is rebuilt from compareFunction on load
+        state = self.__dict__.copy()
+        state.pop("compiledCompareFunction", None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.compiledCompareFunction = compileCompareFunction(self.compareFunction)
+
+    def update(self):
+        super().update()
+        self.outputs[0].temp = self.inputs[0].temp
+        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
+
+        temp = self.inputs[0].temp
+        flowSpeed = self.inputs[0].flowSpeed
+        if self.logicInput is not None:
+            logicIn = self.logicInput.value
+        else:
+            logicIn = 0
+
+        self.logicOutput.value = self.compare(temp, flowSpeed, logicIn)
+
+    def compare(self, temp, flowSpeed, logicIn):
+        output = self.compiledCompareFunction(temp, flowSpeed, logicIn)
+        if output > 1:
+            output = 1
+        elif output < 0:
+            output = 0
+        return output
+
+
+class Source(Component):
+    def __init__(self, name, x, y, maxTemp, speed):
+        self.maxTemp = maxTemp
+        self.speed = speed
+        super().__init__(
+            name, 
+            x, 
+            y,
+            outputs = [Connector("OUT", maxTemp, speed)],
+            logicInput=LogicConnector()
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "maxTemp": self.maxTemp,
+            "speed": self.speed
+        })
+        
+    def editVariable(self, varName, value):
+        if varName == "maxTemp":
+            self.maxTemp = float(value)
+        elif varName == "speed":
+            self.speed = float(value)
+        else:
+            super().editVariable(varName, value)
+
+    def update(self):
+        super().update()
+        scalar = 1 if self.logicInput.connectedTo == [] else self.logicInput.value
+        if self.logicInput.connectedTo is not None:
+            self.outputs[0].temp = self.maxTemp * scalar
+        else:
+            self.outputs[0].temp = self.maxTemp
+        self.outputs[0].flowSpeed = self.speed
+
+class Printer(Component):
+    stateful = True
+
+    def __init__(self, name, x, y):
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN")],
+            outputs = [Connector("OUT")]
+        )
+
+    def update(self):
+        super().update()
+        self.outputs[0].temp = self.inputs[0].temp
+        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
+        print(f"{self.name}:" ,self.inputs[0].temp, self.inputs[0].flowSpeed)
+
+class Plotter(Component):
+    stateful = True
+
+    def __init__(self, name, x, y):
+        # Imported here so the model classes load without NumPy until a Plotter is made
+        from flowHistory import HistoryBuffer
+        self.data = HistoryBuffer()
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN")],
+            outputs = [Connector("OUT")]
+        )
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # Older files store the whole history as a list
+        if isinstance(self.data, list):
+            from flowHistory import HistoryBuffer
+            history = HistoryBuffer()
+            history.extend(self.data)
+            self.data = history
+
+    def update(self):
+        super().update()
+        self.outputs[0].temp = self.inputs[0].temp
+        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
+        self.data.append(self.inputs[0].temp)
+
+class Process(Component):
+    def __init__(self, name, x, y, power, minTemp = 0, maxTemp = 100):
+        self.power = power
+        self.minTemp = minTemp
+        self.maxTemp = maxTemp
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN")],
+            outputs = [Connector("OUT")],
+            logicInput=LogicConnector()
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "power": self.power,
+            "minTemp": self.minTemp,
+            "maxTemp": self.maxTemp
+        })
+    
+    def editVariable(self, varName, value):
+        if varName == "power":
+            self.power = float(value)
+        elif varName == "minTemp":
+            self.minTemp = float(value)
+        elif varName == "maxTemp":
+            self.maxTemp = float(value)
+        else:
+            super().editVariable(varName, value)
+
+    def update(self):
+        super().update()
+        scalar = 1 if self.logicInput.connectedTo == [] else self.logicInput.value
+        if self.inputs[0].temp < self.minTemp:
+            self.outputs[0].temp = self.inputs[0].temp - calculateWarmteVerlies(self.inputs[0].temp)
+        elif self.inputs[0].temp > self.maxTemp:
+            self.outputs[0].temp = self.inputs[0].temp + calculateDeltaT(self.power * scalar, 1) - calculateWarmteVerlies(self.inputs[0].temp) - (self.inputs[0].temp - self.maxTemp)
+        else:
+            self.outputs[0].temp = self.inputs[0].temp + calculateDeltaT(self.power * scalar, 1) - calculateWarmteVerlies(self.inputs[0].temp)
+        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
+
+class Buffer(Component):
+    stateful = True
+
+    def __init__(self, name, x, y, maxTemp, capacity):
+        self.maxTemp = maxTemp
+        self.capacity = capacity
+        self.temp = 0
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN")],
+            outputs = [Connector("OUT")],
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "maxTemp": self.maxTemp,
+            "capacity": self.capacity
+        })
+    
+    def editVariable(self, varName, value):
+        if varName == "maxTemp":
+            self.maxTemp = float(value)
+        elif varName == "capacity":
+            self.capacity = float(value)
+        else:
+            super().editVariable(varName, value)
+
+    def update(self):
+        super().update()
+        
+        VolumeIn = self.inputs[0].flowSpeed * dt * 3600
+        self.temp = (VolumeIn * self.inputs[0].temp + self.temp * self.capacity) / (VolumeIn + self.capacity)
+
+        self.outputs[0].temp = min(self.temp - calculateWarmteVerlies(self.temp), self.maxTemp)
+        self.outputs[0].flowSpeed = self.inputs[0].flowSpeed
+
+
+class Splitter(Component):
+    def __init__(self, name, x, y, splitScalar):
+        self.splitScalar = splitScalar
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN")],
+            outputs = [Connector("OUT1"), Connector("OUT2")],
+            logicInput=LogicConnector()
+        )
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "splitScalar": self.splitScalar
+        })
+    
+    def editVariable(self, varName, value):
+        if varName == "splitScalar":
+            self.splitScalar = float(value)
+        else:
+            super().editVariable(varName, value)
+
+    def update(self):
+        super().update()
+        self.outputs[0].temp = self.inputs[0].temp - calculateWarmteVerlies(self.inputs[0].temp)
+        self.outputs[1].temp = self.inputs[0].temp - calculateWarmteVerlies(self.inputs[0].temp)
+
+        if self.logicInput.connectedTo == []:
+            self.outputs[0].flowSpeed = self.inputs[0].flowSpeed * self.splitScalar
+            self.outputs[1].flowSpeed = self.inputs[0].flowSpeed * (1 - self.splitScalar)
+        else:
+            self.outputs[0].flowSpeed = self.inputs[0].flowSpeed * self.logicInput.value
+            self.outputs[1].flowSpeed = self.inputs[0].flowSpeed * (1 - self.logicInput.value)
+
+class ProsessKiezer(Component):
+    def __init__(self, name, x, y):
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN")],
+            outputs = [Connector("OUT1"), Connector("OUT2"), Connector("OUT3")],
+            logicInput=LogicConnector()
+        )
+
+    def update(self):
+        super().update()
+        outputTemp = self.inputs[0].temp - calculateWarmteVerlies(self.inputs[0].temp)
+        self.outputs[0].temp = outputTemp
+        self.outputs[1].temp = outputTemp
+        self.outputs[2].temp = outputTemp
+
+        if self.logicInput.connectedTo == []:
+            newFlowspeed = self.inputs[0].flowSpeed / 3
+            self.outputs[0].flowSpeed = newFlowspeed
+            self.outputs[1].flowSpeed = newFlowspeed
+            self.outputs[2].flowSpeed = newFlowspeed
+        else:
+            inputSpeed = self.inputs[0].flowSpeed
+            inputValue = self.logicInput.value
+            self.outputs[0].flowSpeed = max(0, inputSpeed * (-2 * inputValue + 1))
+            self.outputs[1].flowSpeed = max(0, inputSpeed * (1 - (2 * abs(inputValue - 0.5) )) )
+            self.outputs[2].flowSpeed = max(0, inputSpeed * (2 * inputValue - 1))
+
+class Merge(Component):
+    def __init__(self, name, x, y):
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN1"), Connector("IN2")],
+            outputs = [Connector("OUT")]
+        )
+
+    def update(self):
+        super().update()
+        flowSpeed1 = self.inputs[0].flowSpeed
+        flowSpeed2 = self.inputs[1].flowSpeed
+        temp1 = self.inputs[0].temp
+        temp2 = self.inputs[1].temp
+
+        if (flowSpeed1 + flowSpeed2) != 0:
+            self.outputs[0].temp = (flowSpeed1 * temp1 + flowSpeed2 * temp2) / (flowSpeed1 + flowSpeed2)
+            self.outputs[0].temp = self.outputs[0].temp - calculateWarmteVerlies(self.outputs[0].temp)
+        else:
+            self.outputs[0].temp = 10
+        self.outputs[0].flowSpeed = (flowSpeed1 + flowSpeed2)
+
+class Collector(Component):
+    def __init__(self, name, x, y):
+        super().__init__(
+            name, 
+            x, 
+            y,
+            inputs = [Connector("IN1"), Connector("IN2"), Connector("IN3")],
+            outputs = [Connector("OUT")]
+        )
+
+    def update(self):
+        super().update()
+        flowSpeed1 = self.inputs[0].flowSpeed
+        flowSpeed2 = self.inputs[1].flowSpeed
+        flowSpeed3 = self.inputs[2].flowSpeed
+        temp1 = self.inputs[0].temp
+        temp2 = self.inputs[1].temp
+        temp3 = self.inputs[2].temp
+
+        if (flowSpeed1 + flowSpeed2 + flowSpeed3) != 0:
+            self.outputs[0].temp = (flowSpeed1 * temp1 + flowSpeed2 * temp2 + flowSpeed3 * temp3) / (flowSpeed1 + flowSpeed2 + flowSpeed3)
+            self.outputs[0].temp = self.outputs[0].temp - calculateWarmteVerlies(self.outputs[0].temp)
+        else:
+            self.outputs[0].temp = 10
+        self.outputs[0].flowSpeed = (flowSpeed1 + flowSpeed2 + flowSpeed3)
+
+
+class SubFlow(Component):
+    """
+    A group of components stored once in its own .flow file, the definition, and placed as
+    one box. The definition's unconnected inputs and outputs are the ports IN1.. and OUT1..;
+    logicIn names the components (comma separated) fed by the logic input, logicOut the one
+    whose logic output is passed on. Every instance runs its own copy of the definition
+    through the compiled engine, see flowSubFlow.
+    """
+    def __init__(self, name, x, y, path = "", logicIn = "", logicOut = ""):
+        self.path = path
+        self.logicIn = logicIn
+        self.logicOut = logicOut
+        # The instance's own copy of the definition, and what runs it
+        self.inner = None
+        self.runner = None
+        super().__init__(
+            name,
+            x,
+            y,
+            inputs = [],
+            outputs = [],
+            logicInput=LogicConnector(),
+            logicOutput=LogicConnector()
+        )
+        self.loadPorts()
+
+    def inspect(self) -> dict[str, str]:
+        return super().inspect({
+            "path": self.path,
+            "logicIn": self.logicIn,
+            "logicOut": self.logicOut
+        })
+
+    def editVariable(self, varName, value):
+        if varName in ("path", "logicIn", "logicOut"):
+            old = self.path, self.logicIn, self.logicOut
+            setattr(self, varName, str(value))
+            try:
+                try:
+                    self.loadPorts()
+                except ValueError:
+                    if varName != "path" or (self.logicIn, self.logicOut) == ("", ""):
+                        raise
+                    # The new definition does not have the old logic targets
+                    self.logicIn = self.logicOut = ""
+                    self.loadPorts()
+            except ValueError:
+                self.path, self.logicIn, self.logicOut = old
+                self.loadPorts()
+                raise
+        else:
+            super().editVariable(varName, value)
+
+    def loadPorts(self):
+        """
+        Gives the component the definition's ports. Connectors are kept while the number of
+        ports stays the same; removed ones are disconnected.
+        """
+        self.inner = None
+        self.runner = None
+        if self.path == "":
+            inputs, outputs = 0, 0
+            self.stateful = self.timeDriven = False
+        else:
+            from flowSubFlow import loadDefinition
+            definition = loadDefinition(self.path)
+            definition.logicTargets(self.logicIn)
+            definition.logicSource(self.logicOut)
+            inputs, outputs = len(definition.inputPorts), len(definition.outputPorts)
+            # Run once per tick in a cycle, and always with change propagation, if anything inside needs it
+            self.stateful = definition.stateful
+            self.timeDriven = definition.timeDriven
+
+        if len(self.inputs) != inputs:
+            for connector in self.inputs:
+                if connector.connectedTo is not None:
+                    connector.connectedTo.connectedTo = None
+            self.inputs = [Connector("IN" if inputs == 1 else f"IN{i + 1}") for i in range(inputs)]
+        if len(self.outputs) != outputs:
+            for connector in self.outputs:
+                if connector.connectedTo is not None:
+                    connector.connectedTo.connectedTo = None
+            self.outputs = [Connector("OUT" if outputs == 1 else f"OUT{i + 1}") for i in range(outputs)]
+        self.connectors = self.inputs + self.outputs
+
+    def __getstate__(self):
+        # The runner holds generated code; the inner components keep its state
+        if self.runner is not None:
+            self.runner.sync()
+        state = self.__dict__.copy()
+        state["runner"] = None
+        return state
+
+    def innerComponents(self) -> list:
+        """
+        The instance's copy of the definition with its current state
+        """
+        if self.path == "":
+            return []
+        if self.inner is None:
+            from flowSubFlow import loadDefinition
+            self.inner = loadDefinition(self.path).instantiate()
+        if self.runner is not None:
+            self.runner.sync()
+        return self.inner
+
+    def reloadInner(self):
+        """
+        Call after changing the state of innerComponents()
+        """
+        if self.runner is not None:
+            self.runner.reload()
+
+    def update(self):
+        super().update()
+        if self.path == "":
+            return
+        if self.runner is None or self.runner.connected != (len(self.logicInput.connectedTo) > 0):
+            from flowSubFlow import InstanceRunner
+            self.runner = InstanceRunner(self)
+        self.runner.step()
+
+
+# Component types with the default parameters used when adding one from the menu
+
+componentFactories = {
+    "Source": lambda name, x, y: Source(name, x, y, 100, 1),
+    "Printer": lambda name, x, y: Printer(name, x, y),
+    "Plotter": lambda name, x, y: Plotter(name, x, y),
+    "Process": lambda name, x, y: Process(name, x, y, 100),
+    "Splitter": lambda name, x, y: Splitter(name, x, y, 0.5),
+    "ProsessKiezer": lambda name, x, y: ProsessKiezer(name, x, y),
+    "SinusSignal": lambda name, x, y: SinusSignal(name, x, y, 10),
+    "ProfileSignal": lambda name, x, y: ProfileSignal(name, x, y),
+    "RealisticSun": lambda name, x, y: RealisticSun(name, x, y, 0.5),
+    "LogicClamp": lambda name, x, y: LogicClamp(name, x, y, 0, 1),
+    "LogicInverter": lambda name, x, y: LogicInverter(name, x, y),
+    "Sensor": lambda name, x, y: Sensor(name, x, y, "temp / 100"),
+    "Merge": lambda name, x, y: Merge(name, x, y),
+    "Collector": lambda name, x, y: Collector(name, x, y),
+    "Buffer": lambda name, x, y: Buffer(name, x, y, 100, 100),
+    "SubFlow": lambda name, x, y: SubFlow(name, x, y),
+}
+
+def createComponent(typeName, name, x, y, inputs: list[Connector] = None, outputs: list[Connector] = None) -> Component:
+    if typeName in componentFactories:
+        return componentFactories[typeName](name, x, y)
+    return Component(name, x, y, inputs if inputs is not None else [Connector("IN")], outputs if outputs is not None else [Connector("OUT")])
@@ -0,0 +1,165 @@
+import argparse
+import contextlib
+import json
+import os
+import time
+
+import flowModel
+from flowSchedule import FlowSchedule
+
+# Opt-in profiling of the tick loop: time per component and per class, and of the GUI's frame work
+
+class Profiler:
+    """
+    Collects call counts and time per component instance, and per named section such as
+    redraw_connector. The profiled tick goes through FlowSchedule.updates(), so the normal
+    tick loop pays nothing when profiling is off. Times are kept in nanoseconds.
+    """
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.ticks = 0
+        self.tickTime = 0
+        self.lastTickTime = 0
+        # component -> [calls, total time, time in the last tick]
+        self.components = {}
+        # section name -> [calls, total time, time of the last call]
+        self.sections = {}
+
+    def step(self, updates):
+        """
+        Runs one tick, updating the components in the given order
+        """
+        clock = time.perf_counter_ns
+        stats = self.components
+        lastTick = {}
+        tickStart = clock()
+        for component in updates:
+            start = clock()
+            component.update()
+            duration = clock() - start
+            lastTick[component] = lastTick.get(component, 0) + duration
+            entry = stats.get(component)
+            if entry is None:
+                entry = stats[component] = [0, 0, 0]
+            entry[0] += 1
+            entry[1] += duration
+        for component, duration in lastTick.items():
+            stats[component][2] = duration
+        self.lastTickTime = clock() - tickStart
+        self.tickTime += self.lastTickTime
+        self.ticks += 1
+
+    @contextlib.contextmanager
+    def section(self, name: str):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter_ns() - start
+            entry = self.sections.setdefault(name, [0, 0, 0])
+            entry[0] += 1
+            entry[1] += duration
+            entry[2] = duration
+
+    def share(self, component) -> float:
+        """
+        Fraction of the profiled tick time spent in this component
+        """
+        entry = self.components.get(component)
+        return entry[1] / self.tickTime if entry is not None and self.tickTime > 0 else 0.0
+
+    def componentRows(self, components) -> list[dict]:
+        from flowRunner import uniqueNames
+
+        ticks = max(self.ticks, 1)
+        rows = []
+        for component, name in zip(components, uniqueNames(components)):
+            calls, total, last = self.components.get(component, (0, 0, 0))
+            rows.append({
+                "name": name, "type": type(component).__name__, "calls": calls,
+                "totalMs": total / 1e6, "perTickUs": total / ticks / 1e3, "lastTickUs": last / 1e3,
+                "share": self.share(component)
+            })
+        return sorted(rows, key=lambda row: -row["totalMs"])
+
+    def classRows(self, components) -> list[dict]:
+        ticks = max(self.ticks, 1)
+        classes = {}
+        for component in components:
+            calls, total, last = self.components.get(component, (0, 0, 0))
+            entry = classes.setdefault(type(component).__name__, [0, 0, 0, 0])
+            entry[0] += 1
+            entry[1] += calls
+            entry[2] += total
+            entry[3] += last
+        rows = [
+            {
+                "type": name, "instances": instances, "calls": calls, "totalMs": total / 1e6,
+                "perTickUs": total / ticks / 1e3, "lastTickUs": last / 1e3,
+                "share": total / self.tickTime if self.tickTime > 0 else 0.0
+            }
+            for name, (instances, calls, total, last) in classes.items()
+        ]
+        return sorted(rows, key=lambda row: -row["totalMs"])
+
+    def sectionRows(self) -> list[dict]:
+        return [
+            {"section": name, "calls": calls, "totalMs": total / 1e6, "perCallUs": total / max(calls, 1) / 1e3, "lastUs": last / 1e3}
+            for name, (calls, total, last) in sorted(self.sections.items(), key=lambda item: -item[1][1])
+        ]
+
+    def report(self, components) -> dict:
+        return {
+            "ticks": self.ticks,
+            "tickTotalMs": self.tickTime / 1e6,
+            "perTickUs": self.tickTime / max(self.ticks, 1) / 1e3,
+            "components": self.componentRows(components),
+            "classes": self.classRows(components),
+            "sections": self.sectionRows()
+        }
+
+    def writeJson(self, path, components):
+        with open(path, "w") as file:
+            json.dump(self.report(components), file, indent=1)
+
+def printReport(report: dict, limit: int = 20):
+    print(f"{report['ticks']} ticks, {report['perTickUs']:.1f} us per tick")
+    print(f"{'type':<16} {'count':>5} {'us/tick':>9} {'share':>6}")
+    for row in report["classes"]:
+        print(f"{row['type']:<16} {row['instances']:>5} {row['perTickUs']:>9.2f} {row['share']:>6.1%}")
+    print()
+    print(f"{'component':<28} {'type':<16} {'us/tick':>9} {'share':>6}")
+    for row in report["components"][:limit]:
+        print(f"{row['name']:<28} {row['type']:<16} {row['perTickUs']:>9.2f} {row['share']:>6.1%}")
+
+def main(argv=None):
+    from flowRunner import loadFlowFile
+
+    parser = argparse.ArgumentParser(description="Profile a .flow model headless, per component and per class")
+    parser.add_argument("model")
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    parser.add_argument("--limit", type=int, default=20, help="number of components shown")
+    parser.add_argument("--json", metavar="PATH", help="write the full report as JSON")
+    args = parser.parse_args(argv)
+
+    components = loadFlowFile(args.model)
+    schedule = FlowSchedule(components)
+    profiler = Profiler()
+    flowModel.dt = args.dt
+    # Printers print every tick
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for tick in range(args.ticks):
+            flowModel.iteratie = tick
+            profiler.step(schedule.updates())
+
+    report = profiler.report(components)
+    printReport(report, args.limit)
+    if args.json is not None:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import contextlib
+import os
+
+import flowModel
+from flowSchedule import FlowSchedule, connectorOwners
+
+# Change-driven tick loop: components whose inputs did not change are not updated again
+
+def outputReader(component):
+    """
+    A function returning the output temps, flowSpeeds and logic value of component as a tuple
+    """
+    names = {}
+    values = []
+    for k, connector in enumerate(component.outputs):
+        names[f"c{k}"] = connector
+        values += [f"c{k}.temp", f"c{k}.flowSpeed"]
+    if component.logicOutput is not None:
+        names["l"] = component.logicOutput
+        values.append("l.value")
+    return eval(f"lambda: ({''.join(value + ', ' for value in values)})", names)
+
+class ChangePropagation:
+    """
+    Runs the updates in the given order, but re-evaluates a component only when one of the
+    values it reads changed by more than epsilon since it last announced a change, or when
+    it has internal state (stateful) or depends on the time (timeDriven).
+
+    After an update the component's outputs are compared with the values it last announced;
+    only then are its consumers marked dirty. Comparing with the announced value instead of
+    last tick's value means a slow drift still propagates once it adds up to epsilon.
+    With epsilon 0 the results are exactly those of the full update.
+    Call invalidate() after editing parameters or restoring a state.
+    """
+    def __init__(self, components, updates, epsilon: float = 0.0):
+        self.components = list(components)
+        self.epsilon = epsilon
+        index = {component: i for i, component in enumerate(self.components)}
+        owners = connectorOwners(self.components)
+
+        consumers = [set() for _ in self.components]
+        for component in self.components:
+            sources = [input.connectedTo for input in component.inputs if input.connectedTo is not None]
+            if component.logicInput is not None:
+                sources += component.logicInput.connectedTo
+            for source in sources:
+                owner = owners.get(source)
+                if owner is not None:
+                    consumers[index[owner]].add(index[component])
+
+        self.readers = [outputReader(component) for component in self.components]
+        self.announced = [read() for read in self.readers]
+        # (index, component, output reader, always run, consumer indices) per update, in order
+        self.sequence = [
+            (index[component], component, self.readers[index[component]], component.stateful or component.timeDriven, sorted(consumers[index[component]]))
+            for component in updates
+        ]
+        self.evaluated = [0] * len(self.components)
+        self.skipped = [0] * len(self.components)
+        self.invalidate()
+
+    def invalidate(self):
+        """
+        Marks every component dirty, so the next tick updates everything once
+        """
+        self.dirty = [True] * len(self.components)
+
+    def step(self):
+        dirty = self.dirty
+        announced = self.announced
+        epsilon = self.epsilon
+        for i, component, read, always, consumers in self.sequence:
+            if not (always or dirty[i]):
+                self.skipped[i] += 1
+                continue
+            dirty[i] = False
+            component.update()
+            self.evaluated[i] += 1
+
+            values = read()
+            if epsilon == 0:
+                changed = values != announced[i]
+            else:
+                # Written so a NaN counts as a change
+                changed = any(not abs(new - old) <= epsilon for new, old in zip(values, announced[i]))
+            if changed:
+                announced[i] = values
+                for consumer in consumers:
+                    dirty[consumer] = True
+
+    def totals(self) -> tuple[int, int]:
+        """
+        Evaluated and skipped updates over all components
+        """
+        return sum(self.evaluated), sum(self.skipped)
+
+    def skippedShare(self) -> float:
+        evaluated, skipped = self.totals()
+        return skipped / (evaluated + skipped) if evaluated + skipped > 0 else 0.0
+
+    def componentRows(self) -> list[dict]:
+        from flowRunner import uniqueNames
+
+        rows = []
+        for i, (component, name) in enumerate(zip(self.components, uniqueNames(self.components))):
+            calls = self.evaluated[i] + self.skipped[i]
+            rows.append({
+                "name": name, "type": type(component).__name__, "evaluated": self.evaluated[i],
+                "skipped": self.skipped[i], "share": self.skipped[i] / calls if calls > 0 else 0.0
+            })
+        return sorted(rows, key=lambda row: -row["skipped"])
+
+def printReport(propagation: ChangePropagation, limit: int = 20):
+    evaluated, skipped = propagation.totals()
+    print(f"{skipped} of {evaluated + skipped} updates skipped ({propagation.skippedShare():.1%}), epsilon {propagation.epsilon:g}")
+    print(f"{'component':<28} {'type':<16} {'evaluated':>9} {'skipped':>9} {'share':>6}")
+    for row in propagation.componentRows()[:limit]:
+        print(f"{row['name']:<28} {row['type']:<16} {row['evaluated']:>9} {row['skipped']:>9} {row['share']:>6.1%}")
+
+def main(argv=None):
+    from flowRunner import loadFlowFile
+
+    parser = argparse.ArgumentParser(description="Show how many component updates change propagation skips in a .flow model")
+    parser.add_argument("model")
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    parser.add_argument("--epsilon", type=float, default=0.0, help="changes up to this size are not propagated")
+    parser.add_argument("--inner-iterations", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=20, help="number of components shown")
+    args = parser.parse_args(argv)
+
+    components = loadFlowFile(args.model)
+    schedule = FlowSchedule(components, args.inner_iterations)
+    propagation = ChangePropagation(components, schedule.updates(), args.epsilon)
+    flowModel.dt = args.dt
+    # Printers print every tick
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for tick in range(args.ticks):
+            flowModel.iteratie = tick
+            propagation.step()
+    printReport(propagation, args.limit)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+import argparse
+import csv
+import fnmatch
+import json
+import os
+
+import numpy as np
+
+# Streaming result storage: recorded values go to disk in chunks instead of Python lists,
+# so memory use does not grow with the length of a run
+
+def columnCatalog(components, names: list[str]) -> list[tuple]:
+    """
+    Every value that can be recorded, as (column name, object, attribute): connector temps and
+    flow speeds, logic values and the Buffer temperature. names are the unique component names.
+    """
+    catalog = []
+    for name, component in zip(names, components):
+        for connector in component.connectors:
+            catalog.append((f"{name}.{connector.name}.temp", connector, "temp"))
+            catalog.append((f"{name}.{connector.name}.flowSpeed", connector, "flowSpeed"))
+        if component.logicInput is not None:
+            catalog.append((f"{name}.logicIn", component.logicInput, "value"))
+        if component.logicOutput is not None:
+            catalog.append((f"{name}.logicOut", component.logicOutput, "value"))
+        if hasattr(component, "temp"):
+            catalog.append((f"{name}.temp", component, "temp"))
+    return catalog
+
+def selectColumns(catalog: list[tuple], patterns: list[str]) -> list[tuple]:
+    """
+    Catalog entries matching any of the patterns, e.g. "Buffer*.temp" or "*.OUT.flowSpeed"
+    """
+    return [entry for entry in catalog if any(fnmatch.fnmatchcase(entry[0], pattern) for pattern in patterns)]
+
+class ResultSink:
+    """
+    Writes one row of values per tick into a directory of column-major chunks.
+
+    Only the current chunk is kept in memory. meta.json is rewritten after every chunk,
+    so the part of a run written before a crash can still be read. Chunks of an earlier run
+    in the directory are removed when the first row arrives, unless resumeAt() keeps them.
+    """
+    def __init__(self, path, columns: list[str], dt: float, startTick: int = 0, chunkTicks: int = 4096):
+        self.path = path
+        self.columns = list(columns)
+        self.dt = dt
+        self.startTick = startTick
+        self.chunkTicks = chunkTicks
+        # A flush in the middle of a run (at the end of run()) leaves a shorter chunk
+        self.chunkLengths = []
+        self.ticks = 0
+        self.buffer = np.empty((len(self.columns), chunkTicks))
+        self.filled = 0
+        self.prepared = False
+        os.makedirs(path, exist_ok=True)
+
+    def chunkPath(self, index: int) -> str:
+        return os.path.join(self.path, f"chunk{index:06d}.npy")
+
+    def removeChunks(self, first: int = 0):
+        """
+        Removes the chunk files from index first on
+        """
+        for name in os.listdir(self.path):
+            if name.startswith("chunk") and name.endswith(".npy") and name[5:-4].isdigit() and int(name[5:-4]) >= first:
+                os.remove(os.path.join(self.path, name))
+
+    def prepare(self):
+        self.prepared = True
+        self.removeChunks()
+        self.writeMeta()
+
+    def resumeAt(self, tick: int):
+        """
+        Continues the run in the directory at tick, such as after resuming from a checkpoint:
+        what it recorded before tick is kept, anything after it removed
+        """
+        self.prepared = True
+        if not os.path.exists(os.path.join(self.path, "meta.json")):
+            self.startTick = tick
+            self.removeChunks()
+            self.writeMeta()
+            return
+        reader = ResultReader(self.path)
+        if reader.columns != self.columns or reader.dt != self.dt:
+            raise ValueError(f"{self.path} holds a run with other columns or another time step")
+        if not reader.startTick <= tick <= reader.startTick + reader.ticks:
+            raise ValueError(f"{self.path} holds ticks {reader.startTick} to {reader.startTick + reader.ticks}, it can not continue at tick {tick}")
+
+        keep = tick - reader.startTick
+        lengths = []
+        for index, length in enumerate(reader.chunkLengths):
+            if keep == 0:
+                break
+            if length > keep:
+                # The last chunk ends at tick
+                data = np.array(reader.chunk(index)[:, :keep])
+                np.save(self.chunkPath(index), data)
+                length = keep
+            lengths.append(length)
+            keep -= length
+        self.removeChunks(len(lengths))
+        self.startTick = reader.startTick
+        self.chunkLengths = lengths
+        self.ticks = sum(lengths)
+        self.writeMeta()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def append(self, values):
+        if not self.prepared:
+            self.prepare()
+        self.buffer[:, self.filled] = values
+        self.filled += 1
+        if self.filled == self.chunkTicks:
+            self.flush()
+
+    def flush(self):
+        if self.filled == 0:
+            return
+        np.save(self.chunkPath(len(self.chunkLengths)), self.buffer[:, :self.filled])
+        self.chunkLengths.append(self.filled)
+        self.ticks += self.filled
+        self.filled = 0
+        self.writeMeta()
+
+    def writeMeta(self):
+        meta = {
+            "columns": self.columns,
+            "dt": self.dt,
+            "startTick": self.startTick,
+            "chunkLengths": self.chunkLengths,
+            "ticks": self.ticks
+        }
+        temporary = os.path.join(self.path, "meta.json.tmp")
+        with open(temporary, "w") as file:
+            json.dump(meta, file)
+        os.replace(temporary, os.path.join(self.path, "meta.json"))
+
+    def close(self):
+        if not self.prepared:
+            self.prepare()
+        self.flush()
+
+class ResultReader:
+    """
+    Reads any tick range of a ResultSink directory, memory-mapping only the chunks it covers
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as file:
+            meta = json.load(file)
+        self.columns = meta["columns"]
+        self.dt = meta["dt"]
+        self.startTick = meta["startTick"]
+        self.chunkLengths = meta["chunkLengths"]
+        self.chunkStarts = np.concatenate(([0], np.cumsum(self.chunkLengths, dtype=np.int64)))
+        self.ticks = meta["ticks"]
+
+    def __len__(self):
+        return self.ticks
+
+    def chunk(self, index: int) -> np.ndarray:
+        return np.load(os.path.join(self.path, f"chunk{index:06d}.npy"), mmap_mode="r")
+
+    def read(self, start: int = None, stop: int = None, columns: list[str] = None) -> dict[str, np.ndarray]:
+        """
+        Values of the given columns (all by default) for ticks start up to stop, as absolute tick numbers
+        """
+        start = self.startTick if start is None else max(start, self.startTick)
+        stop = self.startTick + self.ticks if stop is None else min(stop, self.startTick + self.ticks)
+        columns = self.columns if columns is None else columns
+        rows = [self.columns.index(column) for column in columns]
+        first, last = start - self.startTick, max(start, stop) - self.startTick
+
+        data = np.empty((len(rows), last - first))
+        firstChunk = int(np.searchsorted(self.chunkStarts, first, side="right")) - 1
+        for index in range(max(firstChunk, 0), len(self.chunkLengths)):
+            chunkStart = int(self.chunkStarts[index])
+            if chunkStart >= last:
+                break
+            low, high = max(first, chunkStart) - chunkStart, min(last, int(self.chunkStarts[index + 1])) - chunkStart
+            data[:, chunkStart + low - first:chunkStart + high - first] = self.chunk(index)[rows, low:high]
+        return {"tick": np.arange(start, max(start, stop)), **dict(zip(columns, data))}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a tick range from a streamed result directory")
+    parser.add_argument("results")
+    parser.add_argument("--start", type=int)
+    parser.add_argument("--stop", type=int)
+    parser.add_argument("--columns", action="append", metavar="PATTERN", help="columns to export, default all")
+    parser.add_argument("--output", "-o", help=".csv or .npz file, without it the columns are listed")
+    args = parser.parse_args(argv)
+
+    reader = ResultReader(args.results)
+    columns = reader.columns
+    if args.columns:
+        columns = [column for column in reader.columns if any(fnmatch.fnmatchcase(column, pattern) for pattern in args.columns)]
+    if args.output is None:
+        print(f"{args.results}: {reader.ticks} ticks from tick {reader.startTick}, dt {reader.dt}")
+        for column in columns:
+            print(f"  {column}")
+        return
+
+    data = reader.read(args.start, args.stop, columns)
+    data["time"] = data["tick"] * reader.dt
+    if args.output.endswith(".npz"):
+        np.savez(args.output, **data)
+        return
+    with open(args.output, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["tick", "time"] + columns)
+        writer.writerows(zip(data["tick"].tolist(), data["time"].tolist(), *(data[column].tolist() for column in columns)))
+
+if __name__ == "__main__":
+    main()
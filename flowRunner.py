@@ -0,0 +1,341 @@
+import argparse
+import csv
+import io
+import os
+import pickle
+import time
+
+import flowFormat
+import flowModel
+from flowModel import Plotter, Process
+from flowProfile import Profiler
+from flowSchedule import FlowSchedule
+
+# Headless runner: simulates .flow models without Tk or matplotlib
+
+# Ticks of SinusSignal and RealisticSun values tabulated at a time
+signalChunkTicks = 4096
+
+class FlowUnpickler(pickle.Unpickler):
+    """
+    Unpickler for .flow files saved from betterFlowApp, which pickles its classes as __main__.X
+    """
+    def find_class(self, module, name):
+        if module in ("__main__", "betterFlowApp"):
+            module = "flowModel"
+        return super().find_class(module, name)
+
+def upgradeComponents(components):
+    """
+    Fills in attributes that older .flow files do not have yet
+    """
+    for component in components:
+        for attribute, default in (("colorR", 200), ("colorG", 200), ("colorB", 255)):
+            if not hasattr(component, attribute):
+                setattr(component, attribute, default)
+        if isinstance(component, Process) and not hasattr(component, "maxTemp"):
+            component.maxTemp = 100
+    return components
+
+def loadComponents(file) -> list:
+    """
+    Loads a model from a binary file, either in the versioned format or an older pickle
+    """
+    data = file.read()
+    if flowFormat.isPickle(data):
+        return upgradeComponents(FlowUnpickler(io.BytesIO(data)).load())
+    # File names in the model are relative to the model file
+    name = getattr(file, "name", None)
+    return flowFormat.loads(data, None if not isinstance(name, str) else flowFormat.modelDirectory(name))
+
+def loadFlowFile(path) -> list:
+    with open(path, "rb") as file:
+        return loadComponents(file)
+
+def uniqueNames(components) -> list[str]:
+    """
+    Component names are not unique in the GUI, so duplicates get a #n suffix
+    """
+    counts = {}
+    for component in components:
+        counts[component.name] = counts.get(component.name, 0) + 1
+
+    seen = {}
+    names = []
+    for component in components:
+        if counts[component.name] == 1:
+            names.append(component.name)
+            continue
+        seen[component.name] = seen.get(component.name, 0) + 1
+        names.append(f"{component.name}#{seen[component.name]}")
+    return names
+
+class HeadlessRunner:
+    def __init__(self, components, dt: float = flowModel.dt, recordConnectors: bool = False, listOrder: bool = False, innerIterations: int = 1, engine: str = "objects", tolerance: float = None, window: int = 100, checkpointEvery: int = None, checkpointPath=None, record: list[str] = None, streamPath=None, profile: bool = False, skipUnchanged: float = None):
+        self.components = components
+        self.dt = dt
+        self.ticks = 0
+        # First tick of the recorded series, not 0 after resume()
+        self.startTick = 0
+        # listOrder reproduces the old GUI behaviour of updating in the order components were added
+        self.schedule = None if listOrder else FlowSchedule(components, innerIterations)
+
+        # (series name, connector, attribute) per recorded column
+        self.columns = []
+        for name, component in zip(uniqueNames(components), components):
+            if isinstance(component, Plotter):
+                self.columns.append((name, component.inputs[0], "temp"))
+            if not recordConnectors:
+                continue
+            for connector in component.connectors:
+                self.columns.append((f"{name}.{connector.name}.temp", connector, "temp"))
+                self.columns.append((f"{name}.{connector.name}.flowSpeed", connector, "flowSpeed"))
+        if record:
+            from flowResults import columnCatalog, selectColumns
+            recorded = {name for name, _, _ in self.columns}
+            catalog = columnCatalog(components, uniqueNames(components))
+            self.columns += [column for column in selectColumns(catalog, record) if column[0] not in recorded]
+
+        # With streamPath the rows go to a ResultSink on disk instead of the series lists
+        self.sink = None
+        if streamPath is not None:
+            from flowResults import ResultSink
+            self.sink = ResultSink(streamPath, [name for name, _, _ in self.columns], dt)
+        self.series = {name: [] for name, _, _ in self.columns} if self.sink is None else {}
+
+        self.arrayEngine = None
+        if engine == "arrays":
+            from flowArrays import ArrayEngine
+            self.arrayEngine = ArrayEngine(components, self.schedule)
+        elif engine == "compiled":
+            from flowCompile import CompiledEngine
+            self.arrayEngine = CompiledEngine(components, components if self.schedule is None else self.schedule.updates())
+        if self.arrayEngine is not None:
+            sample = self.arrayEngine.sampler([c for _, c, _ in self.columns], [a for _, _, a in self.columns])
+        else:
+            sample = lambda: [getattr(connector, attribute) for _, connector, attribute in self.columns]
+        self.sample = sample
+
+        # With a tolerance, run() stops once the model reached a steady state
+        self.convergence = None
+        if tolerance is not None:
+            from flowConvergence import ConvergenceMonitor
+            if self.arrayEngine is not None:
+                self.convergence = ConvergenceMonitor.forArrayEngine(self.arrayEngine, tolerance, window)
+            else:
+                self.convergence = ConvergenceMonitor.forComponents(components, tolerance, window)
+
+        # With checkpointPath the latest checkpoint is written to disk, so a crashed run can resume
+        self.checkpoints = None
+        if checkpointEvery is not None:
+            from flowCheckpoint import CheckpointStore
+            self.checkpoints = CheckpointStore(checkpointEvery)
+        self.checkpointPath = checkpointPath
+
+        # With profile the time per component is collected, only for the objects engine
+        self.profiler = None
+        if profile:
+            if self.arrayEngine is not None:
+                raise ValueError("profiling works per component and needs the objects engine")
+            self.profiler = Profiler()
+
+        # With skipUnchanged only components whose inputs changed by more than it are updated
+        self.propagation = None
+        if skipUnchanged is not None:
+            if self.arrayEngine is not None or self.profiler is not None:
+                raise ValueError("skipping unchanged components works per component and needs the objects engine without profiling")
+            from flowPropagation import ChangePropagation
+            self.propagation = ChangePropagation(components, components if self.schedule is None else self.schedule.updates(), skipUnchanged)
+
+    def syncObjects(self):
+        if self.arrayEngine is not None:
+            self.arrayEngine.writeBack()
+
+    def settle(self):
+        """
+        Puts the model in its steady state at the current tick, solved directly, see flowSteady
+        """
+        from flowSteady import solveSteadyState
+
+        self.syncObjects()
+        solveSteadyState(self.components, self.ticks, self.dt)
+        if self.arrayEngine is not None:
+            self.arrayEngine.readState()
+        if self.propagation is not None:
+            self.propagation.invalidate()
+
+    def checkpoint(self):
+        self.syncObjects()
+        self.checkpoints.capture(self.ticks, self.components)
+        if self.checkpointPath is not None:
+            self.checkpoints.save(self.checkpointPath, latestOnly=True)
+
+    def resume(self, path) -> int:
+        """
+        Continues from the latest checkpoint in path, returns its tick
+        """
+        from flowCheckpoint import CheckpointStore
+
+        store = CheckpointStore.load(path)
+        tick = store.restore(store.latestTick(), self.components) if len(store) > 0 else None
+        if tick is None:
+            raise ValueError(f"{path} has no checkpoint for this model")
+        if self.arrayEngine is not None:
+            self.arrayEngine.readState()
+        if self.propagation is not None:
+            self.propagation.invalidate()
+        self.ticks = self.startTick = tick
+        if self.sink is not None:
+            self.sink.resumeAt(tick)
+        return tick
+
+    def step(self):
+        flowModel.iteratie = self.ticks
+        if self.arrayEngine is not None:
+            self.arrayEngine.step()
+        elif self.profiler is not None:
+            self.profiler.step(self.components if self.schedule is None else self.schedule.updates())
+        elif self.propagation is not None:
+            self.propagation.step()
+        elif self.schedule is None:
+            for component in self.components:
+                component.update()
+        else:
+            self.schedule.step()
+        if self.sink is not None:
+            self.sink.append(self.sample())
+        else:
+            for (name, _, _), value in zip(self.columns, self.sample()):
+                self.series[name].append(value)
+        if self.convergence is not None:
+            self.convergence.observe(self.ticks)
+        self.ticks += 1
+        if self.checkpoints is not None and self.checkpoints.due(self.ticks):
+            self.checkpoint()
+
+    def run(self, ticks: int):
+        flowModel.dt = self.dt
+        from flowSignals import precomputeSignals
+        end = self.ticks + ticks
+        signalsUntil = self.ticks
+        for _ in range(ticks):
+            if self.arrayEngine is None and self.ticks == signalsUntil:
+                # The analytic signals become a lookup per tick; a chunk at a time, so a large
+                # --ticks budget that converges early does not tabulate all of it
+                signalsUntil = min(self.ticks + signalChunkTicks, end)
+                precomputeSignals(self.components, signalsUntil - self.ticks, self.dt, self.ticks)
+            self.step()
+            if self.convergence is not None and self.convergence.converged:
+                break
+        self.syncObjects()
+        if self.sink is not None:
+            self.sink.flush()
+        return self.series
+
+    def times(self) -> list[float]:
+        return [tick * self.dt for tick in range(self.startTick, self.ticks)]
+
+    def writeCsv(self, path):
+        names = list(self.series)
+        with open(path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["tick", "time"] + names)
+            for i, tijd in enumerate(self.times()):
+                writer.writerow([self.startTick + i, tijd] + [self.series[name][i] for name in names])
+
+    def writeNumpy(self, path):
+        import numpy as np
+        np.savez(path, tick=np.arange(self.startTick, self.ticks), time=np.array(self.times()), **{name: np.array(data) for name, data in self.series.items()})
+
+    def write(self, path):
+        if str(path).endswith(".npz"):
+            self.writeNumpy(path)
+        else:
+            self.writeCsv(path)
+
+def runFlowFile(path, ticks: int, dt: float = flowModel.dt, recordConnectors: bool = False, listOrder: bool = False, innerIterations: int = 1, engine: str = "objects", tolerance: float = None, window: int = 100, checkpointEvery: int = None, checkpointPath=None, resumePath=None, record: list[str] = None, streamPath=None, profile: bool = False, skipUnchanged: float = None, startSteady: bool = False) -> HeadlessRunner:
+    runner = HeadlessRunner(loadFlowFile(path), dt, recordConnectors, listOrder, innerIterations, engine, tolerance, window, checkpointEvery, checkpointPath, record, streamPath, profile, skipUnchanged)
+    if resumePath is not None:
+        runner.resume(resumePath)
+    elif startSteady:
+        runner.settle()
+    runner.run(ticks)
+    return runner
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate .flow models without the GUI")
+    parser.add_argument("models", nargs="+", help=".flow files to simulate")
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    parser.add_argument("--output", "-o", help="output file (.csv or .npz), only for a single model")
+    parser.add_argument("--output-dir", help="directory for one output file per model")
+    parser.add_argument("--format", choices=["csv", "npz"], default="csv", help="file format used with --output-dir")
+    parser.add_argument("--all-connectors", action="store_true", help="also record temp and flowSpeed of every connector")
+    parser.add_argument("--record", action="append", metavar="PATTERN", help="also record matching values, e.g. 'Buffer*.temp' or '*.OUT.flowSpeed'")
+    parser.add_argument("--stream", metavar="DIR", help="stream the recorded values to disk in chunks instead of keeping them in memory, only for a single model")
+    parser.add_argument("--list-order", action="store_true", help="update components in list order instead of the compiled schedule")
+    parser.add_argument("--inner-iterations", type=int, default=1, help="passes per tick over each cycle in the schedule")
+    parser.add_argument("--engine", choices=["objects", "arrays", "compiled"], default="objects", help="object loop, vectorized NumPy engine (only faster for wide models, about 3x slower on the shipped ones) or generated step function")
+    parser.add_argument("--until-steady", type=float, metavar="TOLERANCE", help="stop once no value changes more than TOLERANCE per tick for --window ticks")
+    parser.add_argument("--window", type=int, default=100)
+    parser.add_argument("--checkpoint", metavar="PATH", help="keep the latest checkpoint in this .npz file, only for a single model")
+    parser.add_argument("--checkpoint-every", type=int, default=1000, metavar="TICKS")
+    parser.add_argument("--resume", metavar="PATH", help="continue from the checkpoint in this file, --ticks more ticks")
+    parser.add_argument("--profile", metavar="PATH", help="write the time per component and per class as JSON, only for a single model")
+    parser.add_argument("--skip-unchanged", type=float, nargs="?", const=0.0, metavar="EPSILON", help="only update components whose inputs changed by more than EPSILON (default 0, exact) and report the skipped updates")
+    parser.add_argument("--start-steady", action="store_true", help="start from the steady state, solved directly instead of ticked")
+    args = parser.parse_args(argv)
+
+    if args.engine == "arrays" and (args.list_order or args.inner_iterations != 1):
+        parser.error("the arrays engine always runs the compiled schedule with one pass per tick")
+
+    if args.output is not None and len(args.models) > 1:
+        parser.error("--output can only be used with a single model, use --output-dir")
+    if (args.checkpoint is not None or args.resume is not None or args.stream is not None or args.profile is not None) and len(args.models) > 1:
+        parser.error("--checkpoint, --resume, --stream and --profile can only be used with a single model")
+    if args.profile is not None and args.engine != "objects":
+        parser.error("--profile times the components one by one and needs the objects engine")
+    if args.skip_unchanged is not None and (args.engine != "objects" or args.profile is not None):
+        parser.error("--skip-unchanged needs the objects engine and can not be combined with --profile")
+    if args.start_steady and args.resume is not None:
+        parser.error("--start-steady starts a new run, it can not be combined with --resume")
+    if args.stream is not None and (args.output is not None or args.output_dir is not None):
+        parser.error("--stream writes the results itself, read them with flowResults.py")
+
+    for model in args.models:
+        start = time.perf_counter()
+        try:
+            runner = runFlowFile(
+                model, args.ticks, args.dt, args.all_connectors, args.list_order, args.inner_iterations, args.engine, args.until_steady, args.window,
+                args.checkpoint_every if args.checkpoint is not None else None, args.checkpoint, args.resume, args.record, args.stream,
+                args.profile is not None, args.skip_unchanged, args.start_steady
+            )
+        except ValueError as error:
+            # Such as a model without a steady state, the other models still run
+            print(f"{model}: {error}")
+            continue
+        duration = time.perf_counter() - start
+        ticks = runner.ticks - runner.startTick
+        print(f"{model}: {ticks} ticks in {duration:.3f}s ({ticks / max(duration, 1e-9):.0f} ticks/s)")
+        if runner.convergence is not None:
+            if runner.convergence.converged:
+                print(f"{model}: converged at tick {runner.convergence.convergedAt}")
+            else:
+                print(f"{model}: not converged, last change {runner.convergence.lastChange:.3g}")
+
+        if runner.propagation is not None:
+            evaluated, skipped = runner.propagation.totals()
+            print(f"{model}: {skipped} of {evaluated + skipped} component updates skipped ({runner.propagation.skippedShare():.1%})")
+
+        if runner.profiler is not None:
+            runner.profiler.writeJson(args.profile, runner.components)
+
+        if args.output is not None:
+            runner.write(args.output)
+        elif args.output_dir is not None:
+            os.makedirs(args.output_dir, exist_ok=True)
+            stem = os.path.splitext(os.path.basename(model))[0]
+            runner.write(os.path.join(args.output_dir, f"{stem}.{args.format}"))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import argparse
+import contextlib
+import json
+import math
+import os
+import random
+import time
+import tracemalloc
+
+import flowFormat
+import flowModel
+from flowBenchmark import compare, latencySummary, metricDirections
+from flowGenerate import generateGraph, shapes
+from flowRunner import HeadlessRunner
+from flowSchedule import FlowSchedule
+from flowSpatial import SpatialIndex
+
+# Scaling suite: generated models of growing size, to see where the tick loop, loading,
+# hit-testing and the canvas stop scaling linearly
+
+# Metric name -> True if higher is better, on top of the benchmark metrics
+scalingDirections = dict(metricDirections, generateMs=False, scheduleMs=False, saveMs=False, usPerComponent=False, rebuildMs=False, hitUs=False, redrawMs=False, frameMs=False)
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1e3
+
+def measureTicks(components, ticks: int, engine: str) -> dict:
+    runner = HeadlessRunner(components, engine=engine)
+    flowModel.dt = runner.dt
+    latencies = []
+    clock = time.perf_counter
+    start = clock()
+    for _ in range(ticks):
+        tickStart = clock()
+        runner.step()
+        latencies.append(clock() - tickStart)
+    result = latencySummary(latencies, clock() - start)
+    result["usPerComponent"] = 1e6 / result["ticksPerSecond"] / len(components)
+    return result
+
+def measureMemory(size: int, shape: str, seed: int, ticks: int) -> float:
+    """
+    Peak traced memory in kB while building the model and running a few ticks
+    """
+    tracemalloc.start()
+    try:
+        runner = HeadlessRunner(generateGraph(size, shape, seed))
+        runner.run(ticks)
+        return tracemalloc.get_traced_memory()[1] / 1024
+    finally:
+        tracemalloc.stop()
+
+def measureHitTesting(components, queries: int, seed: int) -> dict:
+    """
+    Time to index the model and per lookup of a component and a connector at random points
+    """
+    index = SpatialIndex()
+    _, rebuildMs = timed(index.rebuild, components)
+    width = max(component.x for component in components) + 100
+    height = max(component.y for component in components) + 100
+    rng = random.Random(seed)
+    points = [(rng.uniform(0, width), rng.uniform(0, height)) for _ in range(queries)]
+    start = time.perf_counter()
+    for x, y in points:
+        index.componentAt(x, y)
+        index.connectorAt(x, y)
+    return {"rebuildMs": rebuildMs, "hitUs": (time.perf_counter() - start) / queries * 1e6}
+
+def measureCanvas(components, frames: int) -> dict:
+    """
+    Drawing the whole canvas once, and the connection recolouring the GUI does per frame.
+    Needs a display.
+    """
+    import tkinter as tk
+    from betterFlowApp import ConnectorApp
+
+    root = tk.Tk()
+    try:
+        app = ConnectorApp(root)
+        app.components = components
+        app.spatialIndex.rebuild(components)
+        _, redrawMs = timed(lambda: (app.redraw_canvas(), root.update()))
+        schedule = app.getSchedule()
+        flowModel.dt = HeadlessRunner(components).dt
+        durations = []
+        for tick in range(frames):
+            flowModel.iteratie = tick
+            schedule.step()
+            _, frameMs = timed(lambda: (app.redraw_connector(app.captureSnapshot()), root.update()))
+            durations.append(frameMs)
+        return {"redrawMs": redrawMs, "frameMs": min(durations)}
+    finally:
+        root.destroy()
+
+def measureSize(size: int, shape: str, seed: int, ticks: int, engines: list[str], render: bool, queries: int) -> dict:
+    components, generateMs = timed(generateGraph, size, shape, seed)
+    data, saveMs = timed(flowFormat.dumps, components)
+    _, loadMs = timed(flowFormat.loads, data)
+    _, scheduleMs = timed(FlowSchedule, components)
+    result = {
+        "components": len(components), "generateMs": generateMs, "saveMs": saveMs, "loadMs": loadMs,
+        "scheduleMs": scheduleMs, "peakMemoryKb": measureMemory(size, shape, seed, min(ticks, 10))
+    }
+    result.update(measureHitTesting(components, queries, seed))
+    for engine in engines:
+        # Every engine starts from the same initial state
+        result[engine] = measureTicks(flowFormat.loads(data), ticks, engine)
+    if render:
+        try:
+            result["render"] = measureCanvas(flowFormat.loads(data), min(ticks, 20))
+        except Exception as error:
+            result["render"] = {"skipped": str(error)}
+    return result
+
+def runScaling(sizes: list[int], shape: str, seed: int, ticks: int, engines: list[str], render: bool, queries: int = 2000) -> dict:
+    results = {}
+    for size in sizes:
+        # Printers print every tick
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            results[f"generated/{shape}/{size}"] = measureSize(size, shape, seed, ticks, engines, render, queries)
+    return results
+
+def exponents(results: dict, metric: str) -> list[tuple[str, float]]:
+    """
+    Growth exponent of a time metric between consecutive sizes: 1 is linear in the number
+    of components, 2 quadratic
+    """
+    rows = []
+    entries = list(results.items())
+    for (_, small), (name, large) in zip(entries, entries[1:]):
+        a, b = small, large
+        for key in metric.split(".")[:-1]:
+            a, b = a.get(key, {}), b.get(key, {})
+        key = metric.split(".")[-1]
+        if key in a and key in b and a[key] > 0 and b[key] > 0:
+            rows.append((name, math.log(b[key] / a[key]) / math.log(large["components"] / small["components"])))
+    return rows
+
+def printTable(results: dict, engines: list[str]):
+    header = f"{'size':>7} {'gen ms':>8} {'load ms':>8} {'sched ms':>8} {'peak kB':>9} {'hit us':>7}"
+    for engine in engines:
+        header += f" {engine + ' t/s':>14} {'us/comp':>8}"
+    header += f" {'redraw ms':>10} {'frame ms':>9}"
+    print(header)
+    for result in results.values():
+        line = f"{result['components']:>7} {result['generateMs']:>8.1f} {result['loadMs']:>8.1f} {result['scheduleMs']:>8.1f} {result['peakMemoryKb']:>9.0f} {result['hitUs']:>7.2f}"
+        for engine in engines:
+            run = result[engine]
+            line += f" {run['ticksPerSecond']:>14.1f} {run['usPerComponent']:>8.3f}"
+        render = result.get("render", {})
+        if "redrawMs" in render:
+            line += f" {render['redrawMs']:>10.1f} {render['frameMs']:>9.1f}"
+        else:
+            line += f" {'-':>10} {'-':>9}"
+        print(line)
+
+    timeMetrics = ["loadMs", "scheduleMs", "hitUs"] + [f"{engine}.p50Us" for engine in engines] + ["render.redrawMs", "render.frameMs"]
+    for metric in timeMetrics:
+        rows = exponents(results, metric)
+        if len(rows) > 0:
+            print(f"{metric:<18} growth exponent " + ", ".join(f"{exponent:.2f}" for _, exponent in rows))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how the simulator scales on generated models of growing size")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="comma separated component counts")
+    parser.add_argument("--shape", choices=shapes, default="branching")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ticks", type=int, default=50)
+    parser.add_argument("--engine", action="append", choices=["objects", "arrays", "compiled"], help="default all three")
+    parser.add_argument("--render", action="store_true", help="also measure the canvas drawing, needs a display")
+    parser.add_argument("--baseline", help="compare with the JSON of an earlier run")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative change that counts as a regression")
+    parser.add_argument("--output", "-o", help="write the results as JSON")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    engines = args.engine or ["objects", "arrays", "compiled"]
+    results = runScaling(sizes, args.shape, args.seed, args.ticks, engines, args.render)
+    printTable(results, engines)
+
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        try:
+            regressions = compare(results, baseline, args.threshold, scalingDirections)
+        except ValueError as error:
+            raise SystemExit(f"{args.baseline}: {error}")
+        missing = [name for name in results if name not in baseline]
+        if len(missing) > 0:
+            print(f"Not in {args.baseline}, not compared: {', '.join(missing)}")
+        for regression in regressions:
+            print("REGRESSION", regression)
+        if len(regressions) > 0:
+            raise SystemExit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
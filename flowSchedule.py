@@ -0,0 +1,214 @@
+import argparse
+import heapq
+
+# Update schedule: runs components in the order the flow graph needs instead of list order
+
+def connectorOwners(components) -> dict:
+    owners = {}
+    for component in components:
+        for connector in component.connectors:
+            owners[connector] = component
+        for logicConnector in component.logicConnectors:
+            if logicConnector is not None:
+                owners[logicConnector] = component
+    return owners
+
+def dependencies(components, owners: dict = None) -> dict:
+    """
+    Returns for every component the components whose values it reads in update()
+    """
+    if owners is None:
+        owners = connectorOwners(components)
+
+    predecessors = {component: [] for component in components}
+    for component in components:
+        sources = [input.connectedTo for input in component.inputs if input.connectedTo is not None]
+        if component.logicInput is not None and len(component.logicInput.connectedTo) > 0:
+            sources.append(component.logicInput.connectedTo[0])
+
+        for source in sources:
+            owner = owners.get(source)
+            if owner is not None and owner not in predecessors[component]:
+                predecessors[component].append(owner)
+    return predecessors
+
+def stronglyConnected(components, successors: dict) -> list[list]:
+    """
+    Tarjan's algorithm, iterative so large graphs do not hit the recursion limit
+    """
+    index = {}
+    lowLink = {}
+    stack = []
+    onStack = set()
+    groups = []
+    counter = 0
+
+    for root in components:
+        if root in index:
+            continue
+        work = [(root, iter(successors[root]))]
+        index[root] = lowLink[root] = counter
+        counter += 1
+        stack.append(root)
+        onStack.add(root)
+
+        while work:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = lowLink[child] = counter
+                    counter += 1
+                    stack.append(child)
+                    onStack.add(child)
+                    work.append((child, iter(successors[child])))
+                    break
+                if child in onStack:
+                    lowLink[node] = min(lowLink[node], index[child])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowLink[parent] = min(lowLink[parent], lowLink[node])
+                if lowLink[node] == index[node]:
+                    group = []
+                    while True:
+                        member = stack.pop()
+                        onStack.discard(member)
+                        group.append(member)
+                        if member is node:
+                            break
+                    groups.append(group)
+    return groups
+
+class FlowSchedule:
+    """
+    Topological update order of a component graph.
+
+    Cycles are kept together in a group. Inside a group the order is chosen so as few
+    connections as possible read last tick's value; those connections are the break
+    points and are listed in brokenEdges. With innerIterations > 1 a cycle group is
+    updated several times per tick. Components with internal state (Buffer, Plotter,
+    Printer) are then only updated in the last pass, so they still advance once per tick.
+    """
+    def __init__(self, components, innerIterations: int = 1):
+        self.components = list(components)
+        self.innerIterations = innerIterations
+        self.position = {component: i for i, component in enumerate(self.components)}
+        self.predecessors = dependencies(self.components)
+        self.successors = {component: [] for component in self.components}
+        for component, predecessors in self.predecessors.items():
+            for predecessor in predecessors:
+                self.successors[predecessor].append(component)
+
+        self.groups = []
+        self.brokenEdges = []
+        self.compile()
+        self.order = [component for group in self.groups for component in group]
+
+    def isCycle(self, group) -> bool:
+        return len(group) > 1 or group[0] in self.predecessors[group[0]]
+
+    def compile(self):
+        groups = stronglyConnected(self.components, self.successors)
+        groupOf = {}
+        for i, group in enumerate(groups):
+            for member in group:
+                groupOf[member] = i
+
+        # Kahn over the condensed graph, ties broken by position in the component list
+        inDegree = [0] * len(groups)
+        groupSuccessors = [set() for _ in groups]
+        for component, successors in self.successors.items():
+            for successor in successors:
+                a, b = groupOf[component], groupOf[successor]
+                if a != b and b not in groupSuccessors[a]:
+                    groupSuccessors[a].add(b)
+                    inDegree[b] += 1
+
+        firstPosition = [min(self.position[member] for member in group) for group in groups]
+        ready = [(firstPosition[i], i) for i in range(len(groups)) if inDegree[i] == 0]
+        heapq.heapify(ready)
+        while ready:
+            _, i = heapq.heappop(ready)
+            self.groups.append(self.orderGroup(groups[i]))
+            for j in groupSuccessors[i]:
+                inDegree[j] -= 1
+                if inDegree[j] == 0:
+                    heapq.heappush(ready, (firstPosition[j], j))
+
+    def orderGroup(self, group) -> list:
+        if not self.isCycle(group):
+            return group
+
+        members = set(group)
+        remaining = {member: [p for p in self.predecessors[member] if p in members] for member in group}
+        # Lazy heap on (unresolved inputs, position): stale entries are skipped when popped
+        heap = [(len(remaining[member]), self.position[member], member) for member in group]
+        heapq.heapify(heap)
+        ordered = []
+        while heap:
+            count, _, member = heapq.heappop(heap)
+            if member not in remaining or count != len(remaining[member]):
+                continue
+            # Break the cycle at the member with the fewest unresolved inputs
+            for predecessor in remaining.pop(member):
+                self.brokenEdges.append((predecessor, member))
+            ordered.append(member)
+            for successor in self.successors[member]:
+                if successor in remaining and member in remaining[successor]:
+                    remaining[successor].remove(member)
+                    heapq.heappush(heap, (len(remaining[successor]), self.position[successor], successor))
+        return ordered
+
+    def cycles(self) -> list[list]:
+        return [group for group in self.groups if self.isCycle(group)]
+
+    def updates(self):
+        """
+        The components in the order step() updates them, for instrumentation; step() itself
+        does not go through this generator to keep the tick loop fast
+        """
+        for group in self.groups:
+            if self.innerIterations <= 1 or not self.isCycle(group):
+                yield from group
+                continue
+            for iteration in range(self.innerIterations):
+                lastPass = iteration == self.innerIterations - 1
+                for component in group:
+                    if not component.stateful or lastPass:
+                        yield component
+
+    def step(self):
+        for group in self.groups:
+            if self.innerIterations <= 1 or not self.isCycle(group):
+                for component in group:
+                    component.update()
+                continue
+
+            for iteration in range(self.innerIterations):
+                lastPass = iteration == self.innerIterations - 1
+                for component in group:
+                    if component.stateful and not lastPass:
+                        continue
+                    component.update()
+
+def main(argv=None):
+    from flowRunner import loadFlowFile, uniqueNames
+
+    parser = argparse.ArgumentParser(description="Show the update schedule of a .flow model")
+    parser.add_argument("model")
+    args = parser.parse_args(argv)
+
+    components = loadFlowFile(args.model)
+    names = dict(zip(components, uniqueNames(components)))
+    schedule = FlowSchedule(components)
+
+    for i, component in enumerate(schedule.order):
+        print(f"{i:4d}  {type(component).__name__:<14} {names[component]}")
+    for group in schedule.cycles():
+        print("cycle:", " -> ".join(names[member] for member in group))
+    for predecessor, component in schedule.brokenEdges:
+        print(f"break point: {names[component]} reads {names[predecessor]} from the previous tick")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import argparse
+import csv
+import math
+import os
+
+import numpy as np
+
+import flowModel
+from flowModel import RealisticSun, SinusSignal
+
+# Time series for signal components: measured profiles from CSV or .npy files, and the
+# analytic signals precomputed for a whole run
+
+interpolations = ("linear", "step")
+
+class SignalTable:
+    """
+    Values on a uniform grid of step hours starting at time 0.
+
+    valueAt(time) interpolates linearly or holds the previous value, in O(1) because the
+    grid is uniform. resample(dt) makes the table for the simulation grid once, after which
+    a tick is a plain index lookup with atTick(tick). With repeat the table loops, so a year
+    of hourly data keeps going; otherwise it holds the last value.
+    """
+    def __init__(self, values, step: float = 1.0, interpolation: str = "linear", repeat: bool = True):
+        if len(values) == 0:
+            raise ValueError("a signal table needs at least one value")
+        if interpolation not in interpolations:
+            raise ValueError(f"Unknown interpolation {interpolation}, use {' or '.join(interpolations)}")
+        self.values = values
+        self.length = len(values)
+        self.step = step
+        self.interpolation = interpolation
+        self.repeat = repeat
+
+    def __len__(self):
+        return self.length
+
+    def valueAt(self, time: float) -> float:
+        position = time / self.step
+        if self.repeat:
+            position %= self.length
+        else:
+            position = min(max(position, 0), self.length - 1)
+        i = int(position)
+        fraction = position - i
+        if self.interpolation == "step" or fraction == 0:
+            return float(self.values[i])
+        j = (i + 1) % self.length if self.repeat else min(i + 1, self.length - 1)
+        return float(self.values[i] + (self.values[j] - self.values[i]) * fraction)
+
+    def atTick(self, tick: int) -> float:
+        """
+        Value at a tick of a table made by resample(); between ticks it is interpolated
+        """
+        if tick != int(tick):
+            return self.valueAt(tick * self.step)
+        tick = int(tick)
+        if self.repeat:
+            return self.values[tick % self.length]
+        return self.values[min(tick, self.length - 1)]
+
+    def resample(self, dt: float):
+        """
+        This table on the simulation grid of time step dt, or None when a repeating table's
+        period is not a whole number of ticks and valueAt() has to be used instead
+        """
+        ticks = self.length * self.step / dt
+        if self.repeat and abs(ticks - round(ticks)) > 1e-9 * ticks:
+            return None
+        count = max(1, round(ticks) if self.repeat else math.ceil((self.length - 1) * self.step / dt) + 1)
+        values = [self.valueAt(tick * dt) for tick in range(count)]
+        return SignalTable(values, dt, "step", self.repeat)
+
+# Parsed files per (path, column, modification time), so sweeps and components share them
+loadedFiles = {}
+
+def readColumn(path, column: str = ""):
+    """
+    One column of a CSV file with a header row or of a .npy file, by name or number;
+    "" is the first column. .npy files are memory-mapped instead of read.
+    """
+    if str(path).endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        columns = 1 if data.ndim == 1 else data.shape[1]
+        if column != "" and not (column.isdigit() and int(column) < columns):
+            raise ValueError(f"{path} has no column {column}, only 0 to {columns - 1}")
+        return data if data.ndim == 1 else data[:, int(column or 0)]
+
+    with open(path, newline="") as file:
+        rows = list(csv.reader(file))
+    if len(rows) < 2:
+        raise ValueError(f"{path} has no data rows")
+    header = [name.strip() for name in rows[0]]
+    if column == "":
+        index = 0
+    elif column in header:
+        index = header.index(column)
+    elif str(column).isdigit() and int(column) < len(header):
+        index = int(column)
+    else:
+        raise ValueError(f"{path} has no column {column}, only {', '.join(header)}")
+    return np.array([float(row[index]) for row in rows[1:] if len(row) > index and row[index].strip() != ""])
+
+def loadTable(path, column: str = "", step: float = 1.0, interpolation: str = "linear") -> SignalTable:
+    try:
+        key = (os.path.abspath(path), str(column), os.path.getmtime(path))
+    except OSError as error:
+        raise ValueError(f"Can not read {path}: {error.strerror}") from None
+    values = loadedFiles.get(key)
+    if values is None:
+        try:
+            values = readColumn(path, str(column))
+        except (OSError, IndexError) as error:
+            raise ValueError(f"Can not read {path}: {error}") from None
+        loadedFiles[key] = values
+    return SignalTable(values, step, interpolation)
+
+def precomputeSignals(components, ticks: int, dt: float = flowModel.dt, start: int = 0) -> int:
+    """
+    Tabulates every SinusSignal, and every RealisticSun without a logic input, for ticks ticks
+    of time step dt from tick start, using the same formula as update(). Outside those ticks
+    update() computes the value itself. Returns the number of tables made.
+    """
+    count = 0
+    for component in components:
+        if type(component) is SinusSignal:
+            values = [component.valueAt(dt, tick) for tick in range(start, start + ticks)]
+        elif type(component) is RealisticSun and component.logicInput is not None and len(component.logicInput.connectedTo) == 0:
+            values = [component.valueAt(dt, tick, 0) for tick in range(start, start + ticks)]
+        else:
+            continue
+        component.table = SignalTable(values, dt, "step", repeat=False) if ticks > 0 else None
+        component.tableStart = start
+        count += 1
+    return count
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect a profile for a ProfileSignal, or convert a CSV column to .npy")
+    parser.add_argument("path")
+    parser.add_argument("--column", default="", help="column name or number, default the first")
+    parser.add_argument("--step", type=float, default=1.0, help="hours per row")
+    parser.add_argument("--output", "-o", help="write the column as .npy, which a ProfileSignal memory-maps")
+    args = parser.parse_args(argv)
+
+    try:
+        table = loadTable(args.path, args.column, args.step)
+    except ValueError as error:
+        parser.error(str(error))
+    values = np.asarray(table.values)
+    print(f"{args.path}: {len(table)} values over {len(table) * args.step:g} hours, min {values.min():.4g}, mean {values.mean():.4g}, max {values.max():.4g}")
+    if args.output is not None:
+        np.save(args.output, values.astype(float))
+
+if __name__ == "__main__":
+    main()
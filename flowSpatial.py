@@ -0,0 +1,102 @@
+import math
+
+# Spatial index for hit-testing on the canvas, so clicks and drags do not scan every component
+
+connectorRadius = 5
+
+class SpatialIndex:
+    """
+    Uniform grid over component rectangles and connector positions.
+
+    Connector positions and owners are cached and only recomputed when a component is
+    added or moved. Lookups return the same result as scanning the component list in
+    order, because every hit is ranked by the component's position in that list.
+    """
+    def __init__(self, cellSize: float = 64):
+        self.cellSize = cellSize
+        self.rebuild([])
+
+    def rebuild(self, components):
+        self.componentCells = {}
+        self.connectorCells = {}
+        self.cellsOf = {}
+        self.positions = {}
+        self.owners = {}
+        self.rank = {}
+        self.nextRank = 0
+        for component in components:
+            self.addComponent(component)
+
+    def cellRange(self, low: float, high: float) -> range:
+        return range(math.floor(low / self.cellSize), math.floor(high / self.cellSize) + 1)
+
+    def addComponent(self, component):
+        if component not in self.rank:
+            self.rank[component] = self.nextRank
+            self.nextRank += 1
+
+        cells = []
+        for cellX in self.cellRange(component.x - component.width / 2, component.x + component.width / 2):
+            for cellY in self.cellRange(component.y - component.height / 2, component.y + component.height / 2):
+                self.componentCells.setdefault((cellX, cellY), []).append(component)
+                cells.append((self.componentCells, (cellX, cellY), component))
+
+        for connector, x, y in component.connectorPositions():
+            self.positions[connector] = (x, y)
+            self.owners[connector] = component
+            for cellX in self.cellRange(x - connectorRadius, x + connectorRadius):
+                for cellY in self.cellRange(y - connectorRadius, y + connectorRadius):
+                    self.connectorCells.setdefault((cellX, cellY), []).append(connector)
+                    cells.append((self.connectorCells, (cellX, cellY), connector))
+        self.cellsOf[component] = cells
+
+    def removeComponent(self, component):
+        # The recorded cells, not connectorPositions(), since a SubFlow can have changed its ports
+        for grid, cell, item in self.cellsOf.pop(component, []):
+            grid[cell].remove(item)
+            if len(grid[cell]) == 0:
+                del grid[cell]
+            if item is not component:
+                self.positions.pop(item, None)
+                self.owners.pop(item, None)
+
+    def moveComponent(self, component):
+        rank = self.rank.get(component)
+        self.removeComponent(component)
+        if rank is not None:
+            self.rank[component] = rank
+        self.addComponent(component)
+
+    def deleteComponent(self, component):
+        self.removeComponent(component)
+        self.rank.pop(component, None)
+
+    def cell(self, x: float, y: float) -> tuple[int, int]:
+        return math.floor(x / self.cellSize), math.floor(y / self.cellSize)
+
+    def componentsAt(self, x: float, y: float) -> list:
+        hits = [
+            component for component in self.componentCells.get(self.cell(x, y), [])
+            if component.x - component.width / 2 <= x <= component.x + component.width / 2
+            and component.y - component.height / 2 <= y <= component.y + component.height / 2
+        ]
+        return sorted(hits, key=self.rank.get)
+
+    def componentAt(self, x: float, y: float):
+        hits = self.componentsAt(x, y)
+        return hits[0] if len(hits) > 0 else None
+
+    def connectorAt(self, x: float, y: float):
+        best = None
+        for connector in self.connectorCells.get(self.cell(x, y), []):
+            connectorX, connectorY = self.positions[connector]
+            if abs(connectorX - x) < connectorRadius and abs(connectorY - y) < connectorRadius:
+                if best is None or self.rank[self.owners[connector]] < self.rank[self.owners[best]]:
+                    best = connector
+        return best
+
+    def connectorPosition(self, connector):
+        return self.positions.get(connector)
+
+    def owner(self, connector):
+        return self.owners.get(connector)
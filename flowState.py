@@ -0,0 +1,60 @@
+import numpy as np
+
+# Simulation state of a component list: everything update() reads from the previous tick
+
+def stateComponents(components) -> list:
+    """
+    The components followed by the ones inside every SubFlow instance, whose state is part of the model's
+    """
+    result = []
+    for component in components:
+        result.append(component)
+        innerComponents = getattr(component, "innerComponents", None)
+        if innerComponents is not None:
+            result += stateComponents(innerComponents())
+    return result
+
+def captureState(components) -> dict:
+    """
+    Copies connector values, logic values and the Buffer temperatures, without Plotter histories
+    """
+    components = stateComponents(components)
+    return {
+        "connectors": [(connector.temp, connector.flowSpeed) for component in components for connector in component.connectors],
+        "logic": [logicConnector.value for component in components for logicConnector in component.logicConnectors if logicConnector is not None],
+        "temps": [component.temp for component in components if hasattr(component, "temp")]
+    }
+
+def restoreState(components, state: dict):
+    components = stateComponents(components)
+    connectors = (connector for component in components for connector in component.connectors)
+    for connector, (temp, flowSpeed) in zip(connectors, state["connectors"]):
+        connector.temp = temp
+        connector.flowSpeed = flowSpeed
+    logicConnectors = (logicConnector for component in components for logicConnector in component.logicConnectors if logicConnector is not None)
+    for logicConnector, value in zip(logicConnectors, state["logic"]):
+        logicConnector.value = value
+    for component, temp in zip((component for component in components if hasattr(component, "temp")), state["temps"]):
+        component.temp = temp
+    for component in components:
+        if hasattr(component, "reloadInner"):
+            component.reloadInner()
+
+def stateVector(state: dict) -> np.ndarray:
+    """
+    The state as one array, for comparing two states
+    """
+    return np.concatenate((
+        np.array(state["connectors"], dtype=float).reshape(-1),
+        np.array(state["logic"], dtype=float),
+        np.array(state["temps"], dtype=float)
+    ))
+
+def maxDifference(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Largest absolute difference, where two NaNs (a Merge without flow) count as equal
+    """
+    with np.errstate(invalid="ignore"):
+        differences = np.abs(a - b)
+    differences[np.isnan(a) & np.isnan(b)] = 0
+    return float(differences.max(initial=0))
@@ -0,0 +1,596 @@
+import argparse
+import copy
+import time
+
+import numpy as np
+
+import flowModel
+from flowModel import (
+    Component, RealisticSun, SinusSignal, ProfileSignal, LogicClamp, LogicInverter, Sensor,
+    Source, Printer, Plotter, Process, Buffer, Splitter, ProsessKiezer, Merge, Collector,
+    calculateDeltaT, calculateWarmteVerlies, clamp
+)
+from flowSchedule import FlowSchedule
+
+# Steady-state solver: the equilibrium of the flow network is solved directly from the
+# component graph instead of running ticks until nothing changes any more
+
+def lossCoefficients() -> tuple[float, float]:
+    """
+    calculateWarmteVerlies is linear, so T - calculateWarmteVerlies(T) is keep * T + offset
+    """
+    offset = -calculateWarmteVerlies(0)
+    keep = 1 - (calculateWarmteVerlies(1) + offset)
+    return keep, offset
+
+class LinearSystem:
+    """
+    One row per connector: x[row] = constant + sum(coefficient * x[column]).
+    Solved as (I - A) x = b: dense with NumPy for small models, sparse with SciPy for large ones.
+    """
+    def __init__(self, size: int):
+        self.size = size
+        self.rows = []
+        self.columns = []
+        self.values = []
+        self.constant = np.zeros(size)
+
+    def set(self, row: int, constant: float = 0.0, terms=()):
+        self.constant[row] = constant
+        for column, coefficient in terms:
+            if coefficient != 0:
+                self.rows.append(row)
+                self.columns.append(column)
+                self.values.append(coefficient)
+
+    def copy(self):
+        system = LinearSystem(self.size)
+        system.rows = self.rows.copy()
+        system.columns = self.columns.copy()
+        system.values = self.values.copy()
+        system.constant = self.constant.copy()
+        return system
+
+    def solve(self, denseLimit: int = 2000) -> np.ndarray:
+        if self.size <= denseLimit:
+            matrix = np.eye(self.size)
+            np.add.at(matrix, (np.array(self.rows, dtype=np.intp), np.array(self.columns, dtype=np.intp)), -np.array(self.values))
+            return np.linalg.solve(matrix, self.constant)
+        try:
+            from scipy.sparse import coo_matrix, identity
+            from scipy.sparse.linalg import MatrixRankWarning, spsolve
+        except ImportError:
+            # Too large for a dense matrix, the caller falls back to sweeps
+            raise np.linalg.LinAlgError("SciPy is needed for a direct sparse solve") from None
+
+        import warnings
+        matrix = identity(self.size, format="csc") - coo_matrix((self.values, (self.rows, self.columns)), shape=(self.size, self.size)).tocsc()
+        with warnings.catch_warnings():
+            warnings.simplefilter("error", MatrixRankWarning)
+            try:
+                result = spsolve(matrix, self.constant)
+            except MatrixRankWarning:
+                raise np.linalg.LinAlgError("singular matrix") from None
+        return np.atleast_1d(result)
+
+    def sweeper(self, order: list[int]):
+        """
+        A function doing one Gauss-Seidel sweep over the rows in order, in place on a list,
+        that returns the largest change
+        """
+        terms = [[] for _ in range(self.size)]
+        for row, column, value in zip(self.rows, self.columns, self.values):
+            terms[row].append((column, value))
+        rows = [(row, self.constant[row], terms[row]) for row in order]
+
+        def sweepOnce(x: list) -> float:
+            change = 0.0
+            for row, constant, rowTerms in rows:
+                value = constant
+                for column, coefficient in rowTerms:
+                    value += coefficient * x[column]
+                change = max(change, abs(value - x[row]))
+                x[row] = value
+            return change
+        return sweepOnce
+
+    def sweep(self, start: np.ndarray, order: list[int], tolerance: float, maxSweeps: int) -> np.ndarray:
+        """
+        Gauss-Seidel sweeps from start. For systems without a unique solution, such as a
+        closed loop, this keeps what the start conserves, like ticks do.
+        Returns None if it did not settle in maxSweeps sweeps.
+        """
+        sweepOnce = self.sweeper(order)
+        x = start.tolist()
+        for _ in range(maxSweeps):
+            if sweepOnce(x) <= tolerance:
+                return np.array(x)
+        return None
+
+class AndersonMixing:
+    """
+    Anderson acceleration of a fixed point x = G(x): the next x combines the outputs of the
+    last memory iterations so that their residuals G(x) - x cancel as far as possible.
+    """
+    def __init__(self, memory: int = 5):
+        self.memory = memory
+        self.outputs = []
+        self.residuals = []
+
+    def reset(self):
+        self.outputs.clear()
+        self.residuals.clear()
+
+    def step(self, x: np.ndarray, output: np.ndarray) -> np.ndarray:
+        residual = output - x
+        self.outputs.append(output)
+        self.residuals.append(residual)
+        if len(self.residuals) > self.memory + 1:
+            del self.outputs[0], self.residuals[0]
+        if len(self.residuals) == 1:
+            return output
+        residualSteps = np.diff(self.residuals, axis=0).T
+        outputSteps = np.diff(self.outputs, axis=0).T
+        weights = np.linalg.lstsq(residualSteps, residual, rcond=None)[0]
+        return output - outputSteps @ weights
+
+# Row builders, one per component type, mirroring the update() methods in flowModel.
+# Flow rows only depend on the logic values; temp rows also on the solved flows and
+# on the active branch of Process and Buffer.
+
+def passThrough(solver, system, component):
+    for input, output in zip(component.inputs, component.outputs):
+        system.set(solver.slot[output], terms=[(solver.slot[input], 1)])
+
+def keepOutputs(solver, system, component):
+    """
+    A plain Component only copies its inputs, its outputs keep their value
+    """
+    for output in component.outputs:
+        system.set(solver.slot[output], getattr(output, solver.attribute))
+
+def sourceFlow(solver, system, component):
+    system.set(solver.slot[component.outputs[0]], component.speed)
+
+def sourceTemp(solver, system, component):
+    system.set(solver.slot[component.outputs[0]], component.maxTemp * solver.logicScalar(component))
+
+def splitterFlow(solver, system, component):
+    scalar = solver.logicValue(component) if solver.logicConnected(component) else component.splitScalar
+    input = solver.slot[component.inputs[0]]
+    system.set(solver.slot[component.outputs[0]], terms=[(input, scalar)])
+    system.set(solver.slot[component.outputs[1]], terms=[(input, 1 - scalar)])
+
+def prosessKiezerFlow(solver, system, component):
+    if solver.logicConnected(component):
+        value = solver.logicValue(component)
+        # max(0, flow * c) is flow * max(0, c) for the non-negative flows of a model
+        shares = [max(0, -2 * value + 1), max(0, 1 - (2 * abs(value - 0.5))), max(0, 2 * value - 1)]
+    else:
+        shares = [1 / 3] * 3
+    input = solver.slot[component.inputs[0]]
+    for output, share in zip(component.outputs, shares):
+        system.set(solver.slot[output], terms=[(input, share)])
+
+def lossTemp(solver, system, component):
+    """
+    Splitter and ProsessKiezer: every output is the input minus the loss
+    """
+    for output in component.outputs:
+        system.set(solver.slot[output], solver.offset, [(solver.slot[component.inputs[0]], solver.keep)])
+
+def mixFlow(solver, system, component):
+    system.set(solver.slot[component.outputs[0]], terms=[(solver.slot[input], 1) for input in component.inputs])
+
+def mixTemp(solver, system, component):
+    flows = [solver.flow[solver.slot[input]] for input in component.inputs]
+    totalFlow = sum(flows)
+    if totalFlow == 0:
+        system.set(solver.slot[component.outputs[0]], 10)
+        return
+    terms = [(solver.slot[input], solver.keep * flow / totalFlow) for input, flow in zip(component.inputs, flows)]
+    system.set(solver.slot[component.outputs[0]], solver.offset, terms)
+
+def processTemp(solver, system, component):
+    input = solver.slot[component.inputs[0]]
+    heat = calculateDeltaT(component.power * solver.logicScalar(component), 1)
+    branch = solver.branch[component]
+    if branch == "below":
+        system.set(solver.slot[component.outputs[0]], solver.offset, [(input, solver.keep)])
+    elif branch == "above":
+        system.set(solver.slot[component.outputs[0]], solver.offset + heat + component.maxTemp, [(input, solver.keep - 1)])
+    else:
+        system.set(solver.slot[component.outputs[0]], solver.offset + heat, [(input, solver.keep)])
+
+def bufferTemp(solver, system, component):
+    output = solver.slot[component.outputs[0]]
+    if not solver.bufferFilled(component):
+        # Without inflow the Buffer keeps its temperature
+        system.set(output, min(solver.keep * component.temp + solver.offset, component.maxTemp))
+    elif solver.branch[component] == "full":
+        system.set(output, component.maxTemp)
+    else:
+        system.set(output, solver.offset, [(solver.slot[component.inputs[0]], solver.keep)])
+
+flowRows = {
+    Component: keepOutputs,
+    Source: sourceFlow,
+    Printer: passThrough,
+    Plotter: passThrough,
+    Sensor: passThrough,
+    Process: passThrough,
+    Buffer: passThrough,
+    Splitter: splitterFlow,
+    ProsessKiezer: prosessKiezerFlow,
+    Merge: mixFlow,
+    Collector: mixFlow,
+}
+
+tempRows = {
+    Component: keepOutputs,
+    Source: sourceTemp,
+    Printer: passThrough,
+    Plotter: passThrough,
+    Sensor: passThrough,
+    Process: processTemp,
+    Buffer: bufferTemp,
+    Splitter: lossTemp,
+    ProsessKiezer: lossTemp,
+    Merge: mixTemp,
+    Collector: mixTemp,
+}
+
+# Rows that only depend on parameters, built once per solver
+fixedRows = {keepOutputs, passThrough, sourceFlow, lossTemp, mixFlow}
+
+# Logic outputs, as a function of the solver, the component and its logic input value
+
+logicOutputs = {
+    SinusSignal: lambda solver, component, value: component.valueAt(solver.dt, solver.tick),
+    ProfileSignal: lambda solver, component, value: component.signalAt(solver.dt, solver.tick),
+    RealisticSun: lambda solver, component, value: component.valueAt(solver.dt, solver.tick, value),
+    LogicClamp: lambda solver, component, value: clamp(value, component.min, component.max),
+    LogicInverter: lambda solver, component, value: 1 - value,
+    Sensor: lambda solver, component, value: component.compare(
+        solver.temp[solver.slot[component.inputs[0]]], solver.flow[solver.slot[component.inputs[0]]], value
+    ),
+}
+
+class SteadyStateSolver:
+    """
+    Equilibrium of a model with the time frozen at tick: the signals keep the value they
+    have at that tick and the connector temps and flows are those a tick loop settles to.
+
+    Flows and temperatures are linear once the logic values and the branch of every Process
+    (below minTemp, between, above maxTemp) and Buffer (below maxTemp or full) are fixed.
+    solve() solves the flows, then the temps, moves every Process and Buffer to the branch
+    its solved input temp falls in and solves again until the branches agree. Sensor
+    outputs are then evaluated on the result, and the whole is repeated until the logic
+    values settle, with Anderson acceleration on the Sensor outputs. A Buffer with inflow
+    settles at its input temp. Parts of the model without any flow have no unique
+    equilibrium; they get what update() gives without flow (10 after a Merge, a Buffer keeps
+    its temp), where a run keeps whatever reached them last.
+
+    Raises ValueError for component types it can not solve (SubFlow) and when there is no
+    equilibrium: a flow loop that does not drain, or branches or Sensors that keep switching.
+    An equilibrium that the tick loop itself does not reach (an unstable loop) is still returned.
+    writeBack() puts the result in the component objects, as a starting state for a run.
+    """
+    def __init__(self, components, schedule: FlowSchedule = None, tick: int = None, dt: float = None, tolerance: float = 1e-9, maxIterations: int = 100, maxSweeps: int = 10000):
+        self.components = components
+        self.schedule = schedule if schedule is not None else FlowSchedule(components)
+        self.tick = flowModel.iteratie if tick is None else tick
+        self.dt = flowModel.dt if dt is None else dt
+        self.tolerance = tolerance
+        self.maxIterations = maxIterations
+        self.maxSweeps = maxSweeps
+        self.keep, self.offset = lossCoefficients()
+
+        for component in components:
+            if type(component) not in tempRows and type(component) not in logicOutputs:
+                raise ValueError(f"{type(component).__name__} {component.name} is not supported by the steady-state solver")
+
+        self.slot = {}
+        for component in components:
+            for connector in component.connectors:
+                self.addSlot(connector)
+                if connector.connectedTo is not None:
+                    self.addSlot(connector.connectedTo)
+        # Logic components in update order, so a chain of them is evaluated in one pass
+        self.logicComponents = [component for component in self.schedule.order if type(component) in logicOutputs and component.logicOutput is not None]
+        self.sensors = [component for component in self.logicComponents if isinstance(component, Sensor)]
+        self.logic = {}
+        for component in components:
+            for logicConnector in component.logicConnectors:
+                if logicConnector is not None:
+                    self.logic[logicConnector] = logicConnector.value
+
+        self.temp = np.array([connector.temp for connector in self.slot], dtype=float)
+        self.flow = np.array([connector.flowSpeed for connector in self.slot], dtype=float)
+        self.branch = {}
+        # Per connector attribute the rows that do not change and the components whose rows do
+        self.fixedSystems = {}
+        self.changingComponents = {}
+        self.branchOrder = [component for component in self.schedule.order if isinstance(component, (Process, Buffer))]
+        self.logicIterations = 0
+        self.branchIterations = 0
+        # Flow rows in update order, for closed loops whose flows have no unique solution
+        self.sweepOrder = [self.slot[connector] for component in self.schedule.order for connector in component.inputs + component.outputs]
+        # Gauss-Seidel sweeps of the relaxTemps fallback
+        self.sweeps = 0
+
+    def addSlot(self, connector):
+        if connector not in self.slot:
+            self.slot[connector] = len(self.slot)
+
+    def logicConnected(self, component) -> bool:
+        return component.logicInput is not None and len(component.logicInput.connectedTo) > 0
+
+    def logicValue(self, component) -> float:
+        """
+        The logic input as Component.update sets it: the connected output, or 0
+        """
+        if not self.logicConnected(component):
+            return 0
+        return self.logic[component.logicInput.connectedTo[0]]
+
+    def logicScalar(self, component) -> float:
+        return self.logicValue(component) if self.logicConnected(component) else 1
+
+    def bufferFilled(self, component) -> bool:
+        volumeIn = self.flow[self.slot[component.inputs[0]]] * self.dt * 3600
+        return volumeIn != 0 and volumeIn + component.capacity != 0
+
+    def buildSystem(self, rows: dict, attribute: str) -> LinearSystem:
+        # The connector attribute the rows are for, read by rows that keep a value
+        self.attribute = attribute
+        if attribute not in self.fixedSystems:
+            fixed = LinearSystem(len(self.slot))
+            # Connectors of components outside the list keep their value
+            for connector, slot in self.slot.items():
+                fixed.set(slot, getattr(connector, attribute))
+            for component in self.components:
+                for input in component.inputs:
+                    # Unconnected inputs keep their value too
+                    if input.connectedTo is not None:
+                        fixed.set(self.slot[input], terms=[(self.slot[input.connectedTo], 1)])
+                if rows.get(type(component)) in fixedRows:
+                    rows[type(component)](self, fixed, component)
+            self.fixedSystems[attribute] = fixed
+            self.changingComponents[attribute] = [component for component in self.components if type(component) in rows and rows[type(component)] not in fixedRows]
+
+        system = self.fixedSystems[attribute].copy()
+        for component in self.changingComponents[attribute]:
+            rows[type(component)](self, system, component)
+        return system
+
+    def chooseBranches(self, temp=None) -> dict:
+        temp = self.temp.tolist() if temp is None else temp
+        branch = {}
+        for component in self.branchOrder:
+            inputTemp = temp[self.slot[component.inputs[0]]]
+            if isinstance(component, Process):
+                branch[component] = "below" if inputTemp < component.minTemp else "above" if inputTemp > component.maxTemp else "between"
+            else:
+                branch[component] = "full" if self.keep * inputTemp + self.offset > component.maxTemp else "filling"
+        return branch
+
+    def solveTemps(self):
+        """
+        Active-set iteration over the Process and Buffer branches, with the flows fixed
+        """
+        self.branch = self.chooseBranches()
+        seen = set()
+        for _ in range(self.maxIterations):
+            self.branchIterations += 1
+            seen.add(tuple(self.branch.values()))
+            self.temp = self.solveSystem(tempRows, "temp", "temperatures")
+            branch = self.chooseBranches()
+            if branch == self.branch:
+                return
+            if tuple(branch.values()) in seen:
+                self.relaxTemps()
+                return
+            self.branch = branch
+        raise ValueError(f"no steady state: the Process and Buffer branches did not settle in {self.maxIterations} iterations")
+
+    def relaxTemps(self, closeEnough: float = 1e-3):
+        """
+        Fallback when switching the branches goes round in circles: Gauss-Seidel sweeps in update
+        order with the branches chosen again after every sweep, as the tick loop does with settled
+        Buffers. Once the branches stay put and the sweeps are closeEnough, they are solved directly.
+        """
+        temp = self.temp.tolist()
+        sweepOnce = None
+        for _ in range(self.maxSweeps):
+            branch = self.chooseBranches(temp)
+            if branch != self.branch or sweepOnce is None:
+                self.branch = branch
+                sweepOnce = self.buildSystem(tempRows, "temp").sweeper(self.sweepOrder)
+                solvable = True
+            self.sweeps += 1
+            if sweepOnce(temp) > closeEnough or not solvable:
+                continue
+            self.temp = self.solveSystem(tempRows, "temp", "temperatures")
+            if self.chooseBranches() == self.branch:
+                return
+            # Not consistent yet, sweep on until the branches change
+            solvable = False
+        raise ValueError(f"no steady state: the Process and Buffer branches did not settle in {self.maxSweeps} sweeps")
+
+    def solveSystem(self, rows: dict, attribute: str, what: str) -> np.ndarray:
+        system = self.buildSystem(rows, attribute)
+        try:
+            result = system.solve()
+        except np.linalg.LinAlgError:
+            result = None
+        if result is None or not np.all(np.isfinite(result)):
+            # A closed loop keeps the flow it started with, as in the tick loop
+            result = system.sweep(getattr(self, "flow" if attribute == "flowSpeed" else "temp"), self.sweepOrder, self.tolerance, self.maxSweeps)
+        if result is None or not np.all(np.isfinite(result)):
+            raise ValueError(f"no steady state: the {what} do not settle, such as a flow loop that keeps growing")
+        return result
+
+    def setSensorOutputs(self, outputs: np.ndarray):
+        """
+        Sets the Sensor outputs and evaluates the other logic components, which only
+        depend on the signals and on those outputs
+        """
+        outputs = iter(outputs.tolist())
+        for component in self.logicComponents:
+            if isinstance(component, Sensor):
+                value = next(outputs)
+            else:
+                value = logicOutputs[type(component)](self, component, self.logicValue(component))
+            self.logic[component.logicOutput] = value
+
+    def evaluateLogic(self) -> np.ndarray:
+        """
+        Evaluates the logic components on the current solution and returns the Sensor outputs.
+        A chain of them is evaluated in one pass, like the update order does.
+        """
+        for component in self.logicComponents:
+            self.logic[component.logicOutput] = logicOutputs[type(component)](self, component, self.logicValue(component))
+        return np.array([self.logic[component.logicOutput] for component in self.sensors], dtype=float)
+
+    def solve(self):
+        """
+        Iterates the Sensor outputs to a fixed point. Where plain steps converge slowly or
+        oscillate they are Anderson-accelerated; an accelerated step that makes the change
+        grow restarts the acceleration. Plain steps are damped while the change grows and
+        the damping is relaxed again while it shrinks.
+        """
+        outputs = self.evaluateLogic()
+        mixing = AndersonMixing()
+        relaxation = 1.0
+        previousChange = previousRatio = np.inf
+        wasAccelerated = False
+        for _ in range(self.maxIterations):
+            self.logicIterations += 1
+            self.flow = self.solveSystem(flowRows, "flowSpeed", "flows")
+            self.solveTemps()
+            computed = self.evaluateLogic()
+            change = float(np.max(np.abs(computed - outputs), initial=0.0))
+            if change <= self.tolerance:
+                return self
+            accelerated = mixing.step(outputs, computed)
+            if change >= previousChange:
+                if wasAccelerated:
+                    mixing.reset()
+                relaxation = max(relaxation / 2, 1 / 64)
+            else:
+                relaxation = min(relaxation * 2, 1.0)
+            # Accelerate only while plain steps converge slowly or at a steady rate; a Sensor
+            # that switches between two outputs settles faster with plain steps
+            ratio = change / previousChange
+            slow = ratio > 1 / 2 or previousRatio / 2 < ratio < previousRatio * 2
+            wasAccelerated = slow and len(mixing.residuals) > 1 and np.all(np.isfinite(accelerated))
+            if wasAccelerated:
+                outputs = accelerated
+            else:
+                outputs = outputs + relaxation * (computed - outputs)
+            # Sensor.compare clamps its output to 0..1
+            outputs = np.clip(outputs, 0, 1)
+            self.setSensorOutputs(outputs)
+            previousChange, previousRatio = change, ratio
+        raise ValueError(f"no steady state: the Sensor outputs did not settle in {self.maxIterations} iterations")
+
+    def bufferTemps(self) -> dict:
+        return {
+            component: float(self.temp[self.slot[component.inputs[0]]]) if self.bufferFilled(component) else component.temp
+            for component in self.components if isinstance(component, Buffer)
+        }
+
+    def writeBack(self):
+        temps = self.temp.tolist()
+        flows = self.flow.tolist()
+        for connector, slot in self.slot.items():
+            connector.temp = temps[slot]
+            connector.flowSpeed = flows[slot]
+        for logicConnector, value in self.logic.items():
+            logicConnector.value = value
+        for buffer, temp in self.bufferTemps().items():
+            buffer.temp = temp
+
+def solveSteadyState(components, tick: int = None, dt: float = None, maxIterations: int = 100) -> SteadyStateSolver:
+    """
+    Puts components in their equilibrium at tick and returns the solver
+    """
+    solver = SteadyStateSolver(components, tick=tick, dt=dt, maxIterations=maxIterations).solve()
+    solver.writeBack()
+    return solver
+
+def compareWithTicks(components, ticks: int, tick: int = 0, dt: float = flowModel.dt, tolerance: float = 1e-9, window: int = 100, maxIterations: int = 100) -> tuple[float, int, float]:
+    """
+    Runs a copy of components with the signals frozen at tick until it is steady, and returns
+    the largest connector difference with the solver, the ticks that took and their duration
+    """
+    import contextlib
+    import os
+    from flowConvergence import ConvergenceMonitor
+
+    solved = copy.deepcopy(components)
+    SteadyStateSolver(solved, tick=tick, dt=dt, maxIterations=maxIterations).solve().writeBack()
+
+    reference = copy.deepcopy(components)
+    schedule = FlowSchedule(reference)
+    monitor = ConvergenceMonitor.forComponents(reference, tolerance, window)
+    flowModel.dt = dt
+    # The tick counter stays put, so the signals keep the value the solver used
+    flowModel.iteratie = tick
+    start = time.perf_counter()
+    count = 0
+    # Printers print every tick
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for count in range(1, ticks + 1):
+            schedule.step()
+            if monitor.observe(count):
+                break
+    duration = time.perf_counter() - start
+
+    difference = 0.0
+    for a, b in zip(reference, solved):
+        for connectorA, connectorB in zip(a.connectors, b.connectors):
+            difference = max(difference, abs(connectorA.temp - connectorB.temp), abs(connectorA.flowSpeed - connectorB.flowSpeed))
+    return difference, count, duration
+
+def main(argv=None):
+    from flowFormat import saveFlowFile
+    from flowRunner import loadFlowFile, uniqueNames
+
+    parser = argparse.ArgumentParser(description="Solve the steady state of .flow models directly")
+    parser.add_argument("models", nargs="+")
+    parser.add_argument("--tick", type=int, default=0, help="tick whose signal values are kept")
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    parser.add_argument("--max-iterations", type=int, default=100, help="most Sensor and branch iterations before giving up")
+    parser.add_argument("--check", type=int, metavar="TICKS", help="also run up to TICKS ticks until steady and compare")
+    parser.add_argument("--output", "-o", help="save the model with the equilibrium as its initial state, only for a single model")
+    args = parser.parse_args(argv)
+
+    if args.output is not None and len(args.models) > 1:
+        parser.error("--output can only be used with a single model")
+
+    for model in args.models:
+        components = loadFlowFile(model)
+        original = copy.deepcopy(components) if args.check is not None else None
+        start = time.perf_counter()
+        try:
+            solver = solveSteadyState(components, args.tick, args.dt, args.max_iterations)
+        except ValueError as error:
+            print(f"{model}: {error}")
+            continue
+        duration = time.perf_counter() - start
+        print(f"{model}: solved in {duration * 1e3:.1f}ms ({solver.logicIterations} logic, {solver.branchIterations} branch iterations, {solver.sweeps} sweeps)")
+        for name, component in zip(uniqueNames(components), components):
+            if isinstance(component, Plotter):
+                print(f"  {name}: {component.inputs[0].temp:.4f}")
+
+        if args.check is not None:
+            difference, ticks, tickDuration = compareWithTicks(original, args.check, args.tick, args.dt, maxIterations=args.max_iterations)
+            print(f"{model}: ticks reached it in {ticks} ticks ({tickDuration:.3f}s), max difference {difference:.3g}")
+
+        if args.output is not None:
+            saveFlowFile(components, args.output)
+
+if __name__ == "__main__":
+    main()
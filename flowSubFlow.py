@@ -0,0 +1,453 @@
+import argparse
+import copy
+import os
+
+import numpy as np
+
+import flowFormat
+import flowModel
+from flowCompile import CompiledEngine
+from flowModel import Buffer, LogicConnector, SubFlow
+from flowRunner import HeadlessRunner, loadFlowFile, uniqueNames
+from flowSchedule import connectorOwners, dependencies
+
+# Sub-flows: a group of components stored once as a .flow file and placed many times as one SubFlow
+
+class SubFlowDefinition:
+    """
+    The components of a definition file, never run themselves; instantiate() gives every
+    SubFlow instance its own copy. Unconnected inputs and outputs are the ports, in
+    component order.
+    """
+    def __init__(self, path, components):
+        self.path = path
+        self.components = components
+        self.names = uniqueNames(components)
+        self.inputPorts = [
+            (i, k) for i, component in enumerate(components)
+            for k, connector in enumerate(component.inputs) if connector.connectedTo is None
+        ]
+        self.outputPorts = [
+            (i, k) for i, component in enumerate(components)
+            for k, connector in enumerate(component.outputs) if connector.connectedTo is None
+        ]
+        self.stateful = any(component.stateful for component in components)
+        self.timeDriven = any(component.timeDriven for component in components)
+
+    def find(self, name: str) -> int:
+        if name not in self.names:
+            raise ValueError(f"{self.path} has no component {name}")
+        return self.names.index(name)
+
+    def logicTargets(self, logicIn: str) -> list[int]:
+        """
+        Indices of the components the logic input port feeds, from a comma separated list of names
+        """
+        targets = []
+        for name in logicIn.split(","):
+            if name.strip() == "":
+                continue
+            i = self.find(name.strip())
+            logicInput = self.components[i].logicInput
+            if logicInput is None or len(logicInput.connectedTo) > 0:
+                raise ValueError(f"{name.strip()} in {self.path} has no free logic input")
+            targets.append(i)
+        return targets
+
+    def logicSource(self, logicOut: str):
+        """
+        Index of the component whose logic output is the logic output port, None for ""
+        """
+        if logicOut.strip() == "":
+            return None
+        i = self.find(logicOut.strip())
+        if self.components[i].logicOutput is None:
+            raise ValueError(f"{logicOut.strip()} in {self.path} has no logic output")
+        return i
+
+    def instantiate(self) -> list:
+        return copy.deepcopy(self.components)
+
+    def ports(self, inner) -> tuple[list, list]:
+        """
+        The input and output port connectors of an instance's copy
+        """
+        return [inner[i].inputs[k] for i, k in self.inputPorts], [inner[i].outputs[k] for i, k in self.outputPorts]
+
+# Definitions per (path, modification time), shared by all instances
+definitions = {}
+# Definitions being loaded, to refuse a definition that contains itself
+loading = set()
+
+def loadDefinition(path) -> SubFlowDefinition:
+    try:
+        key = (os.path.abspath(path), os.path.getmtime(path))
+    except OSError as error:
+        raise ValueError(f"Can not read {path}: {error.strerror}") from None
+    definition = definitions.get(key)
+    if definition is None:
+        if key[0] in loading:
+            raise ValueError(f"{path} contains a SubFlow of itself")
+        loading.add(key[0])
+        try:
+            definition = SubFlowDefinition(path, loadFlowFile(path))
+        finally:
+            loading.discard(key[0])
+        definitions[key] = definition
+    return definition
+
+def connectPort(inner, definition: SubFlowDefinition, logicIn: str, connected: bool):
+    """
+    Connects the logic input targets in an instance's copy to a new port connector, which the
+    instance writes its logic input into. Without an outer connection the targets stay free,
+    as they would be in the definition. Returns the port, or None.
+    """
+    targets = definition.logicTargets(logicIn)
+    if not connected or len(targets) == 0:
+        for i in targets:
+            inner[i].logicInput.connectedTo = []
+        return None
+    port = LogicConnector()
+    for i in targets:
+        inner[i].logicInput.connectedTo = [port]
+    port.connectedTo = [inner[i].logicInput for i in targets]
+    return port
+
+class InstanceRunner:
+    """
+    Runs one SubFlow instance with the objects engine: its copy of the definition in a
+    CompiledEngine. The generated code depends only on the definition's structure, so all
+    instances share it through the compile cache.
+    """
+    def __init__(self, subFlow: SubFlow):
+        self.subFlow = subFlow
+        self.connected = len(subFlow.logicInput.connectedTo) > 0
+        definition = loadDefinition(subFlow.path)
+        inner = subFlow.innerComponents()
+        port = connectPort(inner, definition, subFlow.logicIn, self.connected)
+        self.engine = engine = CompiledEngine(inner)
+
+        inputs, outputs = definition.ports(inner)
+        self.inputs = [(engine.slot[c], engine.flowOffset + engine.slot[c]) for c in inputs]
+        self.outputs = [(engine.slot[c], engine.flowOffset + engine.slot[c]) for c in outputs]
+        self.logicIn = None if port is None else engine.logicOffset + engine.logicSlot[port]
+        source = definition.logicSource(subFlow.logicOut)
+        self.logicOut = None if source is None else engine.logicOffset + engine.logicSlot[inner[source].logicOutput]
+
+    def step(self):
+        subFlow = self.subFlow
+        state = self.engine.state
+        for connector, (temp, flow) in zip(subFlow.inputs, self.inputs):
+            state[temp] = connector.temp
+            state[flow] = connector.flowSpeed
+        if self.logicIn is not None:
+            state[self.logicIn] = subFlow.logicInput.value
+        self.engine.step()
+        for connector, (temp, flow) in zip(subFlow.outputs, self.outputs):
+            connector.temp = state[temp]
+            connector.flowSpeed = state[flow]
+        if self.logicOut is not None:
+            subFlow.logicOutput.value = state[self.logicOut]
+
+    def sync(self):
+        self.engine.writeBack()
+
+    def reload(self):
+        self.engine.readState()
+
+def stateObjects(inner, port) -> tuple[list, list, list]:
+    """
+    Connectors, logic connectors and Buffers of an instance's copy, in a fixed order
+    """
+    connectors = [connector for component in inner for connector in component.connectors]
+    logic = [c for component in inner for c in component.logicConnectors if c is not None]
+    if port is not None:
+        logic.append(port)
+    return connectors, logic, [component for component in inner if isinstance(component, Buffer)]
+
+class InstanceGroup:
+    """
+    SubFlow instances of one definition in an ArrayEngine, run as one EnsembleEngine with a
+    column per instance (times the variants of an outer ensemble)
+    """
+    def __init__(self, engine, instances: list, definition: SubFlowDefinition, connected: bool):
+        # Imported here, flowEnsemble builds on flowArrays which uses this module
+        from flowEnsemble import EnsembleEngine
+
+        self.outer = engine
+        self.instances = instances
+        self.columns = 1 if engine.temp.ndim == 1 else engine.temp.shape[1]
+        inners = [subFlow.innerComponents() for subFlow in instances]
+        ports = [connectPort(inner, definition, instances[0].logicIn, connected) for inner in inners]
+        self.objects = [stateObjects(inner, port) for inner, port in zip(inners, ports)]
+        self.inner = inner = EnsembleEngine(inners[0], [{}] * (len(instances) * self.columns))
+
+        inputs, outputs = definition.ports(inners[0])
+        count = len(instances)
+        self.innerIn = np.array([inner.slot[c] for c in inputs], dtype=np.intp)
+        self.innerOut = np.array([inner.slot[c] for c in outputs], dtype=np.intp)
+        self.outerIn = np.array([[engine.slot[s.inputs[p]] for s in instances] for p in range(len(inputs))], dtype=np.intp).reshape(len(inputs), count)
+        self.outerOut = np.array([[engine.slot[s.outputs[p]] for s in instances] for p in range(len(outputs))], dtype=np.intp).reshape(len(outputs), count)
+
+        self.innerLogicIn = None
+        if ports[0] is not None:
+            self.innerLogicIn = inner.logicSlot[ports[0]]
+            self.outerLogicIn = np.array([engine.logicSlot[s.logicInput] for s in instances], dtype=np.intp)
+        self.innerLogicOut = None
+        source = definition.logicSource(instances[0].logicOut)
+        if source is not None:
+            self.innerLogicOut = inner.logicSlot[inners[0][source].logicOutput]
+            self.outerLogicOut = np.array([engine.logicSlot[s.logicOutput] for s in instances], dtype=np.intp)
+        self.readState()
+
+    def readState(self):
+        inner = self.inner
+        reference = self.objects[0]
+        for k, (connectors, logic, buffers) in enumerate(self.objects):
+            columns = slice(k * self.columns, (k + 1) * self.columns)
+            for key, connector in zip(reference[0], connectors):
+                inner.temp[inner.slot[key], columns] = connector.temp
+                inner.flow[inner.slot[key], columns] = connector.flowSpeed
+            for key, logicConnector in zip(reference[1], logic):
+                if key in inner.logicSlot:
+                    inner.logic[inner.logicSlot[key], columns] = logicConnector.value
+            for key, buffer in zip(reference[2], buffers):
+                inner.bufferTemp[inner.bufferSlot[key], columns] = buffer.temp
+
+    def writeBack(self):
+        """
+        Copies the state into every instance's objects, the first variant of an outer ensemble
+        """
+        inner = self.inner
+        reference = self.objects[0]
+        for k, (subFlow, (connectors, logic, buffers)) in enumerate(zip(self.instances, self.objects)):
+            column = k * self.columns
+            for key, connector in zip(reference[0], connectors):
+                connector.temp = float(inner.temp[inner.slot[key], column])
+                connector.flowSpeed = float(inner.flow[inner.slot[key], column])
+            for key, logicConnector in zip(reference[1], logic):
+                if key in inner.logicSlot:
+                    logicConnector.value = float(inner.logic[inner.logicSlot[key], column])
+            for key, buffer in zip(reference[2], buffers):
+                buffer.temp = float(inner.bufferTemp[inner.bufferSlot[key], column])
+            subFlow.reloadInner()
+
+    def step(self):
+        outer, inner = self.outer, self.inner
+        inner.temp[self.innerIn] = outer.temp[self.outerIn].reshape(len(self.innerIn), inner.size)
+        inner.flow[self.innerIn] = outer.flow[self.outerIn].reshape(len(self.innerIn), inner.size)
+        if self.innerLogicIn is not None:
+            inner.logic[self.innerLogicIn] = outer.logic[self.outerLogicIn].reshape(inner.size)
+        inner.step()
+        shape = outer.temp[self.outerOut].shape
+        outer.temp[self.outerOut] = inner.temp[self.innerOut].reshape(shape)
+        outer.flow[self.outerOut] = inner.flow[self.innerOut].reshape(shape)
+        if self.innerLogicOut is not None:
+            outer.logic[self.outerLogicOut] = inner.logic[self.innerLogicOut].reshape(outer.logic[self.outerLogicOut].shape)
+
+class InstanceBatch:
+    """
+    The SubFlows of one ArrayEngine batch, grouped per definition, see subFlowKernel in flowArrays
+    """
+    def __init__(self, engine, batch):
+        groups = {}
+        for subFlow in batch.components:
+            if subFlow.path == "":
+                continue
+            key = (loadDefinition(subFlow.path), subFlow.logicIn, subFlow.logicOut, len(subFlow.logicInput.connectedTo) > 0)
+            groups.setdefault(key, []).append(subFlow)
+        self.groups = [InstanceGroup(engine, instances, definition, connected) for (definition, _, _, connected), instances in groups.items()]
+        engine.nested.append(self)
+
+    def step(self):
+        for group in self.groups:
+            group.step()
+
+    def readState(self):
+        for group in self.groups:
+            group.readState()
+
+    def writeBack(self):
+        for group in self.groups:
+            group.writeBack()
+
+def signature(group) -> dict:
+    """
+    The structure of a group of components: types, parameters and connections, without
+    names, positions, colors and initial values
+    """
+    document = flowFormat.toDocument(group)
+    for record in document["components"]:
+        record.pop("x")
+        record.pop("y")
+        record.pop("state")
+        record["params"] = {key: value for key, value in record["params"].items() if key not in ("name", "colorR", "colorG", "colorB")}
+    return document
+
+def logicPorts(group, owners: dict) -> tuple[str, str, object, list]:
+    """
+    The logicIn and logicOut names of a group, the outside logic output feeding it and the
+    outside logic inputs it feeds
+    """
+    members = set(group)
+    names = uniqueNames(group)
+    targets, sources = [], []
+    producers, consumers = [], []
+    for component, name in zip(group, names):
+        if component.logicInput is not None:
+            outside = [c for c in component.logicInput.connectedTo if owners.get(c) not in members]
+            if len(outside) > 0:
+                if len(component.logicInput.connectedTo) > 1:
+                    raise ValueError(f"{name} reads logic from inside and outside the group")
+                targets.append(name)
+                if outside[0] not in sources:
+                    sources.append(outside[0])
+        if component.logicOutput is not None:
+            outside = [c for c in component.logicOutput.connectedTo if owners.get(c) not in members]
+            if len(outside) > 0:
+                producers.append(name)
+                consumers += outside
+    if len(sources) > 1:
+        raise ValueError("a SubFlow has one logic input, but the group reads logic from several components outside it")
+    if len(producers) > 1:
+        raise ValueError(f"a SubFlow has one logic output, but {' and '.join(producers)} both feed components outside the group")
+    return ",".join(targets), producers[0] if producers else "", sources[0] if sources else None, consumers
+
+def reentries(components, group) -> list[tuple]:
+    """
+    (outside, member) pairs where a path leaving the group comes back into it. An instance
+    updates all its components at once, so the order within a tick can change there.
+    """
+    members = set(group)
+    successors = {component: [] for component in components}
+    for component, predecessors in dependencies(components).items():
+        for predecessor in predecessors:
+            successors[predecessor].append(component)
+    stack = [s for member in group for s in successors[member] if s not in members]
+    seen = set(stack)
+    found = []
+    while stack:
+        component = stack.pop()
+        for successor in successors[component]:
+            if successor in members:
+                found.append((component, successor))
+            elif successor not in seen:
+                seen.add(successor)
+                stack.append(successor)
+    return found
+
+def collapse(components, groups: list[list], path, name: str = None) -> list:
+    """
+    Replaces every group of components by an instance of one SubFlow, whose definition (the
+    first group) is written to path. All groups need the same structure, with their
+    components in the same order. Instances start from the first group's initial values.
+    Returns the new component list.
+    """
+    names = dict(zip(components, uniqueNames(components)))
+    owners = connectorOwners(components)
+    grouped = set()
+    for group in groups:
+        if len(group) == 0:
+            raise ValueError("empty group")
+        for component in group:
+            if component in grouped:
+                raise ValueError(f"{names[component]} is in more than one group")
+            grouped.add(component)
+        if signature(group) != signature(groups[0]):
+            raise ValueError(f"the group with {names[group[0]]} differs from the first group")
+    ports = [logicPorts(group, owners) for group in groups]
+    for group, (logicIn, logicOut, _, _) in zip(groups, ports):
+        if (logicIn, logicOut) != ports[0][:2]:
+            raise ValueError(f"the group with {names[group[0]]} has other logic connections than the first group")
+
+    flowFormat.saveFlowFile(groups[0], path)
+    definition = loadDefinition(path)
+    name = name or os.path.splitext(os.path.basename(path))[0]
+
+    replaced = {}
+    for group, (logicIn, logicOut, source, consumers) in zip(groups, ports):
+        x = sum(component.x for component in group) / len(group)
+        y = sum(component.y for component in group) / len(group)
+        instance = SubFlow(name, x, y, path, logicIn, logicOut)
+
+        inputs, outputs = definition.ports(group)
+        for own, connector in zip(instance.inputs + instance.outputs, inputs + outputs):
+            own.temp, own.flowSpeed = connector.temp, connector.flowSpeed
+            if connector.connectedTo is not None:
+                own.connectedTo = connector.connectedTo
+                connector.connectedTo.connectedTo = own
+
+        members = set(group)
+        if source is not None:
+            instance.logicInput.connectedTo = [source]
+            kept = [c for c in source.connectedTo if owners.get(c) not in members]
+            source.connectedTo = kept + [instance.logicInput]
+        for consumer in consumers:
+            consumer.connectedTo = [instance.logicOutput if owners.get(c) in members else c for c in consumer.connectedTo]
+        instance.logicOutput.connectedTo = list(consumers)
+
+        replaced[group[0]] = instance
+        for component in group[1:]:
+            replaced[component] = None
+
+    result = []
+    for component in components:
+        if component not in replaced:
+            result.append(component)
+        elif replaced[component] is not None:
+            result.append(replaced[component])
+    return result
+
+def plotterDifference(before, after, ticks: int, dt: float = flowModel.dt) -> float:
+    """
+    Largest difference between the Plotter series both models have in common
+    """
+    series = []
+    for components in (before, after):
+        runner = HeadlessRunner(copy.deepcopy(components), dt)
+        runner.run(ticks)
+        series.append(runner.series)
+    common = [name for name in series[0] if name in series[1]]
+    if len(common) == 0:
+        return 0.0
+    with np.errstate(invalid="ignore"):
+        differences = np.abs(np.array([series[0][name] for name in common]) - np.array([series[1][name] for name in common]))
+    return float(np.nanmax(differences, initial=0))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Collapse groups of components in a .flow model into instances of one SubFlow")
+    parser.add_argument("model")
+    parser.add_argument("--group", action="append", required=True, metavar="NAMES", help="comma separated component names, in the same order for every group")
+    parser.add_argument("--definition", required=True, metavar="PATH", help="where to write the SubFlow definition")
+    parser.add_argument("--name", help="name of the instances, default the definition's file name")
+    parser.add_argument("--output", "-o", required=True, help="the model with the instances")
+    parser.add_argument("--check", type=int, default=0, metavar="TICKS", help="run both models and report the largest Plotter difference")
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    args = parser.parse_args(argv)
+
+    components = loadFlowFile(args.model)
+    byName = dict(zip(uniqueNames(components), components))
+    groups = []
+    for text in args.group:
+        names = [name.strip() for name in text.split(",")]
+        missing = [name for name in names if name not in byName]
+        if missing:
+            parser.error(f"no component named {', '.join(missing)}")
+        groups.append([byName[name] for name in names])
+
+    names = dict(zip(components, uniqueNames(components)))
+    for group in groups:
+        for outside, member in reentries(components, group):
+            print(f"note: {names[outside]} feeds {names[member]} back into the group, the update order there can change; compare with --check")
+    original = copy.deepcopy(components) if args.check > 0 else None
+    try:
+        collapsed = collapse(components, groups, args.definition, args.name)
+    except ValueError as error:
+        parser.error(str(error))
+    flowFormat.saveFlowFile(collapsed, args.output)
+    print(f"{len(groups)} groups of {len(groups[0])} components replaced by {args.definition}, {len(components)} -> {len(collapsed)} components")
+    if original is not None:
+        print(f"largest Plotter difference over {args.check} ticks: {plotterDifference(original, collapsed, args.check, args.dt):.3g}")
+
+if __name__ == "__main__":
+    main()
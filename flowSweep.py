@@ -0,0 +1,175 @@
+import argparse
+import csv
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import flowModel
+from flowRunner import HeadlessRunner, loadFlowFile, uniqueNames
+
+# Parameter sweeps: run many variants of one .flow model on all cores
+
+def findComponents(components, name) -> list:
+    """
+    Components addressed by name, duplicates can be picked out with the #n suffix from uniqueNames.
+    If no component has that name, a type name such as Process selects all components of that type.
+    """
+    matches = [
+        component for component, unique in zip(components, uniqueNames(components))
+        if unique == name or component.name == name
+    ]
+    if len(matches) == 0:
+        matches = [component for component in components if type(component).__name__ == name]
+    return matches
+
+def applyParameters(components, parameters: dict):
+    """
+    Applies {"Component.key": value} through editVariable, key being one of the inspect() keys
+    """
+    for address, value in parameters.items():
+        name, key = address.rsplit(".", 1)
+        matches = findComponents(components, name)
+        if len(matches) == 0:
+            raise KeyError(f"No component named {name}")
+        for component in matches:
+            if key not in component.inspect():
+                raise KeyError(f"{type(component).__name__} {name} has no variable {key}")
+            component.editVariable(key, value)
+
+def parseValues(text) -> list[float]:
+    """
+    "80:150:10" is a range including the end, "0.2,0.5,0.8" a list
+    """
+    if ":" in text:
+        start, stop, step = (float(part) for part in text.split(":"))
+        count = int(round((stop - start) / step)) + 1
+        return [round(start + i * step, 12) for i in range(count)]
+    return [float(part) for part in text.split(",")]
+
+def parseDistribution(text):
+    """
+    "uniform:80:150" or "normal:100:15"
+    """
+    kind, a, b = text.split(":")
+    if kind not in ("uniform", "normal"):
+        raise ValueError(f"Unknown distribution {kind}")
+    return kind, float(a), float(b)
+
+def gridVariants(grid: dict[str, list]) -> list[dict]:
+    addresses = list(grid)
+    return [dict(zip(addresses, values)) for values in itertools.product(*(grid[address] for address in addresses))]
+
+def randomVariants(distributions: dict[str, tuple], samples: int, seed: int = None) -> list[dict]:
+    generator = random.Random(seed)
+    variants = []
+    for _ in range(samples):
+        variant = {}
+        for address, (kind, a, b) in distributions.items():
+            variant[address] = generator.uniform(a, b) if kind == "uniform" else generator.gauss(a, b)
+        variants.append(variant)
+    return variants
+
+def summarize(series: dict[str, list]) -> dict[str, float]:
+    metrics = {}
+    for name, data in series.items():
+        if len(data) == 0:
+            continue
+        metrics[f"{name}.final"] = data[-1]
+        metrics[f"{name}.mean"] = sum(data) / len(data)
+        metrics[f"{name}.min"] = min(data)
+        metrics[f"{name}.max"] = max(data)
+    return metrics
+
+def runVariant(path, parameters: dict, ticks: int, dt: float = flowModel.dt, engine: str = "objects", tolerance: float = None, window: int = 100) -> dict:
+    """
+    Runs one variant; this is what the worker processes execute
+    """
+    components = loadFlowFile(path)
+    applyParameters(components, parameters)
+    runner = HeadlessRunner(components, dt, engine=engine, tolerance=tolerance, window=window)
+    runner.run(ticks)
+    metrics = summarize(runner.series)
+    if runner.convergence is not None:
+        metrics["ticks"] = runner.ticks
+        metrics["convergedAt"] = runner.convergence.convergedAt
+    return metrics
+
+def sweep(path, variants: list[dict], ticks: int, dt: float = flowModel.dt, workers: int = None, engine: str = "objects", tolerance: float = None, window: int = 100) -> list[dict]:
+    """
+    Runs every variant headless on a process pool and returns one row per variant.
+    The ensemble engine runs all variants together in this process instead.
+    """
+    if engine == "ensemble":
+        if tolerance is not None:
+            raise ValueError("the ensemble engine runs all variants for the same number of ticks")
+        from flowEnsemble import runEnsemble
+        return runEnsemble(loadFlowFile(path), variants, ticks, dt)
+
+    # Fail on a wrong address here instead of in every worker
+    components = loadFlowFile(path)
+    for variant in variants[:1]:
+        applyParameters(components, variant)
+
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(variants) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(
+            runVariant,
+            itertools.repeat(path), variants, itertools.repeat(ticks), itertools.repeat(dt), itertools.repeat(engine),
+            itertools.repeat(tolerance), itertools.repeat(window),
+            chunksize=chunksize
+        )
+        return [{"variant": i, **variant, **metrics} for i, (variant, metrics) in enumerate(zip(variants, results))]
+
+def writeTable(rows: list[dict], path):
+    columns = []
+    for row in rows:
+        for column in row:
+            if column not in columns:
+                columns.append(column)
+    with open(path, "w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a parameter sweep over a .flow model")
+    parser.add_argument("model")
+    parser.add_argument("--set", action="append", default=[], metavar="NAME.KEY=VALUES", help="grid values, e.g. Process.power=80:150:10 or Splitter.splitScalar=0.2,0.5")
+    parser.add_argument("--random", action="append", default=[], metavar="NAME.KEY=DIST", help="random values, e.g. Process.power=uniform:80:150")
+    parser.add_argument("--samples", type=int, default=100, help="number of random variants")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--ticks", type=int, default=1000)
+    parser.add_argument("--dt", type=float, default=flowModel.dt)
+    parser.add_argument("--workers", type=int, help="worker processes, default all cores")
+    parser.add_argument("--engine", choices=["objects", "arrays", "compiled", "ensemble"], default="objects", help="ensemble runs all variants in one vectorized pass")
+    parser.add_argument("--until-steady", type=float, metavar="TOLERANCE", help="stop a variant once it reached a steady state")
+    parser.add_argument("--window", type=int, default=100)
+    parser.add_argument("--output", "-o", default="sweep.csv")
+    args = parser.parse_args(argv)
+
+    if len(args.set) > 0 and len(args.random) > 0:
+        parser.error("use either --set or --random")
+    if len(args.set) > 0:
+        variants = gridVariants({address: parseValues(values) for address, values in (item.split("=", 1) for item in args.set)})
+    elif len(args.random) > 0:
+        distributions = {address: parseDistribution(text) for address, text in (item.split("=", 1) for item in args.random)}
+        variants = randomVariants(distributions, args.samples, args.seed)
+    else:
+        parser.error("nothing to sweep, give --set or --random")
+
+    if args.engine == "ensemble" and args.until_steady is not None:
+        parser.error("--until-steady does not work with the ensemble engine")
+
+    start = time.perf_counter()
+    try:
+        rows = sweep(args.model, variants, args.ticks, args.dt, args.workers, args.engine, args.until_steady, args.window)
+    except KeyError as error:
+        parser.error(error.args[0])
+    writeTable(rows, args.output)
+    print(f"{len(rows)} variants in {time.perf_counter() - start:.2f}s, written to {args.output}")
+
+if __name__ == "__main__":
+    main()